@@ -0,0 +1,651 @@
+import json
+import random
+import time
+import zipfile
+from pathlib import Path
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape
+import pandas as pd
+
+import utils
+import instrumentation
+
+
+def load_xml_sample(source, sample=500):
+    """
+    Loads up to `sample` raw award documents from a yearly ZIP archive or a folder of
+    extracted XML files.
+
+    Parameters:
+        source (Path): A YYYY.zip archive or a directory containing .xml files.
+        sample (int): Maximum number of documents to load.
+
+    Returns:
+        list: (name, bytes) pairs.
+    """
+    source = Path(source)
+    documents = []
+    if source.suffix.lower() == '.zip':
+        with zipfile.ZipFile(source, 'r') as zip_ref:
+            for name in utils.list_zip_xml_members(zip_ref)[:sample]:
+                documents.append((name, zip_ref.read(name)))
+    else:
+        for filename in sorted(source.rglob("*.xml"))[:sample]:
+            documents.append((str(filename), filename.read_bytes()))
+    return documents
+
+
+def findtext_fields(root, fields):
+    """Reference extractor: one root.findtext('.//' + path) per field, as parse_xml used to do."""
+    return {column: root.findtext('.//' + path) for column, path in fields}
+
+
+def findtext_investigators(root):
+    """Reference investigator extractor with one findtext call per field."""
+    return [{column: investigator.findtext(path) for column, path in utils.INVESTIGATOR_FIELDS}
+            for investigator in root.findall('.//Investigator')]
+
+
+def time_per_document(function, roots, repeat):
+    """Returns the best-of-`repeat` time per document, in microseconds."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for root in roots:
+            function(root)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / max(len(roots), 1) * 1e6
+
+
+def benchmark_field_extraction(source, sample=500, repeat=5):
+    """
+    Micro-benchmark of the compiled single-pass field extractor against the per-field
+    findtext calls it replaced, on a sample of real award XML.
+
+    The documents are parsed once up front so only field extraction is timed. Every
+    document is also checked to produce exactly the same grant and investigator values.
+
+    Parameters:
+        source (Path): A YYYY.zip archive or a directory of extracted .xml files.
+        sample (int): Number of documents to use.
+        repeat (int): Timing repetitions; the best run is reported.
+
+    Returns:
+        pd.DataFrame: Per-document timings (microseconds) for each extractor and the speedup.
+    """
+    roots = []
+    for name, content in load_xml_sample(source, sample):
+        try:
+            roots.append(ET.fromstring(content))
+        except ET.ParseError as e:
+            print(f"Skipping {name}: {e}")
+
+    # Both extractors must agree on every document before timing them
+    mismatches = 0
+    for root in roots:
+        compiled, collected = utils.extract_fields(root, utils.GRANT_EXTRACTOR)
+        investigators = [utils.extract_child_fields(investigator, utils.INVESTIGATOR_EXTRACTOR)
+                         for investigator in collected['Investigator']]
+        if compiled != findtext_fields(root, utils.GRANT_FIELDS) or investigators != findtext_investigators(root):
+            mismatches += 1
+    print(f"Checked {len(roots)} documents, {mismatches} mismatches")
+
+    def compiled_extract(root):
+        data, collected = utils.extract_fields(root, utils.GRANT_EXTRACTOR)
+        for investigator in collected['Investigator']:
+            utils.extract_child_fields(investigator, utils.INVESTIGATOR_EXTRACTOR)
+
+    def findtext_extract(root):
+        findtext_fields(root, utils.GRANT_FIELDS)
+        findtext_investigators(root)
+
+    findtext_us = time_per_document(findtext_extract, roots, repeat)
+    compiled_us = time_per_document(compiled_extract, roots, repeat)
+    results = pd.DataFrame([{
+        'documents': len(roots),
+        'mismatches': mismatches,
+        'findtext_us_per_doc': findtext_us,
+        'compiled_us_per_doc': compiled_us,
+        'speedup': findtext_us / compiled_us if compiled_us else None,
+    }])
+    print(results.to_string(index=False))
+    return results
+
+
+def benchmark_ann_recall(embeddings, query_embeddings=None, k=10, sample=1000, backend='hnsw', seed=0, **params):
+    """
+    Recall of an approximate deepmatch index against exact search on the same embeddings.
+
+    recall@k is the share of the exact top-k neighbours that the approximate index also
+    returns, averaged over the queries. Build and query times are reported for both.
+
+    Parameters:
+        embeddings (array): (m, d) search-space embeddings, e.g. of every distinct assignee name.
+        query_embeddings (array): Query embeddings; by default `sample` rows drawn from embeddings.
+        k (int): Number of neighbours compared.
+        sample (int): Number of queries drawn when query_embeddings is not given.
+        backend (str): The approximate backend to evaluate (see deepmatch.INDEX_BACKENDS).
+        seed (int): Seed of the query sample.
+        params: Backend options, e.g. M, ef_construction, ef_search.
+
+    Returns:
+        pd.DataFrame: One row per backend with build time, query time per query and recall@k.
+    """
+    import numpy as np
+    import deepmatch
+
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if query_embeddings is None:
+        rng = np.random.default_rng(seed)
+        query_embeddings = embeddings[rng.choice(len(embeddings), size=min(sample, len(embeddings)), replace=False)]
+    query_embeddings = np.asarray(query_embeddings, dtype=np.float32)
+
+    rows = []
+    neighbours = {}
+    for name, options in [('exact', {}), (backend, params)]:
+        start = time.perf_counter()
+        index = deepmatch.build_index(embeddings, backend=name, **options)
+        build_s = time.perf_counter() - start
+        start = time.perf_counter()
+        _, neighbours[name] = index.query(query_embeddings, k=k)
+        query_s = time.perf_counter() - start
+        rows.append({'backend': name, 'size': len(embeddings), 'queries': len(query_embeddings), 'k': k,
+                     'build_s': build_s, 'query_us_per_query': query_s / max(len(query_embeddings), 1) * 1e6})
+
+    exact = neighbours['exact']
+    for row in rows:
+        found = neighbours[row['backend']]
+        hits = [len(set(a) & set(b)) for a, b in zip(found, exact)]
+        row['recall_at_k'] = sum(hits) / max(exact.size, 1)
+    results = pd.DataFrame(rows)
+    print(results.to_string(index=False))
+    return results
+
+
+def transform_fill_missing_values(df, columns, group_column='Institution_OrgUEINum', source_suffix=''):
+    """Reference group-mode fill: the groupby().transform(lambda x: x.mode()...) loop the fill functions used."""
+    for column in columns:
+        if column + '_C' not in df.columns:
+            df[column + '_C'] = df[column]
+        most_common_values = df.groupby(group_column)[column + source_suffix].transform(
+            lambda x: x.mode().iloc[0] if not x.mode().empty else x
+        )
+        df.loc[df[column + '_C'].isna(), column + '_C'] = most_common_values
+    return df
+
+
+def synthetic_institution_frame(rows=1_000_000, groups=50_000, missing=0.2, seed=0):
+    """
+    Synthetic grants-like frame for the imputation benchmark: UEI and name group keys
+    (a few missing) and city/state/ZIP columns with `missing` of their values set to NaN.
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    group = rng.integers(0, groups, rows)
+    frame = pd.DataFrame({
+        'Institution_OrgUEINum': pd.Series(np.char.add('UEI', group.astype(str))).where(rng.random(rows) > 0.01),
+        'Institution_Name': pd.Series(np.char.add('Institution ', (group // 2).astype(str))),
+        # A few values per group so there are real modes and ties
+        'Institution_City': pd.Series(np.char.add('city', (group * 3 + rng.integers(0, 3, rows)).astype(str))),
+        'Institution_State': pd.Series(np.char.add('state', (group % 50 + rng.integers(0, 2, rows)).astype(str))),
+        'Institution_Zip': pd.Series((group * 7 + rng.integers(0, 4, rows)) % 100_000).astype(float),
+    })
+    for column in ['Institution_City', 'Institution_State', 'Institution_Zip']:
+        frame[column] = frame[column].where(rng.random(rows) > missing)
+    return frame
+
+
+def benchmark_group_mode_fill(rows=1_000_000, groups=50_000, missing=0.2, seed=0):
+    """
+    Benchmarks the vectorized fill_missing_values / fill_missing_values_inst against the
+    groupby-transform-lambda implementation they replaced, on a synthetic frame, and checks
+    that both fill exactly the same values.
+
+    Parameters:
+        rows (int): Rows in the synthetic frame.
+        groups (int): Number of UEI groups (names group two UEIs each).
+        missing (float): Share of missing values in each filled column.
+        seed (int): Random seed.
+
+    Returns:
+        pd.DataFrame: Seconds per implementation, speedup and whether the results agree.
+    """
+    columns = ['Institution_City', 'Institution_State', 'Institution_Zip']
+    frame = synthetic_institution_frame(rows, groups, missing, seed)
+    filled = [column + '_C' for column in columns]
+    results = []
+    for name, vectorized, reference in [
+        ('fill_missing_values',
+         lambda df: utils.fill_missing_values(df, columns),
+         lambda df: transform_fill_missing_values(df, columns)),
+        ('fill_missing_values_inst',
+         lambda df: utils.fill_missing_values_inst(df, columns),
+         lambda df: transform_fill_missing_values(df, columns, 'Institution_Name', '_C')),
+    ]:
+        start = time.perf_counter()
+        expected = reference(frame.copy())
+        reference_s = time.perf_counter() - start
+        start = time.perf_counter()
+        actual = vectorized(frame.copy())
+        vectorized_s = time.perf_counter() - start
+        results.append({
+            'function': name,
+            'rows': rows,
+            'groups': groups,
+            'transform_s': reference_s,
+            'vectorized_s': vectorized_s,
+            'speedup': reference_s / vectorized_s if vectorized_s else None,
+            'identical': actual[filled].equals(expected[filled]),
+        })
+    results = pd.DataFrame(results)
+    print(results.to_string(index=False))
+    return results
+
+
+def benchmark_panels(grants, invest, repeat=3):
+    """
+    Times the panel builders against the notebook approach on the same data, e.g. the full
+    1999-2024 corpus loaded with storage.read_grants_parquet / read_investigators_parquet.
+
+    The reference institution panel merges the PI collaboration counts into the grants and
+    runs the notebooks' pivot_table(aggfunc=['sum', 'count']) by Institution_OrgUEINum_C and
+    Year; the reference investigator panel merges the award values into the investigator rows
+    and sums them with groupby. Every panel value is compared with the reference.
+
+    Parameters:
+        grants (pd.DataFrame): The grants table (one row per award).
+        invest (pd.DataFrame): The investigator table.
+        repeat (int): Timing repetitions; the best run is reported.
+
+    Returns:
+        pd.DataFrame: One row per panel with the reference and builder times, speedup and
+            whether all values agree.
+    """
+    import numpy as np
+    import panel
+    import institutions
+
+    def best_of(function):
+        best, result = None, None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = function()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
+
+    flags = [flag for flag in panel.PANEL_FLAGS if flag in grants.columns]
+    collaboration = panel.COLLABORATION_METRICS
+
+    def award_values():
+        awards = grants[['AwardID', 'Year'] + flags].copy()
+        awards['AwardSum'] = pd.to_numeric(grants['AwardTotalIntnAmount'], errors='coerce').fillna(0)
+        awards[institutions.UEI] = institutions.institution_keys(grants)
+        pi = invest.loc[invest['PI#'] == 1, ['AwardID'] + collaboration]
+        awards = awards.merge(pi, on='AwardID', how='left')
+        awards[collaboration] = awards[collaboration].fillna(0)
+        awards['MultiInstitutionAwards'] = (awards['TotalCollaborativeInstitutions'] > 1).astype(int)
+        return awards
+
+    values = ['AwardSum'] + flags + collaboration + ['MultiInstitutionAwards']
+
+    def pivot_reference():
+        summary = award_values().pivot_table(index=[institutions.UEI, 'Year'], values=values,
+                                             aggfunc=['sum', 'count'])
+        result = summary['sum'][values]
+        result['AwardCount'] = summary['count']['AwardSum']
+        return result
+
+    def merge_reference():
+        rows = invest[['NSFID', 'AwardID', 'PI#']].merge(award_values(), on='AwardID')
+        rows['PIAwards'] = (rows['PI#'] == 1).astype(int)
+        grouped = rows.groupby(['NSFID', 'Year'])
+        result = grouped[['PIAwards'] + values].sum()
+        result['AwardCount'] = grouped.size()
+        return result
+
+    def agree(actual, expected, index):
+        actual = actual.set_index(index).reindex(expected.index)[expected.columns]
+        return bool(np.allclose(actual.to_numpy(float), expected.to_numpy(float)))
+
+    results = []
+    for name, rows, reference, builder, index in [
+        ('institution_year', len(grants), pivot_reference,
+         lambda: panel.institution_year_panel(grants, invest), [institutions.UEI, 'Year']),
+        ('investigator_year', len(invest), merge_reference,
+         lambda: panel.investigator_year_panel(grants, invest), ['NSFID', 'Year']),
+    ]:
+        reference_s, expected = best_of(reference)
+        builder_s, actual = best_of(builder)
+        results.append({'panel': name, 'rows': rows, 'reference_s': reference_s, 'panel_s': builder_s,
+                        'identical': agree(actual, expected, index)})
+    results = pd.DataFrame(results)
+    results['speedup'] = results['reference_s'] / results['panel_s']
+    print(results.to_string(index=False))
+    return results
+
+
+# Award counts of the benchmark scales
+BENCHMARK_SCALES = {'1k': 1_000, '100k': 100_000, '1m': 1_000_000}
+# Share of awards with 1, 2, ... investigators (most awards have a single PI, a few have 5+)
+INVESTIGATOR_COUNT_WEIGHTS = [0.56, 0.2, 0.11, 0.06, 0.04, 0.02, 0.01]
+# Title prefixes of the programs flagged by create_grant_features, and their shares
+TITLE_PREFIXES = [
+    ('', 0.55), ('Collaborative Research: ', 0.2), ('CAREER: ', 0.06), ('SBIR Phase I: ', 0.05),
+    ('SBIR Phase II: ', 0.02), ('STTR Phase I: ', 0.02), ('STTR Phase II: ', 0.01), ('I-Corps: ', 0.02),
+    ('RAPID: ', 0.03), ('EAGER: ', 0.03), ('Conference: ', 0.01),
+]
+DIRECTORATES = [
+    ('CSE', 'Direct For Computer & Info Scie & Enginr', 'CNS', 'Division Of Computer and Network Systems'),
+    ('ENG', 'Directorate For Engineering', 'TI', 'Translational Impacts'),
+    ('MPS', 'Direct For Mathematical & Physical Scien', 'DMR', 'Division Of Materials Research'),
+    ('BIO', 'Direct For Biological Sciences', 'DEB', 'Division Of Environmental Biology'),
+    ('GEO', 'Directorate For Geosciences', 'OCE', 'Division Of Ocean Sciences'),
+    ('SBE', 'Direct For Social, Behav & Economic Scie', 'SES', 'Division Of Social and Economic Sciences'),
+    ('EDU', 'Directorate for STEM Education', 'DUE', 'Division Of Undergraduate Education'),
+]
+STATES = [
+    ('California', 'CA', '9'), ('New York', 'NY', '1'), ('Texas', 'TX', '7'), ('Massachusetts', 'MA', '0'),
+    ('Illinois', 'IL', '6'), ('Pennsylvania', 'PA', '1'), ('Florida', 'FL', '3'), ('Ohio', 'OH', '4'),
+    ('Michigan', 'MI', '4'), ('Georgia', 'GA', '3'), ('Washington', 'WA', '9'), ('Colorado', 'CO', '8'),
+]
+ABSTRACT_WORDS = (
+    'this project will develop new methods for the analysis of large scale data and their application '
+    'to research in science engineering and education the award reflects nsf statutory mission and has '
+    'been deemed worthy of support through evaluation using the foundation intellectual merit and broader '
+    'impacts review criteria students model system network energy materials learning community partners'
+).split()
+FIRST_NAMES = ['Maria', 'James', 'Wei', 'Priya', 'John', 'Ana', 'David', 'Li', 'Sarah', 'Ahmed', 'Elena', 'Kenji']
+LAST_NAMES = ['Smith', 'Garcia', 'Chen', 'Patel', 'Johnson', 'Kim', 'Nguyen', 'Rossi', 'Müller', "O'Brien", 'Silva']
+
+
+def synthetic_institutions(count, rng):
+    """
+    A pool of synthetic institutions: name, city, state, ZIP, UEI, phone and e-mail domain.
+    ZIP formats vary as in the real data (ZIP5, ZIP+4, leading zero dropped) and a few UEIs
+    are blank, as in the older archives.
+    """
+    pool = []
+    for number in range(count):
+        state, code, zip_digit = rng.choice(STATES)
+        city = f'{rng.choice(["North", "South", "East", "West", "New", "Port", "Lake"])} {rng.choice(LAST_NAMES)}ville'
+        zip5 = f'{zip_digit}{rng.randrange(10_000):04d}'
+        zipcode = rng.choices([zip5 + f'{rng.randrange(10_000):04d}', zip5, zip5.lstrip('0')], [0.7, 0.25, 0.05])[0]
+        kind = rng.choice(['University of', 'College of', 'Institute of'])
+        pool.append({
+            'name': f'{kind} {city} {number}' if number % 3 else f'{city} Technologies, Inc.',
+            'city': city.upper() if rng.random() < 0.5 else city,
+            'state': state,
+            'code': code,
+            'zip': zipcode,
+            'uei': '' if rng.random() < 0.05 else f'{rng.randrange(16 ** 6):06X}{number:06d}',
+            'phone': f'{rng.randrange(200, 999)}{rng.randrange(10 ** 7):07d}',
+            'domain': f'inst{number}.edu',
+        })
+    return pool
+
+
+def synthetic_investigators(count, institutions, rng):
+    """A pool of synthetic investigators with an NSF_ID, a name and an e-mail at their institution."""
+    pool = []
+    for number in range(count):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        institution = rng.randrange(len(institutions))
+        pool.append({
+            'first': first,
+            'last': last,
+            'middle': rng.choice(['', '', 'A', 'J', 'M']),
+            'nsf_id': f'{number:09d}',
+            'email': f'{first[0].lower()}{last.lower()}{number}@{institutions[institution]["domain"]}'
+            if rng.random() < 0.9 else '',
+            'institution': institution,
+        })
+    return pool
+
+
+def synthetic_award_xml(award_id, year, institutions, investigators, colleagues, rng):
+    """
+    One synthetic award document in the NSF award XML schema (every path of
+    utils.GRANT_FIELDS and utils.INVESTIGATOR_FIELDS is present). The award goes to the
+    PI's institution and most co-PIs are drawn from the same institution (colleagues maps
+    an institution position to its investigators).
+
+    Returns:
+        tuple: (XML bytes, number of <Investigator> elements)
+    """
+    pi = rng.choice(investigators)
+    institution = institutions[pi['institution']]
+    directorate = rng.choice(DIRECTORATES)
+    prefix = rng.choices([p for p, _ in TITLE_PREFIXES], [w for _, w in TITLE_PREFIXES])[0]
+    title = prefix + ' '.join(rng.choices(ABSTRACT_WORDS, k=rng.randint(4, 12))).capitalize()
+    abstract = ' '.join(rng.choices(ABSTRACT_WORDS, k=rng.randint(150, 500)))
+    amount = rng.randrange(50, 5000) * 100
+    start_month, start_day = rng.randint(1, 12), rng.randint(1, 28)
+    count = rng.choices(range(1, len(INVESTIGATOR_COUNT_WEIGHTS) + 1), INVESTIGATOR_COUNT_WEIGHTS)[0]
+
+    team = [pi]
+    seen = {pi['nsf_id']}
+    while len(team) < count:
+        person = rng.choice(colleagues[pi['institution']] if rng.random() < 0.6 else investigators)
+        if person['nsf_id'] not in seen:
+            team.append(person)
+            seen.add(person['nsf_id'])
+    people = []
+    for position, person in enumerate(team):
+        role = 'Principal Investigator' if position == 0 else 'Co-Principal Investigator'
+        people.append(
+            f'<Investigator><FirstName>{escape(person["first"])}</FirstName>'
+            f'<LastName>{escape(person["last"])}</LastName><PI_MID_INIT>{person["middle"]}</PI_MID_INIT>'
+            f'<PI_SUFX_NAME/><PI_FULL_NAME>{escape(person["first"] + " " + person["last"])}</PI_FULL_NAME>'
+            f'<EmailAddress>{person["email"]}</EmailAddress><NSF_ID>{person["nsf_id"]}</NSF_ID>'
+            f'<StartDate>{start_month:02d}/{start_day:02d}/{year}</StartDate><EndDate/>'
+            f'<RoleCode>{role}</RoleCode></Investigator>'
+        )
+    elements = ''.join(
+        f'<ProgramElement><Code>{rng.randrange(1000, 9999)}</Code><Text>{escape(title[:20]).upper()}</Text></ProgramElement>'
+        for _ in range(rng.choices([1, 2, 3, 4], [0.6, 0.25, 0.1, 0.05])[0])
+    )
+    references = ''.join(
+        f'<ProgramReference><Code>{rng.randrange(1000, 9999)}</Code><Text>{rng.choice(ABSTRACT_WORDS).upper()}</Text></ProgramReference>'
+        for _ in range(rng.randint(0, 4))
+    )
+    xml = (
+        f'<?xml version="1.0" encoding="UTF-8"?>\n<rootTag><Award>'
+        f'<AwardTitle>{escape(title)}</AwardTitle><AGENCY>NSF</AGENCY>'
+        f'<AwardEffectiveDate>{start_month:02d}/{start_day:02d}/{year}</AwardEffectiveDate>'
+        f'<AwardExpirationDate>{start_month:02d}/{start_day:02d}/{year + rng.randint(1, 5)}</AwardExpirationDate>'
+        f'<AwardTotalIntnAmount>{amount}.00</AwardTotalIntnAmount><AwardAmount>{amount}</AwardAmount>'
+        f'<AwardInstrument><Value>{rng.choice(["Standard Grant", "Continuing Grant", "Fellowship Award"])}</Value></AwardInstrument>'
+        f'<Organization><Code>0{rng.randrange(10 ** 7):07d}</Code>'
+        f'<Directorate><Abbreviation>{directorate[0]}</Abbreviation><LongName>{escape(directorate[1])}</LongName></Directorate>'
+        f'<Division><Abbreviation>{directorate[2]}</Abbreviation><LongName>{escape(directorate[3])}</LongName></Division>'
+        f'</Organization><ProgramOfficer><SignBlockName>{rng.choice(FIRST_NAMES)} {escape(rng.choice(LAST_NAMES))}</SignBlockName>'
+        f'<PO_EMAI>po{rng.randrange(500)}@nsf.gov</PO_EMAI><PO_PHON>703292{rng.randrange(10 ** 4):04d}</PO_PHON></ProgramOfficer>'
+        f'<AbstractNarration>{abstract}</AbstractNarration>'
+        f'<MinAmdLetterDate>{start_month:02d}/{start_day:02d}/{year}</MinAmdLetterDate>'
+        f'<MaxAmdLetterDate>{rng.randint(1, 12):02d}/{rng.randint(1, 28):02d}/{year + rng.randint(0, 2)}</MaxAmdLetterDate>'
+        f'<ARRAAmount/><TRAN_TYPE>Grant</TRAN_TYPE><CFDA_NUM>47.0{rng.randrange(41, 84)}</CFDA_NUM>'
+        f'<NSF_PAR_USE_FLAG>{rng.randint(0, 1)}</NSF_PAR_USE_FLAG><FUND_AGCY_CODE>4900</FUND_AGCY_CODE>'
+        f'<AWDG_AGCY_CODE>4900</AWDG_AGCY_CODE><AwardID>{award_id}</AwardID>{"".join(people)}'
+        f'<Institution><Name>{escape(institution["name"])}</Name><CityName>{institution["city"]}</CityName>'
+        f'<ZipCode>{institution["zip"]}</ZipCode><PhoneNumber>{institution["phone"]}</PhoneNumber>'
+        f'<StreetAddress>{rng.randrange(1, 9999)} Main St</StreetAddress><StreetAddress2/>'
+        f'<CountryName>United States</CountryName><StateName>{institution["state"]}</StateName>'
+        f'<StateCode>{institution["code"]}</StateCode><CONGRESSDISTRICT>{rng.randint(1, 20):02d}</CONGRESSDISTRICT>'
+        f'<CONGRESS_DISTRICT_ORG>{institution["code"]}{rng.randint(1, 20):02d}</CONGRESS_DISTRICT_ORG>'
+        f'<ORG_UEI_NUM>{institution["uei"]}</ORG_UEI_NUM><ORG_LGL_BUS_NAME>{escape(institution["name"].upper())}</ORG_LGL_BUS_NAME>'
+        f'<ORG_PRNT_UEI_NUM/></Institution>'
+        f'<Performance_Institution><Name>{escape(institution["name"])}</Name><CityName>{institution["city"]}</CityName>'
+        f'<StateCode>{institution["code"]}</StateCode><ZipCode>{institution["zip"]}</ZipCode>'
+        f'<StreetAddress>{rng.randrange(1, 9999)} Main St</StreetAddress><CountryCode>US</CountryCode>'
+        f'<CountryName>United States</CountryName><StateName>{institution["state"]}</StateName>'
+        f'<CountryFlag>1</CountryFlag><CONGRESSDISTRICT>{rng.randint(1, 20):02d}</CONGRESSDISTRICT>'
+        f'<CONGRESS_DISTRICT_PERF>{institution["code"]}{rng.randint(1, 20):02d}</CONGRESS_DISTRICT_PERF>'
+        f'</Performance_Institution>{elements}{references}'
+        f'<Appropriation><Code>0{year % 100:02d}4</Code><Name>NSF RESEARCH &amp; RELATED ACTIVIT</Name>'
+        f'<APP_SYMB_ID>040100</APP_SYMB_ID></Appropriation>'
+        f'<Fund><Code>01{year % 100:02d}00{rng.randrange(100):02d}DB</Code><Name>NSF RESEARCH &amp; RELATED ACTIVIT</Name>'
+        f'<FUND_SYMB_ID>040100</FUND_SYMB_ID></Fund><FUND_OBLG>{year}~{amount}</FUND_OBLG></Award></rootTag>'
+    )
+    return xml.encode('utf-8'), count
+
+
+def write_synthetic_archives(folder, awards=1_000, years=range(2020, 2025), seed=0, malformed=0):
+    """
+    Writes synthetic yearly award archives (YYYY.zip, one XML document per award as in the
+    NSF downloads), for benchmarking the pipeline offline. The same arguments always produce
+    the same documents.
+
+    The archives are reused when folder already holds archives written with the same
+    arguments (recorded in synthetic.json).
+
+    Parameters:
+        folder (Path): Output directory.
+        awards (int): Total number of awards, split evenly over the years.
+        years (iterable): Archive years.
+        seed (int): Random seed.
+        malformed (int): Truncated documents added to each archive, to exercise the error log.
+
+    Returns:
+        dict: The generation settings with the expected 'grant_rows' and 'invest_rows'.
+    """
+    folder = Path(folder)
+    years = list(years)
+    settings = {'awards': awards, 'years': years, 'seed': seed, 'malformed': malformed}
+    manifest = folder / 'synthetic.json'
+    if manifest.exists():
+        written = json.loads(manifest.read_text())
+        if {key: written.get(key) for key in settings} == settings and \
+                all((folder / f'{year}.zip').exists() for year in years):
+            print(f"Reusing synthetic archives in {folder}")
+            return written
+
+    folder.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)
+    institutions = synthetic_institutions(max(awards // 50, 10), rng)
+    investigators = synthetic_investigators(max(awards // 2, 10), institutions, rng)
+    colleagues = {}
+    for person in investigators:
+        colleagues.setdefault(person['institution'], []).append(person)
+    start = time.perf_counter()
+    invest_rows = 0
+    award_number = 0
+    for index, year in enumerate(years):
+        year_awards = awards // len(years) + (index < awards % len(years))
+        with zipfile.ZipFile(folder / f'{year}.zip', 'w', zipfile.ZIP_DEFLATED) as zip_ref:
+            for _ in range(year_awards):
+                award_id = f'{1_000_000 + award_number:07d}'
+                content, count = synthetic_award_xml(award_id, year, institutions, investigators, colleagues, rng)
+                zip_ref.writestr(f'{award_id}.xml', content)
+                invest_rows += count
+                award_number += 1
+            for number in range(malformed):
+                zip_ref.writestr(f'malformed{number}.xml', b'<?xml version="1.0"?>\n<rootTag><Award><AwardID>')
+    settings.update({'grant_rows': award_number, 'invest_rows': invest_rows})
+    manifest.write_text(json.dumps(settings, indent=2))
+    print(f"Wrote {award_number} synthetic awards ({invest_rows} investigators) for {len(years)} years "
+          f"to {folder} in {time.perf_counter() - start:.1f}s")
+    return settings
+
+
+INSTITUTION_COLUMNS = [
+    'Institution_City', 'Institution_State', 'Institution_Zip', 'Institution_Country',
+    'Institution_StreetAddress1', 'Performance_Institution_City', 'Performance_Institution_State',
+    'Performance_Institution_Zip', 'Performance_Institution_StreetAddress',
+]
+
+
+def benchmark_pipeline(scale='1k', folder='../benchmark', years=range(2020, 2025), seed=0, workers=None,
+                       baseline=None, tolerance=0.1):
+    """
+    End-to-end benchmark of the ingest pipeline on synthetic archives (see
+    write_synthetic_archives), timing every stage in a run report:
+    scan, parse, frames, write and final (process_zip_files / process_dataframe, or
+    process_dataframe_parallel with workers), then type (type_grants / type_investigators),
+    fill (fill_missing_values and fill_missing_values_inst), features
+    (create_grant_features), panel (institution_year_panel) and parquet (Parquet write and read).
+
+    The parsed row counts are checked against the generated ones, and the report is compared
+    with a stored baseline report. deepmatch needs a downloaded model, so it is not part of
+    this offline run; see benchmark_ann_recall.
+
+    Parameters:
+        scale (str or int): '1k', '100k', '1m' (see BENCHMARK_SCALES) or a number of awards.
+        folder (Path): Working directory; the archives go to folder/archives_<scale> and are
+            reused across runs, the outputs to folder/run_<scale>.
+        years (iterable): Archive years.
+        seed (int): Generator seed.
+        workers (int): Parse on a process pool with this many workers.
+        baseline (Path): A baseline run report. Compared with this run when it exists,
+            otherwise this run's report is stored there as the new baseline.
+        tolerance (float): Relative throughput drop flagged as a regression.
+
+    Returns:
+        tuple: (run report dict, comparison DataFrame or None)
+    """
+    import storage
+    import panel
+
+    awards = BENCHMARK_SCALES[scale] if isinstance(scale, str) else int(scale)
+    label = scale if isinstance(scale, str) else str(awards)
+    folder = Path(folder)
+    archives = folder / f'archives_{label}'
+    run = folder / f'run_{label}'
+    settings = write_synthetic_archives(archives, awards, years, seed)
+
+    output_csv, output_pkl = run / 'csv', run / 'pkl'
+    for output in [output_csv, output_pkl]:
+        (output / 'final').mkdir(parents=True, exist_ok=True)
+    report = instrumentation.RunReport(f'synthetic-{label}')
+    df = utils.process_zip_files(archives, run / 'temp', min(settings['years']) - 1, extract=False,
+                                 run_report=report)
+    if workers:
+        df, grants, invest = utils.process_dataframe_parallel(df, run / 'temp', output_csv, output_pkl,
+                                                              from_zip=True, workers=workers, run_report=report)
+    else:
+        df, grants, invest = utils.process_dataframe(df, run / 'temp', output_csv, output_pkl, from_zip=True,
+                                                     run_report=report)
+    for table, rows, expected in [('grants', len(grants), settings['grant_rows']),
+                                  ('investigators', len(invest), settings['invest_rows'])]:
+        if rows != expected:
+            print(f"Warning: parsed {rows} {table}, generated {expected}")
+
+    with instrumentation.stage(report, 'type') as stage:
+        typed_grants = utils.type_grants(grants, report=False)
+        typed_invest = utils.type_investigators(invest, report=False)
+        stage['documents'] = len(grants)
+    with instrumentation.stage(report, 'fill') as stage:
+        filled = utils.fill_missing_values(grants.copy(), INSTITUTION_COLUMNS)
+        filled = utils.fill_missing_values_inst(filled, INSTITUTION_COLUMNS)
+        stage['documents'] = len(grants)
+    with instrumentation.stage(report, 'features') as stage:
+        icorps = pd.DataFrame(columns=['AwardID', 'teams', 'hub', 'site', 'node'])
+        featured = utils.create_grant_features(filled, icorps)
+        stage['documents'] = len(grants)
+    with instrumentation.stage(report, 'panel') as stage:
+        panel.institution_year_panel(featured, invest)
+        stage['documents'] = len(grants)
+    with instrumentation.stage(report, 'parquet') as stage:
+        storage.write_grants_parquet(typed_grants, run / 'parquet' / 'grants')
+        storage.write_investigators_parquet(typed_invest, run / 'parquet' / 'investigators')
+        storage.read_grants_parquet(run / 'parquet' / 'grants')
+        storage.read_investigators_parquet(run / 'parquet' / 'investigators')
+        stage['documents'] = len(grants)
+        stage['bytes'] = sum(path.stat().st_size for path in (run / 'parquet').rglob('*.parquet'))
+
+    current = report.save(run / 'run_report.json')
+    print(pd.DataFrame(current['totals']).to_string(index=False))
+    if baseline is None:
+        return current, None
+    baseline = Path(baseline)
+    if not baseline.exists():
+        baseline.parent.mkdir(parents=True, exist_ok=True)
+        baseline.write_text(json.dumps(current, indent=2, default=str))
+        print(f"Stored baseline report {baseline}")
+        return current, None
+    comparison = instrumentation.compare_reports(baseline, current, tolerance)
+    regressions = comparison.loc[comparison['regression'], 'stage'].tolist()
+    print(f"Regressions: {', '.join(regressions)}" if regressions else "No regressions")
+    return current, comparison
@@ -1,6 +1,16 @@
 from sentence_transformers import SentenceTransformer
 import torch
+import numpy as np
 import pandas as pd
+import hashlib
+import time
+import json
+from pathlib import Path
+
+try:
+    import hnswlib
+except ImportError:  # optional: without it, build_index falls back to exact search
+    hnswlib = None
 
 
 
@@ -8,10 +18,136 @@ def load_model(model_name='all-MiniLM-L6-v2'):
     """Load a pre-trained SentenceTransformer model."""
     return SentenceTransformer(model_name)
 
-def encode_texts(model, texts):
-    """Encode a list of texts into embeddings using a SentenceTransformer model."""
+def encode_texts(model, texts, cache_dir=None, model_name='all-MiniLM-L6-v2'):
+    """
+    Encode a list of texts into embeddings using a SentenceTransformer model.
+    With cache_dir set, embeddings are read from and added to the on-disk cache (see cached_encode).
+    """
+    if cache_dir is not None:
+        return cached_encode(model, texts, cache_dir, model_name)
     return model.encode(texts, convert_to_tensor=True)
 
+def normalize_text(text):
+    """Normalize a name before hashing/encoding: strip and collapse whitespace."""
+    return ' '.join(str(text).split())
+
+def text_key(text):
+    """Cache key of a text: SHA-1 of its normalized form."""
+    return hashlib.sha1(normalize_text(text).encode('utf-8')).hexdigest()
+
+def cache_paths(cache_dir, model_name):
+    """Return the (embeddings.npy, index.csv) paths of a model's cache, creating its folder."""
+    folder = Path(cache_dir) / model_name.replace('/', '__')
+    folder.mkdir(parents=True, exist_ok=True)
+    return folder / 'embeddings.npy', folder / 'index.csv'
+
+def load_cache(cache_dir, model_name):
+    """
+    Load a model's embedding cache.
+
+    Returns:
+        (embeddings, index): embeddings memory-mapped read-only (or None if the cache is empty)
+        and a DataFrame with one row per cached text: key, row, last_used.
+    """
+    embeddings_path, index_path = cache_paths(cache_dir, model_name)
+    if not embeddings_path.exists() or not index_path.exists():
+        return None, pd.DataFrame({'key': pd.Series(dtype=str), 'row': pd.Series(dtype='int64'),
+                                   'last_used': pd.Series(dtype='float64')})
+    embeddings = np.load(embeddings_path, mmap_mode='r')
+    index = pd.read_csv(index_path, dtype={'key': str, 'row': 'int64', 'last_used': 'float64'})
+    return embeddings, index
+
+def save_cache(cache_dir, model_name, embeddings, index):
+    """Write a model's embedding index, and its embedding matrix unless embeddings is None."""
+    embeddings_path, index_path = cache_paths(cache_dir, model_name)
+    if embeddings is not None:
+        tmp_path = embeddings_path.with_suffix('.tmp.npy')
+        np.save(tmp_path, np.ascontiguousarray(embeddings, dtype=np.float32))
+        tmp_path.replace(embeddings_path)
+    index.to_csv(index_path, index=False)
+
+def cached_encode(model, texts, cache_dir, model_name='all-MiniLM-L6-v2'):
+    """
+    Encode texts through an on-disk embedding cache keyed by model name and normalized text hash.
+
+    Only texts not in the cache yet are encoded; they are appended to the cache, which is
+    stored as a .npy matrix (memory-mapped on load) plus an index CSV of key -> row.
+
+    Args:
+        model: The SentenceTransformer model.
+        texts: List of texts.
+        cache_dir: Root folder of the cache; each model gets its own subfolder.
+        model_name: Name of the model, part of the cache key.
+
+    Returns:
+        Tensor of embeddings in the order of texts.
+    """
+    embeddings, index = load_cache(cache_dir, model_name)
+    keys = [text_key(text) for text in texts]
+    rows = dict(zip(index['key'], index['row']))
+
+    # Encode each new text once, even if it appears several times
+    new_keys, new_texts = [], []
+    for key, text in zip(keys, texts):
+        if key not in rows:
+            rows[key] = -1
+            new_keys.append(key)
+            new_texts.append(normalize_text(text))
+
+    now = time.time()
+    new_embeddings = None
+    if new_texts:
+        print(f"Encoding {len(new_texts)} new texts ({len(texts) - len(new_texts)} cached)...")
+        new_embeddings = model.encode(new_texts, convert_to_numpy=True).astype(np.float32)
+        start = 0 if embeddings is None else len(embeddings)
+        embeddings = new_embeddings if embeddings is None else np.concatenate([embeddings, new_embeddings])
+        new_index = pd.DataFrame({'key': new_keys, 'row': np.arange(start, start + len(new_keys)), 'last_used': now})
+        index = pd.concat([index, new_index], ignore_index=True)
+        rows.update(zip(new_keys, new_index['row']))
+
+    selected = np.asarray(embeddings[[rows[key] for key in keys]]) if keys else np.empty((0, 0), dtype=np.float32)
+
+    # Mark the texts used in this call so evict_embeddings keeps them; the matrix is only
+    # rewritten when new texts were added
+    index.loc[index['key'].isin(set(keys)), 'last_used'] = now
+    if new_embeddings is not None:
+        embeddings = np.asarray(embeddings)
+    else:
+        embeddings = None  # release the memory map
+    save_cache(cache_dir, model_name, embeddings, index)
+    return torch.from_numpy(selected)
+
+def evict_embeddings(cache_dir, model_name='all-MiniLM-L6-v2', keep_texts=None, max_age_days=None):
+    """
+    Remove stale entries from a model's embedding cache and compact the matrix.
+
+    Args:
+        cache_dir: Root folder of the cache.
+        model_name: Name of the model.
+        keep_texts: If given, drop every entry whose text is not in this list.
+        max_age_days: If given, drop entries not used within this many days.
+
+    Returns:
+        Number of entries removed.
+    """
+    embeddings, index = load_cache(cache_dir, model_name)
+    if embeddings is None:
+        return 0
+    keep = pd.Series(True, index=index.index)
+    if keep_texts is not None:
+        keep &= index['key'].isin({text_key(text) for text in keep_texts})
+    if max_age_days is not None:
+        keep &= index['last_used'] >= time.time() - max_age_days * 86400
+    removed = int((~keep).sum())
+    if removed:
+        index = index[keep].reset_index(drop=True)
+        compacted = np.asarray(embeddings[index['row'].to_numpy()])
+        index['row'] = np.arange(len(index))
+        del embeddings  # release the memory map before replacing the file
+        save_cache(cache_dir, model_name, compacted, index)
+    print(f"Evicted {removed} cached embeddings")
+    return removed
+
 def find_closest_match(name, model, search_space_embeddings, search_space_df, return_columns):
     """Find the closest match for a given name using cosine similarity."""
     try:
@@ -29,28 +165,226 @@ def find_closest_match(name, model, search_space_embeddings, search_space_df, re
         print(f"Error processing {name}: {e}")
         return None
 
-def batch_process_matches(df, search_space_df, model, match_column_df, match_column_search, return_columns_df, return_columns_search, batch_size=100, max_records=None, output_path="match_results.xlsx"):
-    """Process a DataFrame in batches to find the closest match for each entry, limited to max_records if specified."""
-    search_space_embeddings = encode_texts(model, search_space_df[match_column_search].tolist())
-    results = []
-    
-    for i, row in enumerate(df.itertuples(index=False), start=1):
-        if max_records and i > max_records:
-            break
-        
-        match_result = find_closest_match(getattr(row, match_column_df), model, search_space_embeddings, search_space_df, return_columns_search)
-        if match_result:
-            results.append([getattr(row, col) for col in return_columns_df] + [match_result[col] for col in return_columns_search] + [match_result['Similarity_Score']])
-        
-        if i % batch_size == 0:
-            print(f"Processed {i} records, saving progress...")
-            temp_df = pd.DataFrame(results, columns=return_columns_df  + return_columns_search + ['Similarity_Score'])
-            #temp_df.to_csv(f"progress_{i}.csv", index=False)
-    
+def normalize_embeddings(embeddings):
+    """L2-normalize embeddings row-wise so a dot product is the cosine similarity."""
+    return torch.nn.functional.normalize(embeddings, p=2, dim=1)
+
+def top_k_similar(query_embeddings, normalized_search_embeddings, k=1):
+    """
+    Scores a batch of queries against the whole search space with one matrix multiply.
+
+    Args:
+        query_embeddings: (n, d) tensor of query embeddings.
+        normalized_search_embeddings: (m, d) tensor from normalize_embeddings.
+        k: Number of candidates to return per query.
+
+    Returns:
+        (scores, indices): two (n, k) numpy arrays, best match first.
+    """
+    scores = normalize_embeddings(query_embeddings) @ normalized_search_embeddings.T
+    values, indices = torch.topk(scores, k=min(k, scores.shape[1]), dim=1)
+    return values.cpu().numpy(), indices.cpu().numpy()
+
+
+class ExactIndex:
+    """
+    Exact cosine search over normalized embeddings with NumPy (the fallback backend).
+    Scores every query against the whole search space, so results are exact.
+    """
+    backend = 'exact'
+
+    def __init__(self, embeddings):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        self.embeddings = embeddings / np.maximum(norms, 1e-12)
+
+    def __len__(self):
+        return len(self.embeddings)
+
+    def query(self, query_embeddings, k=1, batch_size=1000):
+        """Return (scores, indices): two (n, k) arrays of cosine similarities and row positions, best first."""
+        query_embeddings = np.asarray(query_embeddings, dtype=np.float32)
+        query_embeddings = query_embeddings / np.maximum(np.linalg.norm(query_embeddings, axis=1, keepdims=True), 1e-12)
+        k = min(k, len(self))
+        score_batches, index_batches = [], []
+        for start in range(0, len(query_embeddings), batch_size):
+            scores = query_embeddings[start:start + batch_size] @ self.embeddings.T
+            # argpartition picks the k best in linear time; only those k are sorted
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1, kind='stable')
+            index_batches.append(np.take_along_axis(top, order, axis=1))
+            score_batches.append(np.take_along_axis(top_scores, order, axis=1))
+        if not score_batches:
+            return np.empty((0, k), dtype=np.float32), np.empty((0, k), dtype=np.int64)
+        return np.concatenate(score_batches), np.concatenate(index_batches).astype(np.int64)
+
+    def save(self, folder):
+        np.save(Path(folder) / 'embeddings.npy', self.embeddings)
+
+    @classmethod
+    def load(cls, folder, meta):
+        index = cls.__new__(cls)
+        index.embeddings = np.load(Path(folder) / 'embeddings.npy', mmap_mode='r')
+        return index
+
+
+class HNSWIndex:
+    """
+    Approximate cosine search with an HNSW graph (hnswlib), for search spaces too large to
+    scan per query, e.g. every distinct PatentsView assignee name.
+
+    Parameters:
+        M (int): Graph degree; higher is more accurate, bigger and slower to build.
+        ef_construction (int): Candidate list size while building.
+        ef_search (int): Candidate list size while querying (raised to k if smaller);
+            the main recall/speed knob, which can be changed after loading.
+    """
+    backend = 'hnsw'
+
+    def __init__(self, embeddings, M=32, ef_construction=200, ef_search=100, num_threads=-1):
+        if hnswlib is None:
+            raise ImportError("hnswlib is not installed; use backend='exact' or pip install hnswlib")
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        self.params = {'dim': int(embeddings.shape[1]), 'M': M, 'ef_construction': ef_construction,
+                       'ef_search': ef_search}
+        self.index = hnswlib.Index(space='cosine', dim=embeddings.shape[1])
+        self.index.init_index(max_elements=len(embeddings), ef_construction=ef_construction, M=M)
+        self.index.add_items(embeddings, np.arange(len(embeddings)), num_threads=num_threads)
+        self.ef_search = ef_search
+
+    def __len__(self):
+        return self.index.get_current_count()
+
+    def query(self, query_embeddings, k=1, num_threads=-1):
+        """Return (scores, indices): two (n, k) arrays of cosine similarities and row positions, best first."""
+        query_embeddings = np.asarray(query_embeddings, dtype=np.float32)
+        k = min(k, len(self))
+        if not len(query_embeddings):
+            return np.empty((0, k), dtype=np.float32), np.empty((0, k), dtype=np.int64)
+        self.index.set_ef(max(self.ef_search, k))
+        labels, distances = self.index.knn_query(query_embeddings, k=k, num_threads=num_threads)
+        # hnswlib's cosine space returns 1 - cosine similarity
+        return (1 - distances).astype(np.float32), labels.astype(np.int64)
+
+    def save(self, folder):
+        self.index.save_index(str(Path(folder) / 'hnsw.bin'))
+
+    @classmethod
+    def load(cls, folder, meta):
+        if hnswlib is None:
+            raise ImportError("hnswlib is not installed; cannot load an HNSW index")
+        index = cls.__new__(cls)
+        index.params = meta['params']
+        index.index = hnswlib.Index(space='cosine', dim=index.params['dim'])
+        index.index.load_index(str(Path(folder) / 'hnsw.bin'), max_elements=meta['size'])
+        index.ef_search = index.params['ef_search']
+        return index
+
+
+INDEX_BACKENDS = {'exact': ExactIndex, 'hnsw': HNSWIndex}
+
+def build_index(embeddings, backend='auto', **params):
+    """
+    Build a nearest-neighbour index over search-space embeddings (rows in search_space_df order).
+
+    Args:
+        embeddings: (m, d) array or tensor of search-space embeddings.
+        backend: 'hnsw', 'exact', or 'auto' (HNSW if hnswlib is installed, exact otherwise).
+        params: Backend options, e.g. M, ef_construction, ef_search for HNSW.
+
+    Returns:
+        An index with query(query_embeddings, k) -> (scores, indices).
+    """
+    if backend == 'auto':
+        backend = 'hnsw' if hnswlib is not None else 'exact'
+    if isinstance(embeddings, torch.Tensor):
+        embeddings = embeddings.cpu().numpy()
+    start = time.perf_counter()
+    index = INDEX_BACKENDS[backend](embeddings, **params)
+    print(f"Built {backend} index over {len(index)} embeddings in {time.perf_counter() - start:.1f}s")
+    return index
+
+def save_index(index, folder):
+    """Save an index to a folder (index files plus meta.json) so it is built only once."""
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    index.save(folder)
+    meta = {'backend': index.backend, 'size': len(index), 'params': getattr(index, 'params', {})}
+    (folder / 'meta.json').write_text(json.dumps(meta, indent=2))
+
+def load_index(folder):
+    """Load an index saved with save_index."""
+    folder = Path(folder)
+    meta = json.loads((folder / 'meta.json').read_text())
+    return INDEX_BACKENDS[meta['backend']].load(folder, meta)
+
+def batch_process_matches(df, search_space_df, model, match_column_df, match_column_search, return_columns_df, return_columns_search, batch_size=100, max_records=None, output_path="match_results.xlsx", top_k=1, match_threshold=0.99, cache_dir=None, model_name='all-MiniLM-L6-v2', index=None):
+    """
+    Find the closest match in search_space_df for each entry of df, limited to max_records if specified.
+
+    Queries are encoded batch_size at a time and scored against the normalized search space
+    with one matrix multiply per batch; the matched values are gathered with vectorized
+    indexing. Rows whose name is missing or not a string are skipped, as before; empty
+    strings are encoded and matched like any other name.
+    With top_k > 1 each query gets k rows, ranked by the 'Rank' column.
+    With cache_dir set, both the search space and the queries go through the embedding cache,
+    so repeated runs only encode names that were never seen with model_name.
+    With index set (an index from build_index, or the folder of one saved with save_index),
+    the search space is not encoded: candidates come from index.query, whose rows must be
+    in search_space_df order.
+    """
+    if index is not None:
+        if isinstance(index, (str, Path)):
+            index = load_index(index)
+        if len(index) != len(search_space_df):
+            raise ValueError(f"Index has {len(index)} rows but the search space has {len(search_space_df)}")
+    else:
+        search_space_embeddings = normalize_embeddings(encode_texts(model, search_space_df[match_column_search].tolist(), cache_dir, model_name))
+
+    rows = df.iloc[:max_records] if max_records else df
+    names = rows[match_column_df]
+    # Only non-string names failed to encode before; empty strings are encoded and matched
+    valid = names.map(lambda x: isinstance(x, str)).to_numpy()
+    if not valid.all():
+        print(f"Skipping {int((~valid).sum())} records without a name")
+    rows = rows[valid]
+    names = names[valid].tolist()
+
+    # With a cache, all queries are looked up (and new ones encoded) in one go
+    cached_queries = cached_encode(model, names, cache_dir, model_name) if cache_dir is not None else None
+
+    score_batches, index_batches = [], []
+    for start in range(0, len(names), batch_size):
+        if cached_queries is not None:
+            query_embeddings = cached_queries[start:start + batch_size]
+        else:
+            query_embeddings = model.encode(names[start:start + batch_size], convert_to_tensor=True, batch_size=batch_size)
+        if index is not None:
+            scores, indices = index.query(query_embeddings.cpu().numpy(), k=top_k)
+        else:
+            scores, indices = top_k_similar(query_embeddings, search_space_embeddings, k=top_k)
+        score_batches.append(scores)
+        index_batches.append(indices)
+        print(f"Processed {min(start + batch_size, len(names))} records...")
+
+    k = min(top_k, len(search_space_df))
+    scores = np.concatenate(score_batches) if score_batches else np.empty((0, k))
+    indices = np.concatenate(index_batches) if index_batches else np.empty((0, k), dtype=int)
+
     print("Final save...")
-    final_df = pd.DataFrame(results, columns=return_columns_df  + return_columns_search + ['Similarity_Score'])
-    #if final_df['Similarity_Score'] =1, set match to 1, else set to null:
-    final_df['Match'] = final_df['Similarity_Score'].apply(lambda x: 1 if x >= 0.99 else None)
+    # One output row per (query, candidate); k == 1 keeps the original layout
+    query_positions = np.repeat(np.arange(len(rows)), k)
+    flat_indices = indices.reshape(-1)
+    result = {col: rows[col].to_numpy()[query_positions] for col in return_columns_df}
+    for col in return_columns_search:
+        result[col] = search_space_df[col].to_numpy()[flat_indices]
+    result['Similarity_Score'] = scores.reshape(-1)
+    final_df = pd.DataFrame(result, columns=return_columns_df + return_columns_search + ['Similarity_Score'])
+    if top_k > 1:
+        final_df['Rank'] = np.tile(np.arange(1, k + 1), len(rows))
+    #if final_df['Similarity_Score'] >= match_threshold, set match to 1, else set to null:
+    final_df['Match'] = final_df['Similarity_Score'].apply(lambda x: 1 if x >= match_threshold else None)
     with pd.ExcelWriter(output_path) as writer:
         final_df.to_excel(writer, sheet_name="MatchResults", index=False)
         search_space_df.to_excel(writer, sheet_name="SearchSpace", index=False)
@@ -0,0 +1,258 @@
+import re
+import numpy as np
+import pandas as pd
+from rapidfuzz import fuzz, process
+
+import zipcodes
+
+
+# Abbreviations common in NSF institution names, expanded so both sides compare alike
+NAME_ABBREVIATIONS = {
+    'univ': 'university',
+    'inst': 'institute',
+    'instit': 'institute',
+    'coll': 'college',
+    'tech': 'technology',
+    'ctr': 'center',
+    'cntr': 'center',
+    'dept': 'department',
+    'intl': 'international',
+    'natl': 'national',
+    'assoc': 'association',
+    'res': 'research',
+    'fdn': 'foundation',
+    'med': 'medical',
+    'sch': 'school',
+    'cmty': 'community',
+    'comm': 'community',
+}
+
+US_STATE_CODES = {
+    'alabama': 'AL', 'alaska': 'AK', 'arizona': 'AZ', 'arkansas': 'AR', 'california': 'CA',
+    'colorado': 'CO', 'connecticut': 'CT', 'delaware': 'DE', 'district of columbia': 'DC',
+    'florida': 'FL', 'georgia': 'GA', 'hawaii': 'HI', 'idaho': 'ID', 'illinois': 'IL',
+    'indiana': 'IN', 'iowa': 'IA', 'kansas': 'KS', 'kentucky': 'KY', 'louisiana': 'LA',
+    'maine': 'ME', 'maryland': 'MD', 'massachusetts': 'MA', 'michigan': 'MI', 'minnesota': 'MN',
+    'mississippi': 'MS', 'missouri': 'MO', 'montana': 'MT', 'nebraska': 'NE', 'nevada': 'NV',
+    'new hampshire': 'NH', 'new jersey': 'NJ', 'new mexico': 'NM', 'new york': 'NY',
+    'north carolina': 'NC', 'north dakota': 'ND', 'ohio': 'OH', 'oklahoma': 'OK', 'oregon': 'OR',
+    'pennsylvania': 'PA', 'rhode island': 'RI', 'south carolina': 'SC', 'south dakota': 'SD',
+    'tennessee': 'TN', 'texas': 'TX', 'utah': 'UT', 'vermont': 'VT', 'virginia': 'VA',
+    'washington': 'WA', 'west virginia': 'WV', 'wisconsin': 'WI', 'wyoming': 'WY',
+    'puerto rico': 'PR', 'guam': 'GU', 'virgin islands': 'VI', 'american samoa': 'AS',
+    'northern mariana islands': 'MP', 'federated states of micronesia': 'FM',
+    'marshall islands': 'MH', 'palau': 'PW',
+}
+
+NON_ALPHANUMERIC = re.compile(r'[^0-9a-z]+')
+
+
+def normalize_name(name):
+    """
+    Normalize an institution name for fuzzy matching: lowercase, '&' -> 'and',
+    punctuation to spaces and common abbreviations expanded. Returns None for missing names.
+    """
+    if not isinstance(name, str):
+        return None
+    tokens = NON_ALPHANUMERIC.sub(' ', name.lower().replace('&', ' and ')).split()
+    normalized = ' '.join(NAME_ABBREVIATIONS.get(token, token) for token in tokens)
+    return normalized or None
+
+
+def state_code(state):
+    """Two-letter code of a US state given by name ('Texas', 'texas') or code ('TX'); None if unknown."""
+    if not isinstance(state, str):
+        return None
+    state = ' '.join(state.strip().lower().split())
+    if len(state) == 2 and state.upper() in US_STATE_CODES.values():
+        return state.upper()
+    return US_STATE_CODES.get(state)
+
+
+def block_rows(rows, name_codes):
+    """Keep the first row of each distinct normalized name within a block."""
+    rows = np.asarray(rows, dtype=np.int64)
+    _, first = np.unique(name_codes[rows], return_index=True)
+    return rows[np.sort(first)]
+
+
+def key_blocks(keys, rows, name_codes):
+    """Candidate rows of each blocking key (keys aligned with rows; missing keys are skipped)."""
+    return {k: block_rows(rows[keys == k], name_codes) for k in pd.unique(keys[pd.notna(keys)])}
+
+
+def build_name_index(search_df, name_column='INSTNM', state_column='STABBR', zip_column='ZIP',
+                     id_columns=('UNITID', 'OPEID', 'OPEID6'), max_token_share=0.02, zip_lookup=None):
+    """
+    Precompute everything needed to match names against a search space once: normalized
+    names and the candidate blocks by state, ZIP3, CBSA and name token.
+
+    Within each block a normalized name maps to the first row that has it, as the old
+    cs_df[cs_df['INSTNM'] == match].iloc[0] lookup did; rows whose raw names differ but
+    normalize to the same name share that first row.
+
+    Args:
+        search_df: The search space, e.g. the College Scorecard file.
+        name_column: Column holding the names to match against.
+        state_column, zip_column: Columns used for blocking (None to disable that block).
+        id_columns: Columns returned with each match.
+        max_token_share: Tokens found in more than this share of names ('university',
+            'college', ...) are not indexed, since they do not narrow the candidates.
+        zip_lookup: Output of zipcodes.build_zip_lookup; adds the 'cbsa' block (CBSA, or
+            ZIP3 where the ZIP has no CBSA).
+
+    Returns:
+        Dict with the search frame, normalized names and the blocks.
+    """
+    search_df = search_df.reset_index(drop=True)
+    normalized = search_df[name_column].map(normalize_name)
+    name_codes, _ = pd.factorize(normalized)
+    valid = np.flatnonzero(name_codes >= 0)
+
+    blocks = {}
+    if state_column is not None and state_column in search_df.columns:
+        keys = search_df[state_column].map(state_code).to_numpy()[valid]
+        blocks['state'] = key_blocks(keys, valid, name_codes)
+    if zip_column is not None and zip_column in search_df.columns:
+        # ZIP3 without a lookup (see zipcodes.zip_block_key), the same ZIP cleaning as everywhere else
+        keys = zipcodes.zip_block_key(search_df[zip_column]).to_numpy()[valid]
+        blocks['zip3'] = key_blocks(keys, valid, name_codes)
+        if zip_lookup is not None:
+            keys = zipcodes.zip_block_key(search_df[zip_column], zip_lookup).to_numpy()[valid]
+            blocks['cbsa'] = key_blocks(keys, valid, name_codes)
+
+    postings = {}
+    for row in valid:
+        for token in set(normalized.iat[row].split()):
+            postings.setdefault(token, []).append(row)
+    max_rows = max(int(max_token_share * len(valid)), 1)
+    blocks['token'] = {token: np.asarray(rows, dtype=np.int64) for token, rows in postings.items()
+                       if len(rows) <= max_rows}
+
+    return {
+        'search_df': search_df,
+        'name_column': name_column,
+        'id_columns': [column for column in id_columns if column in search_df.columns],
+        'normalized': normalized.to_numpy(dtype=object),
+        'name_codes': name_codes,
+        'all_rows': block_rows(valid, name_codes),
+        'blocks': blocks,
+        'zip_lookup': zip_lookup,
+    }
+
+
+def token_candidates(name_index, name):
+    """Rows sharing at least one indexed token with a normalized name."""
+    postings = [name_index['blocks']['token'][token] for token in set(name.split())
+                if token in name_index['blocks']['token']]
+    if not postings:
+        return np.empty(0, dtype=np.int64)
+    return block_rows(np.unique(np.concatenate(postings)), name_index['name_codes'])
+
+
+def top_k_scores(scores, k):
+    """Column positions and values of the k highest scores of each row, best first."""
+    k = min(k, scores.shape[1])
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind='stable')
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+
+def blocked_fuzzy_match(df, name_index, name_column='Institution_Name_C', state_column=None, zip_column=None,
+                        block='state', return_columns=(), top_k=1, scorer=fuzz.WRatio, workers=-1):
+    """
+    Fuzzy-match every name in df against a search space prepared with build_name_index,
+    scoring each name only against the candidates in its block.
+
+    Names are normalized once (normalize_name) and each distinct (block key, name) pair is
+    scored once. Scores are computed on the normalized names with processor=None, so with
+    block=None they equal process.extractOne(normalize_name(name), normalized choices,
+    scorer=fuzz.WRatio, processor=None); the notebooks' extractOne(name, choices) on raw names
+    with its default processor can score and rank differently.
+    All names of a state or ZIP3 block are scored against that block with a single
+    rapidfuzz cdist call. A name whose key is missing or has no candidates falls back to
+    the rows sharing a rare token with it, and then to the whole search space.
+
+    Args:
+        df: Names to match, e.g. the institutions table.
+        name_index: Output of build_name_index.
+        name_column: Column of df holding the names.
+        state_column, zip_column: Columns of df holding the state (name or code) and ZIP.
+        block: 'state', 'zip3', 'cbsa' (needs the index's zip_lookup), 'token' or None
+            (score against every normalized name).
+        return_columns: Columns of df copied to the output.
+        top_k: Number of candidates returned per name; top_k > 1 adds a 'Rank' column.
+        scorer: rapidfuzz scorer (default WRatio, extractOne's default scorer), applied to
+            the normalized names.
+        workers: Threads used by cdist (-1: all cores).
+
+    Returns:
+        DataFrame with return_columns, 'Closest_Match', the id columns, 'Score' (0-100)
+        and 'Block' (the block the candidates came from).
+    """
+    return_columns = list(return_columns)
+    names = df[name_column].map(normalize_name)
+    valid = names.notna().to_numpy()
+    if not valid.all():
+        print(f"Skipping {int((~valid).sum())} records without a name")
+    rows = df[valid]
+    queries = pd.DataFrame({'name': names[valid].to_numpy()})
+    if block == 'state' and state_column is not None:
+        queries['key'] = rows[state_column].map(state_code).to_numpy()
+    elif block == 'zip3' and zip_column is not None:
+        queries['key'] = zipcodes.zip_block_key(rows[zip_column]).to_numpy()
+    elif block == 'cbsa' and zip_column is not None:
+        queries['key'] = zipcodes.zip_block_key(rows[zip_column], name_index['zip_lookup']).to_numpy()
+    else:
+        queries['key'] = None
+    queries['key'] = queries['key'].astype(object).where(queries['key'].notna(), None)
+
+    # Group the distinct (key, name) pairs by the candidate set they are scored against
+    pairs = queries.drop_duplicates().reset_index(drop=True)
+    groups = {}
+    for pair, (name, key) in enumerate(zip(pairs['name'], pairs['key'])):
+        candidates = name_index['blocks'].get(block, {}).get(key) if key is not None else None
+        if candidates is not None and len(candidates):
+            group = (block, key)
+        elif block is not None:
+            candidates = token_candidates(name_index, name)
+            group = ('token', name) if len(candidates) else ('all', None)
+        else:
+            group = ('all', None)
+        if group[0] == 'all':
+            candidates = name_index['all_rows']
+        groups.setdefault(group, (candidates, []))[1].append(pair)
+
+    k = top_k
+    pair_rows = np.full((len(pairs), k), -1, dtype=np.int64)
+    pair_scores = np.full((len(pairs), k), np.nan)
+    pair_blocks = np.empty(len(pairs), dtype=object)
+    for (group_block, _), (candidates, members) in groups.items():
+        scores = process.cdist(pairs['name'].to_numpy()[members], name_index['normalized'][candidates],
+                               scorer=scorer, processor=None, workers=workers, dtype=np.float32)
+        positions, values = top_k_scores(scores, k)
+        found = positions.shape[1]
+        pair_rows[np.ix_(members, np.arange(found))] = candidates[positions]
+        pair_scores[np.ix_(members, np.arange(found))] = values
+        pair_blocks[members] = group_block
+
+    # Map every query back to its pair, then gather one output row per (query, candidate)
+    pair_of_query = queries.merge(pairs.reset_index(), on=['name', 'key'], how='left')['index'].to_numpy()
+    matched_rows = pair_rows[pair_of_query].reshape(-1)
+    present = matched_rows >= 0
+    query_positions = np.repeat(np.arange(len(rows)), k)[present]
+    matched_rows = matched_rows[present]
+
+    search_df = name_index['search_df']
+    result = {col: rows[col].to_numpy()[query_positions] for col in return_columns}
+    result['Closest_Match'] = search_df[name_index['name_column']].to_numpy()[matched_rows]
+    for col in name_index['id_columns']:
+        result[col] = search_df[col].to_numpy()[matched_rows]
+    result['Score'] = pair_scores[pair_of_query].reshape(-1)[present]
+    result['Block'] = np.repeat(pair_blocks[pair_of_query], k)[present]
+    final_df = pd.DataFrame(result)
+    if top_k > 1:
+        final_df['Rank'] = np.tile(np.arange(1, k + 1), len(rows))[present]
+    print(f"Matched {len(rows)} names ({len(pairs)} distinct) in {len(groups)} blocks")
+    return final_df
@@ -0,0 +1,206 @@
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+import utils
+
+UEI = 'Institution_OrgUEINum_C'
+CONTRIBUTION_KEYS = [UEI, 'Year', 'Institution_Name_C', 'Institution_Zip_C', 'Institution_City_C', 'Institution_State_C']
+SCORECARD_COLUMNS = ['UNITID', 'OPEID', 'OPEID6']
+
+
+def clean_text(values):
+    """Strips text values; blank and missing values become None. Each distinct value is handled once."""
+    codes, uniques = pd.factorize(values)
+    stripped = pd.Series(uniques, dtype=object).astype(str).str.strip()
+    stripped = np.append(stripped.where(stripped != '', None).to_numpy(dtype=object), None)
+    return pd.Series(stripped[codes], index=values.index, dtype=object)
+
+
+def name_key(names):
+    """Lookup key of institution names: lowercased with whitespace collapsed."""
+    return clean_text(names).str.lower().str.split().str.join(' ')
+
+
+def institution_keys(grants):
+    """
+    The institution key of each grant: Institution_OrgUEINum stripped, falling back to the
+    institution name when blank (Institution_OrgUEINum_C in the notebooks). None if both are blank.
+    """
+    names = clean_text(grants['Institution_Name'])
+    ueis = clean_text(grants['Institution_OrgUEINum'])
+    return ueis.where(ueis.notna(), names)
+
+
+def institution_contributions(grants):
+    """
+    Summarizes grants at the (UEI, Year, name, ZIP5, city, state) grain, with the number of
+    awards and the total award amount of each combination. The institution index is
+    built from these rows only, so a year can be added or replaced without the grants.
+
+    The UEI is Institution_OrgUEINum stripped, falling back to the institution name when blank,
+    as in the institution notebooks. City and state come from Institution_City_C /
+    Institution_State_C when present (see apply_correction_table), else lower-cased raw values.
+
+    Parameters:
+        grants (pd.DataFrame): Grants with Year, Institution_* columns and AwardTotalIntnAmount.
+
+    Returns:
+        pd.DataFrame: CONTRIBUTION_KEYS plus AwardCount and AwardSum.
+    """
+    names = clean_text(grants['Institution_Name'])
+    city = grants['Institution_City_C'] if 'Institution_City_C' in grants else utils.lower_or_none(grants['Institution_City'])
+    state = grants['Institution_State_C'] if 'Institution_State_C' in grants else utils.lower_or_none(grants['Institution_State'])
+    frame = pd.DataFrame({
+        UEI: institution_keys(grants).to_numpy(),
+        'Year': grants['Year'].astype('int64').to_numpy(),
+        'Institution_Name_C': names.to_numpy(),
+        'Institution_Zip_C': utils.normalize_zip5(grants['Institution_Zip']).to_numpy(),
+        'Institution_City_C': clean_text(city).to_numpy(),
+        'Institution_State_C': clean_text(state).to_numpy(),
+        'Amount': pd.to_numeric(grants['AwardTotalIntnAmount'], errors='coerce').to_numpy(),
+    }).dropna(subset=[UEI])
+    return (frame.groupby(CONTRIBUTION_KEYS, dropna=False, sort=True)['Amount']
+            .agg(AwardCount='size', AwardSum='sum')
+            .reset_index())
+
+
+def weighted_mode(contributions, columns):
+    """
+    The most frequent value of columns (by number of awards) for each UEI, ignoring rows where
+    any of them is missing. Ties go to the smallest value, as with x.mode()[0].
+    """
+    totals = (contributions.dropna(subset=columns)
+              .groupby([UEI] + columns, sort=False)['AwardCount'].sum()
+              .reset_index())
+    totals = totals.sort_values([UEI, 'AwardCount'] + columns,
+                                ascending=[True, False] + [True] * len(columns), kind='stable')
+    return totals.drop_duplicates(UEI).set_index(UEI)[columns]
+
+
+def uei_table(table, columns):
+    """Reads an attached table keyed by UEI (Institution_OrgUEINum_C or Institution_OrgUEINum)."""
+    if table is None:
+        return pd.DataFrame(columns=columns, index=pd.Index([], name=UEI))
+    key = UEI if UEI in table.columns else 'Institution_OrgUEINum'
+    table = table.assign(**{UEI: clean_text(table[key])}).dropna(subset=[UEI])
+    return table.drop_duplicates(UEI).set_index(UEI)[[column for column in columns if column in table.columns]]
+
+
+def build_institution_index(contributions, scorecard=None, research=None):
+    """
+    Builds the institution index from contribution rows: one canonical record per UEI and
+    hash lookup tables from names and ZIP codes to UEIs.
+
+    Parameters:
+        contributions (pd.DataFrame): Output of institution_contributions (any number of years).
+        scorecard (pd.DataFrame): Optional UEI -> UNITID, OPEID, OPEID6 table (e.g. nearest.csv
+            or a fuzzymatch/deepmatch result with the UEI column).
+        research (pd.DataFrame): Optional UEI -> Research (R1/R2) table, e.g. r1r2.csv.
+
+    Returns:
+        dict: 'canonical' (DataFrame indexed by UEI with the most frequent name, ZIP5 and
+            city/state, AwardSum, AwardCount, FirstYear, LastYear, Scorecard IDs and Research),
+            'name_to_uei' (dict), 'zip_to_ueis' (dict), and the inputs.
+    """
+    canonical = contributions.groupby(UEI).agg(
+        AwardSum=('AwardSum', 'sum'),
+        AwardCount=('AwardCount', 'sum'),
+        FirstYear=('Year', 'min'),
+        LastYear=('Year', 'max'),
+    )
+    canonical = (canonical
+                 .join(weighted_mode(contributions, ['Institution_Name_C']))
+                 .join(weighted_mode(contributions, ['Institution_Zip_C']))
+                 .join(weighted_mode(contributions, ['Institution_City_C', 'Institution_State_C']))
+                 .join(uei_table(scorecard, SCORECARD_COLUMNS))
+                 .join(uei_table(research, ['Research'])))
+    canonical = canonical.sort_values('AwardCount', ascending=False, kind='stable')
+
+    # name -> the UEI with the most awards under that name
+    by_name = (contributions.assign(key=name_key(contributions['Institution_Name_C']))
+               .dropna(subset=['key'])
+               .groupby(['key', UEI], sort=False)['AwardCount'].sum()
+               .reset_index()
+               .sort_values(['key', 'AwardCount', UEI], ascending=[True, False, True], kind='stable')
+               .drop_duplicates('key'))
+    # ZIP5 -> all UEIs seen there, most awards first
+    by_zip = (contributions.dropna(subset=['Institution_Zip_C'])
+              .groupby(['Institution_Zip_C', UEI], sort=False)['AwardCount'].sum()
+              .reset_index()
+              .sort_values(['Institution_Zip_C', 'AwardCount', UEI], ascending=[True, False, True], kind='stable'))
+
+    return {
+        'canonical': canonical,
+        'name_to_uei': dict(zip(by_name['key'], by_name[UEI])),
+        'zip_to_ueis': by_zip.groupby('Institution_Zip_C', sort=False)[UEI].agg(tuple).to_dict(),
+        'contributions': contributions,
+        'scorecard': scorecard,
+        'research': research,
+    }
+
+
+def lookup_name(index, name):
+    """UEI of an institution name (case and spacing insensitive), or None."""
+    key = name_key(pd.Series([name])).iat[0]
+    return index['name_to_uei'].get(key)
+
+
+def lookup_zip(index, zipcode):
+    """UEIs seen at a ZIP code (any format normalize_zip5 accepts), most awards first."""
+    zip5 = utils.normalize_zip5(pd.Series([zipcode], dtype=object)).iat[0]
+    return index['zip_to_ueis'].get(zip5, ())
+
+
+def save_institution_index(index, path):
+    """
+    Writes an institution index to a folder: contributions.parquet (the source of truth),
+    canonical.parquet for direct use, and the attached scorecard/research tables.
+    """
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    index['contributions'].to_parquet(path / 'contributions.parquet', index=False)
+    index['canonical'].to_parquet(path / 'canonical.parquet')
+    for name in ['scorecard', 'research']:
+        if index[name] is not None:
+            index[name].to_parquet(path / f'{name}.parquet', index=False)
+
+
+def load_institution_index(path):
+    """Loads an index written by save_institution_index and rebuilds its lookup tables."""
+    path = Path(path)
+    attached = {name: pd.read_parquet(path / f'{name}.parquet') if (path / f'{name}.parquet').exists() else None
+                for name in ['scorecard', 'research']}
+    return build_institution_index(pd.read_parquet(path / 'contributions.parquet'), **attached)
+
+
+def update_institution_index(path, grants, scorecard=None, research=None):
+    """
+    Adds newly ingested grant years to the persistent institution index at path (creating it
+    if needed). Contribution rows of the years present in grants are replaced, other years
+    are kept, and the canonical records and lookups are rebuilt from the contribution rows.
+
+    Parameters:
+        path (Path): The index folder.
+        grants (pd.DataFrame): Grants of the new (or re-ingested) years.
+        scorecard, research (pd.DataFrame): Replace the attached tables when given.
+
+    Returns:
+        dict: The updated index (see build_institution_index).
+    """
+    path = Path(path)
+    new = institution_contributions(grants)
+    if (path / 'contributions.parquet').exists():
+        index = load_institution_index(path)
+        kept = index['contributions'][~index['contributions']['Year'].isin(new['Year'].unique())]
+        contributions = pd.concat([kept, new], ignore_index=True)
+        scorecard = index['scorecard'] if scorecard is None else scorecard
+        research = index['research'] if research is None else research
+    else:
+        contributions = new
+    contributions = contributions.sort_values(CONTRIBUTION_KEYS[:2], kind='stable').reset_index(drop=True)
+    index = build_institution_index(contributions, scorecard, research)
+    save_institution_index(index, path)
+    print(f"Institution index: {len(index['canonical'])} institutions, "
+          f"years {sorted(new['Year'].unique().tolist())} updated")
+    return index
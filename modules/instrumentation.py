@@ -0,0 +1,164 @@
+import json
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from pathlib import Path
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # not available on Windows; peak RSS is then reported as None
+    resource = None
+
+STAGE_COLUMNS = ['stage', 'year', 'wall_s', 'documents', 'bytes', 'errors', 'peak_rss_mb', 'docs_per_s', 'mb_per_s']
+ERROR_COLUMNS = ['stage', 'year', 'file', 'error_type', 'message']
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process (and its finished children), in MB. ru_maxrss is a
+    high-water mark: it never goes down, so a stage's sample is the peak of the run up to the
+    end of that stage, and a stage that raises it is one that needed more memory than any
+    stage before it.
+    """
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+    return max(own, children) / 1e6
+
+
+class RunReport:
+    """
+    Collects the telemetry of one ingest run: wall time, documents, bytes and peak RSS (sampled
+    when the stage closes, see peak_rss_mb) of every stage per year, a structured log of the
+    documents that failed, and the peak RSS of the run.
+
+    Pass it as run_report= to process_zip_files, process_dataframe (and its parallel and
+    incremental variants) or collect_data_from_zip / collect_data_from_xml_files, then
+    save() it as JSON and compare runs with compare_reports.
+    """
+
+    def __init__(self, name=None):
+        self.name = name
+        self.started = datetime.now()
+        self.start_time = time.perf_counter()
+        self.stages = []
+        self.errors = []
+
+    @contextmanager
+    def stage(self, name, year=None):
+        """
+        Times a stage. The yielded dict is filled in by the code being timed
+        ('documents', 'bytes', 'error_log').
+        """
+        record = {'stage': name, 'year': year, 'documents': 0, 'bytes': 0}
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            self.add_stage(record, time.perf_counter() - start)
+
+    def add_stage(self, record, wall_s):
+        """Records a finished stage; its structured errors go to the error log."""
+        record = dict(record)
+        error_log = record.pop('error_log', [])
+        record['wall_s'] = wall_s
+        record['errors'] = record.get('errors', len(error_log))
+        record['peak_rss_mb'] = peak_rss_mb()
+        self.stages.append(record)
+        self.add_errors(error_log, record['stage'], record['year'])
+
+    def add_errors(self, error_log, stage, year=None):
+        """Adds errors ({'file', 'error_type', 'message'} dicts) to the error log."""
+        for error in error_log:
+            self.errors.append({'stage': stage, 'year': year, **error})
+
+    def stage_table(self):
+        """The stages as a DataFrame with documents/s, MB/s and the peak RSS at the end of each."""
+        stages = pd.DataFrame(self.stages, columns=[c for c in STAGE_COLUMNS if c not in ('docs_per_s', 'mb_per_s')])
+        wall = stages['wall_s'].where(stages['wall_s'] > 0)
+        stages['docs_per_s'] = stages['documents'] / wall
+        stages['mb_per_s'] = stages['bytes'] / 1e6 / wall
+        return stages[STAGE_COLUMNS]
+
+    def totals(self):
+        """Stage totals over all years, with their throughput and highest peak RSS."""
+        stages = self.stage_table()
+        grouped = stages.groupby('stage', sort=False)
+        totals = grouped[['wall_s', 'documents', 'bytes', 'errors']].sum()
+        totals['peak_rss_mb'] = grouped['peak_rss_mb'].max()
+        wall = totals['wall_s'].where(totals['wall_s'] > 0)
+        totals['docs_per_s'] = totals['documents'] / wall
+        totals['mb_per_s'] = totals['bytes'] / 1e6 / wall
+        return totals.reset_index()[STAGE_COLUMNS[:1] + STAGE_COLUMNS[2:]]
+
+    def to_dict(self):
+        """The machine-readable run report."""
+        def records(frame):
+            return json.loads(frame.to_json(orient='records'))
+        return {
+            'name': self.name,
+            'started': self.started.isoformat(timespec='seconds'),
+            'finished': datetime.now().isoformat(timespec='seconds'),
+            'wall_s': time.perf_counter() - self.start_time,
+            'peak_rss_mb': peak_rss_mb(),
+            'totals': records(self.totals()),
+            'stages': records(self.stage_table()),
+            'errors': records(pd.DataFrame(self.errors, columns=ERROR_COLUMNS)),
+        }
+
+    def save(self, path):
+        """Writes the report as JSON. Returns the report dict."""
+        report = self.to_dict()
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(report, indent=2, default=str))
+        print(f"Run report: {report['wall_s']:.1f}s, peak RSS {report['peak_rss_mb'] or 0:.0f} MB, "
+              f"{len(report['errors'])} errors -> {path}")
+        return report
+
+
+def stage(report, name, year=None):
+    """report.stage(name, year), or a context yielding a throwaway dict when report is None."""
+    if report is None:
+        return nullcontext({'documents': 0, 'bytes': 0})
+    return report.stage(name, year)
+
+
+def load_report(path):
+    """Reads a run report written by RunReport.save."""
+    return json.loads(Path(path).read_text())
+
+
+def compare_reports(baseline, current, tolerance=0.1, by_year=False):
+    """
+    Compares the throughput of two run reports, stage by stage (and year by year with
+    by_year=True), to catch regressions between runs.
+
+    Parameters:
+        baseline, current (dict or Path): Reports from RunReport.save / load_report.
+        tolerance (float): Relative drop in documents/s (or MB/s when a stage has no
+            document count) flagged as a regression.
+        by_year (bool): Compare per (stage, year) instead of per stage totals.
+
+    Returns:
+        pd.DataFrame: Baseline and current wall time and throughput, their ratio and a
+            'regression' flag.
+    """
+    baseline = baseline if isinstance(baseline, dict) else load_report(baseline)
+    current = current if isinstance(current, dict) else load_report(current)
+    table, keys = ('stages', ['stage', 'year']) if by_year else ('totals', ['stage'])
+    columns = keys + ['wall_s', 'documents', 'peak_rss_mb', 'docs_per_s', 'mb_per_s']
+    before = pd.DataFrame(baseline[table], columns=columns)
+    after = pd.DataFrame(current[table], columns=columns)
+    comparison = before.merge(after, on=keys, how='outer', suffixes=('_baseline', '_current'))
+    throughput = comparison['docs_per_s_baseline'].notna() & (comparison['docs_per_s_baseline'] > 0)
+    comparison['ratio'] = (comparison['docs_per_s_current'] / comparison['docs_per_s_baseline']).where(
+        throughput, comparison['mb_per_s_current'] / comparison['mb_per_s_baseline'])
+    comparison['regression'] = comparison['ratio'] < 1 - tolerance
+    print(comparison.to_string(index=False))
+    return comparison
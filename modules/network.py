@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+
+def award_memberships(invest, person_column='NSFID', award_column='AwardID'):
+    """
+    Integer-coded (award, investigator, domain) rows of an investigator table, one per
+    investigator per award. Rows without an award or investigator id are dropped.
+
+    Returns:
+        tuple: (memberships DataFrame with award, person and domain codes,
+                person ids indexed by person code)
+    """
+    domains = invest['InstitutionDomain'].astype(object)
+    rows = pd.DataFrame({
+        'award': invest[award_column].to_numpy(),
+        'person': invest[person_column].to_numpy(),
+        # Empty domains are treated as unknown
+        'domain': domains.where(domains.notna() & (domains != ''), None).to_numpy(),
+    }).dropna(subset=['award', 'person']).drop_duplicates(['award', 'person'])
+    person_codes, people = pd.factorize(rows['person'])
+    memberships = pd.DataFrame({
+        'award': pd.factorize(rows['award'])[0].astype(np.int32),
+        'person': person_codes.astype(np.int32),
+        'domain': pd.factorize(rows['domain'])[0].astype(np.int32),
+    })
+    return memberships, pd.Index(people, name=person_column)
+
+
+def coinvestigator_network(invest, person_column='NSFID', award_column='AwardID'):
+    """
+    Builds the corpus-wide co-investigator network from an investigator table (e.g. invest_final)
+    as a sparse edge list plus per-investigator metrics.
+
+    Two investigators are linked when they are on the same award. The edge is cross-institution
+    for an award when their InstitutionDomain values are both known and differ (see
+    add_collaboration_metrics in utils for the domains).
+
+    Parameters:
+        invest (pd.DataFrame): Investigator table with AwardID, NSFID and InstitutionDomain.
+        person_column (str): Column identifying an investigator across awards.
+        award_column (str): Column identifying the award.
+
+    Returns:
+        tuple:
+            nodes (pd.DataFrame): One row per investigator, indexed by node code, with the
+                investigator id, awards, collaborators (distinct co-investigators) and
+                cross_institution_collaborators.
+            edges (pd.DataFrame): One row per linked pair with int32 source < target node
+                codes, awards (shared awards) and cross_institution_awards.
+    """
+    memberships, people = award_memberships(invest, person_column, award_column)
+
+    # All pairs of investigators on the same award, each pair once (source < target)
+    pairs = memberships.merge(memberships, on='award', suffixes=('_a', '_b'))
+    pairs = pairs[pairs['person_a'] < pairs['person_b']]
+    cross = ((pairs['domain_a'] != pairs['domain_b'])
+             & (pairs['domain_a'] >= 0) & (pairs['domain_b'] >= 0))
+    edges = (pd.DataFrame({'source': pairs['person_a'], 'target': pairs['person_b'], 'cross': cross})
+             .groupby(['source', 'target'], sort=True)['cross']
+             .agg(awards='size', cross_institution_awards='sum')
+             .reset_index())
+    edges = edges.astype({'source': np.int32, 'target': np.int32,
+                          'awards': np.int32, 'cross_institution_awards': np.int32})
+
+    # Node metrics from the edge list: every edge counts for both of its ends
+    n = len(people)
+    ends = np.concatenate([edges['source'].to_numpy(), edges['target'].to_numpy()])
+    cross_edge = np.tile(edges['cross_institution_awards'].to_numpy() > 0, 2)
+    nodes = pd.DataFrame({
+        people.name: people,
+        'awards': np.bincount(memberships['person'], minlength=n),
+        'collaborators': np.bincount(ends, minlength=n),
+        'cross_institution_collaborators': np.bincount(ends[cross_edge], minlength=n),
+    })
+    nodes.index.name = 'node'
+    print(f"Co-investigator network: {n} investigators, {len(edges)} edges")
+    return nodes, edges
+
+
+def save_network(nodes, edges, path):
+    """
+    Writes the network as two Parquet files, path/nodes.parquet and path/edges.parquet.
+
+    Parameters:
+        nodes, edges (pd.DataFrame): Output of coinvestigator_network.
+        path (Path): The output directory.
+    """
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    nodes.to_parquet(path / 'nodes.parquet')
+    edges.to_parquet(path / 'edges.parquet', index=False)
+
+
+def load_network(path):
+    """Reads a network written by save_network. Returns (nodes, edges)."""
+    path = Path(path)
+    return pd.read_parquet(path / 'nodes.parquet'), pd.read_parquet(path / 'edges.parquet')
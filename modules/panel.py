@@ -1,2 +1,220 @@
-#Add functions on operations on panel data here.
+import numpy as np
+import pandas as pd
 
+import utils
+import institutions
+
+# Award flags summed into the panels when present (see utils.create_grant_features)
+PANEL_FLAGS = [
+    'sbir', 'sbir_1', 'sbir_2', 'sttr', 'sttr_1', 'sttr_2', 'icorps', 'career', 'rapid', 'eager',
+    'collaborative', 'teams', 'hub', 'site', 'node', 'total_icorps',
+]
+# Collaboration counts of an award, read from its PI row (see utils.add_collaboration_metrics)
+COLLABORATION_METRICS = [
+    'TotalInvestigators', 'TotalCollaborativeInstitutions', 'TotalAtPIUniversity', 'TotalOutsidePIUniversity',
+]
+
+
+def award_positions(grants, invest=None):
+    """
+    Keeps each AwardID once (an award listed in several archives counts once) and finds the
+    grant row of every investigator row, with one factorize over both tables.
+
+    The record kept is chosen as in utils.deduplicate_awards: the latest MaxAmdLetterDate,
+    then the newest archive (Year), then the later row.
+
+    Returns:
+        tuple: (grants with a positional index, grant position of each investigator row
+            (-1 if its award is not in grants), or None without invest)
+    """
+    award_ids = utils.as_key(grants['AwardID'])
+    keys = [award_ids]
+    if invest is not None:
+        keys.append(utils.as_key(invest['AwardID'], like=award_ids))
+    codes, uniques = pd.factorize(pd.concat(keys, ignore_index=True))
+    grant_codes = codes[:len(grants)]
+    rows = np.arange(len(grants))
+    # Sort each award's rows by (date, year, position); later rows overwrite earlier ones,
+    # so each code ends up with its latest record. The extra last slot collects the rows
+    # without an AwardID
+    sort_keys = [rows]
+    if 'Year' in grants.columns:
+        sort_keys.append(grants['Year'].to_numpy())
+    if 'MaxAmdLetterDate' in grants.columns:
+        sort_keys.append(utils.letter_dates(grants['MaxAmdLetterDate']))
+    order = np.lexsort(sort_keys + [grant_codes])
+    row_of_code = np.full(len(uniques) + 1, -1, dtype=np.int64)
+    row_of_code[grant_codes[order]] = order
+    keep = (row_of_code[grant_codes] == rows) | (grant_codes < 0)
+    if not keep.all():
+        grants = grants[keep]
+        row_of_code = np.where(row_of_code >= 0, np.cumsum(keep)[row_of_code] - 1, -1)
+    grants = grants.reset_index(drop=True)
+    if invest is None:
+        return grants, None
+    invest_codes = codes[len(award_ids):]
+    return grants, np.where(invest_codes >= 0, row_of_code[invest_codes], -1)
+
+
+def award_metrics(grants, invest=None, flags=PANEL_FLAGS, positions=None):
+    """
+    The per-award values summed into the panels, one row per grant row: AwardSum (the
+    AwardTotalIntnAmount), the flags present in grants and, with invest, the collaboration
+    counts of the award and MultiInstitutionAwards (1 when it spans several institutions).
+
+    Parameters:
+        grants (pd.DataFrame): Grants with unique AwardIDs (see award_positions).
+        invest (pd.DataFrame): The investigator table, or None.
+        flags (list): Flag columns to include when present.
+        positions (np.ndarray): Grant position of each investigator row (see award_positions).
+
+    Returns:
+        pd.DataFrame: Float columns aligned with grants (a positional index).
+    """
+    values = {'AwardSum': pd.to_numeric(grants['AwardTotalIntnAmount'], errors='coerce').fillna(0).to_numpy(float)}
+    for flag in flags:
+        if flag in grants.columns:
+            values[flag] = pd.to_numeric(grants[flag], errors='coerce').fillna(0).to_numpy(float)
+    if invest is not None:
+        if positions is None:
+            _, positions = award_positions(grants, invest)
+        # Each award's collaboration counts are repeated on all its rows; the (last) PI row has them
+        pi_rows = np.flatnonzero((invest['PI#'].to_numpy() == 1) & (positions >= 0))
+        pi_of_grant = np.full(len(grants), len(invest), dtype=np.int64)
+        pi_of_grant[positions[pi_rows]] = pi_rows
+        for column in COLLABORATION_METRICS:
+            values[column] = np.append(invest[column].to_numpy(float), 0)[pi_of_grant]
+        values['MultiInstitutionAwards'] = (values['TotalCollaborativeInstitutions'] > 1).astype(float)
+    return pd.DataFrame(values)
+
+
+def aggregate_panel(entities, years, metrics, entity_column, year_range=None, balanced=True):
+    """
+    Sums metrics by (entity, year) in one pass: each row gets a cell code
+    entity * n_years + year and every column is summed with np.bincount.
+
+    Parameters:
+        entities (pd.Series): Entity id of each row (missing ids are dropped).
+        years (array): Year of each row.
+        metrics (pd.DataFrame): Numeric columns aligned with the rows.
+        entity_column (str): Name of the entity column in the panel.
+        year_range (iterable): Years of the panel (default: min to max year of the data).
+        balanced (bool): One row per entity and year, zero-filled; otherwise only the
+            cells with at least one row.
+
+    Returns:
+        pd.DataFrame: entity_column, Year, AwardCount and one sum per metrics column,
+            sorted by entity and year.
+    """
+    entities = pd.Series(entities).reset_index(drop=True)
+    valid = entities.notna().to_numpy() & pd.notna(years)
+    entity_codes, entity_ids = pd.factorize(entities[valid], sort=True)
+    years = np.asarray(years)[valid].astype(np.int64)
+    if year_range is None:
+        year_range = range(years.min(), years.max() + 1) if len(years) else []
+    year_range = np.asarray(sorted(year_range), dtype=np.int64)
+    year_codes = np.searchsorted(year_range, years)
+    in_range = (year_codes < len(year_range)) & (year_range[np.minimum(year_codes, len(year_range) - 1)] == years)
+    cells = (entity_codes * len(year_range) + year_codes)[in_range]
+    size = len(entity_ids) * len(year_range)
+
+    columns = {'AwardCount': np.bincount(cells, minlength=size)}
+    for column in metrics.columns:
+        columns[column] = np.bincount(cells, weights=metrics[column].to_numpy(float)[valid][in_range], minlength=size)
+    panel = pd.DataFrame(columns)
+    panel.insert(0, 'Year', np.tile(year_range, len(entity_ids)))
+    panel.insert(0, entity_column, np.repeat(np.asarray(entity_ids, dtype=object), len(year_range)))
+    if not balanced:
+        panel = panel[panel['AwardCount'] > 0].reset_index(drop=True)
+    return panel
+
+
+def institution_year_panel(grants, invest=None, year_range=None, balanced=True, flags=PANEL_FLAGS):
+    """
+    Institution x year panel of award counts and sums, program flags and collaboration counts,
+    replacing the notebooks' pivot_table(aggfunc=['sum', 'count']).
+
+    Institutions are keyed by Institution_OrgUEINum_C (see institutions.institution_keys).
+    An award listed in several archives is counted once, in its latest amendment (see
+    award_positions).
+
+    Parameters:
+        grants (pd.DataFrame): Grants with Year, AwardID, Institution_* and AwardTotalIntnAmount
+            (e.g. grants_final after create_grant_features).
+        invest (pd.DataFrame): The investigator table, for the collaboration counts.
+        year_range (iterable): Years of the panel (default: all years in grants).
+        balanced (bool): Include zero rows for years without awards.
+        flags (list): Flag columns to sum, when present in grants.
+
+    Returns:
+        pd.DataFrame: Institution_OrgUEINum_C, Year, AwardCount, AwardSum and the flag and
+            collaboration sums.
+    """
+    grants, positions = award_positions(grants, invest)
+    keys = grants[institutions.UEI] if institutions.UEI in grants.columns else institutions.institution_keys(grants)
+    metrics = award_metrics(grants, invest, flags, positions)
+    panel = aggregate_panel(keys, grants['Year'].to_numpy(), metrics, institutions.UEI,
+                            year_range, balanced)
+    print(f"Institution panel: {panel[institutions.UEI].nunique()} institutions, {len(panel)} rows")
+    return panel
+
+
+def investigator_year_panel(grants, invest, person_column='NSFID', year_range=None, balanced=True,
+                            flags=PANEL_FLAGS):
+    """
+    Investigator x year panel: the awards each investigator is on per year (AwardCount),
+    the awards they lead (PIAwards) and the sums of the award metrics of institution_year_panel.
+
+    The investigator table is already long (one row per investigator per award), so no
+    wide-to-long reshaping is needed; each row takes its award's Year and metrics by AwardID.
+
+    Parameters:
+        grants (pd.DataFrame): Grants with Year, AwardID and the metric columns.
+        invest (pd.DataFrame): The investigator table (e.g. invest_final).
+        person_column (str): Column identifying an investigator across awards.
+        year_range (iterable): Years of the panel (default: all years in grants).
+        balanced (bool): Include zero rows for years without awards.
+
+    Returns:
+        pd.DataFrame: person_column, Year, AwardCount, PIAwards and the metric sums.
+    """
+    grants, positions = award_positions(grants, invest)
+    metrics = award_metrics(grants, invest, flags, positions)
+
+    found = positions >= 0
+    rows = positions[found]
+    metrics = metrics.iloc[rows].reset_index(drop=True)
+    metrics.insert(0, 'PIAwards', (invest['PI#'].to_numpy()[found] == 1).astype(float))
+    panel = aggregate_panel(invest[person_column][found], grants['Year'].to_numpy()[rows],
+                            metrics, person_column, year_range, balanced)
+    print(f"Investigator panel: {panel[person_column].nunique()} investigators, {len(panel)} rows")
+    return panel
+
+
+def add_panel_year(panel, year_panel, entity_column):
+    """
+    Adds (or replaces) one year in a panel: the rows of the years in year_panel are replaced,
+    the other years are kept as they are, and the result is balanced again so entities first
+    seen in the new year get zero rows for the earlier years.
+
+    Parameters:
+        panel (pd.DataFrame): An existing panel (e.g. from institution_year_panel).
+        year_panel (pd.DataFrame): The panel of the new year(s), built with the same function.
+        entity_column (str): The entity column (Institution_OrgUEINum_C, NSFID).
+
+    Returns:
+        pd.DataFrame: The combined balanced panel, sorted by entity and year.
+    """
+    kept = panel[~panel['Year'].isin(year_panel['Year'].unique())]
+    combined = pd.concat([kept, year_panel], ignore_index=True)
+    return balance_panel(combined, entity_column)
+
+
+def balance_panel(panel, entity_column, year_range=None):
+    """Zero-fills a panel to one row per entity and year (default: min to max year)."""
+    if year_range is None:
+        year_range = range(panel['Year'].min(), panel['Year'].max() + 1)
+    entities = np.sort(panel[entity_column].dropna().unique().astype(object))
+    grid = pd.MultiIndex.from_product([entities, list(year_range)], names=[entity_column, 'Year'])
+    balanced = panel.set_index([entity_column, 'Year']).reindex(grid, fill_value=0).reset_index()
+    return balanced.astype({'AwardCount': np.int64})
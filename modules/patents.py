@@ -0,0 +1,114 @@
+import pandas as pd
+from pathlib import Path
+
+# Rows read per chunk; with only the name columns loaded this stays well under 1 GB
+CHUNK_ROWS = 500_000
+# Partial counts are merged once they hold this many rows, bounding memory by the distinct names
+COMPACT_ROWS = 2_000_000
+TABLE_SUFFIXES = ('.csv', '.tsv', '.zip', '.gz', '.bz2')
+
+
+def table_separator(path):
+    """PatentsView ships tab-separated .tsv files (optionally zipped); the assignment data is CSV."""
+    return '\t' if '.tsv' in Path(path).suffixes else ','
+
+
+def read_table_chunks(path, usecols, chunksize=CHUNK_ROWS, dtype=str):
+    """
+    Iterates over a large CSV/TSV in fixed-size chunks, parsing only usecols. Every column is
+    read as a string unless dtype says otherwise, so pandas never infers types over the file.
+    """
+    return pd.read_csv(path, sep=table_separator(path), usecols=list(usecols), dtype=dtype,
+                       chunksize=chunksize, keep_default_na=False, na_values=[''],
+                       on_bad_lines='warn')
+
+
+def combine_counts(partial, columns):
+    """Sums partial count tables that share the key columns."""
+    return pd.concat(partial, ignore_index=True).groupby(columns, sort=False, dropna=False)['count'].sum().reset_index()
+
+
+def count_entities(paths, name_column='ee_name', key_columns=(), chunksize=CHUNK_ROWS, compact_rows=COMPACT_ROWS):
+    """
+    Counts distinct assignee names (e.g. value_counts('ee_name') of assignee.csv) over one or
+    more files without loading them: each chunk is reduced to its name counts, and the
+    partial counts are merged whenever they grow past compact_rows.
+
+    Names are stripped and blank names dropped.
+
+    Parameters:
+        paths (Path or list): The assignee file(s).
+        name_column (str): Column with the entity name.
+        key_columns (list): Extra columns kept with the name (e.g. ['ee_state', 'ee_country']);
+            each distinct combination is counted.
+        chunksize (int): Rows per chunk.
+        compact_rows (int): Partial count rows kept before merging them.
+
+    Returns:
+        pd.DataFrame: name_column, key_columns and count, sorted by name.
+    """
+    paths = [paths] if isinstance(paths, (str, Path)) else list(paths)
+    columns = [name_column] + list(key_columns)
+    partial = []
+    pending = 0
+    rows = 0
+    for path in paths:
+        for chunk in read_table_chunks(path, columns, chunksize):
+            rows += len(chunk)
+            chunk[name_column] = chunk[name_column].str.strip()
+            chunk = chunk[chunk[name_column].notna() & (chunk[name_column] != '')]
+            counts = chunk.groupby(columns, sort=False, dropna=False).size().rename('count').reset_index()
+            partial.append(counts)
+            pending += len(counts)
+            if pending > compact_rows:
+                partial = [combine_counts(partial, columns)]
+                pending = len(partial[0])
+        print(f"Counted {rows} rows from {path}")
+    if not partial:
+        return pd.DataFrame(columns=columns + ['count'])
+    entities = combine_counts(partial, columns)
+    entities['count'] = entities['count'].astype('int64')
+    return entities.sort_values(columns, kind='stable').reset_index(drop=True)
+
+
+def write_entity_table(entities, path):
+    """
+    Writes the deduplicated entity table as Parquet, the search space of the assignee
+    matching step (see deepmatch.batch_process_matches / fuzzymatch.build_name_index).
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    entities.to_parquet(path, index=False)
+    print(f"Wrote {len(entities)} entities to {path}")
+
+
+def load_entity_table(path, min_count=1, columns=None):
+    """Reads an entity table, keeping entities with at least min_count rows."""
+    entities = pd.read_parquet(path, columns=columns)
+    return entities[entities['count'] >= min_count].reset_index(drop=True)
+
+
+def build_entity_table(paths, output_path, name_column='ee_name', key_columns=(), chunksize=CHUNK_ROWS):
+    """Counts the entities of the assignee file(s) and writes the entity table. Returns it."""
+    entities = count_entities(paths, name_column, key_columns, chunksize)
+    write_entity_table(entities, output_path)
+    return entities
+
+
+def sample_tables(folder, nrows=1000):
+    """
+    Reads the first nrows of every table in a PatentsView folder (as strings, no type inference),
+    for a look at the files without loading them.
+
+    Returns:
+        dict: File stem -> sample DataFrame.
+    """
+    sheets = {}
+    for path in sorted(Path(folder).iterdir()):
+        if not path.name.lower().endswith(TABLE_SUFFIXES):
+            continue
+        try:
+            sheets[path.name.split('.')[0]] = pd.read_csv(path, sep=table_separator(path), nrows=nrows, dtype=str)
+        except Exception as e:
+            print(f"Error reading {path}: {e}")
+    return sheets
@@ -0,0 +1,310 @@
+import numpy as np
+import pandas as pd
+from pathlib import Path
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pyarrow.dataset as ds
+
+import utils
+
+CODE_TYPE = pa.dictionary(pa.int32(), pa.string())
+
+
+def build_schema(columns, date_columns=(), amount_columns=(), code_columns=(), int_columns=None):
+    """
+    Declares the Arrow schema of a parsed table: typed dates, float amounts,
+    dictionary-encoded codes and plain strings for everything else.
+
+    Parameters:
+        columns (list): The column names, in output order.
+        date_columns, amount_columns, code_columns (list): Columns of each semantic type.
+        int_columns (dict): Column name -> Arrow integer type.
+
+    Returns:
+        pa.Schema
+    """
+    int_columns = int_columns or {}
+    fields = []
+    for column in columns:
+        if column in int_columns:
+            arrow_type = int_columns[column]
+        elif column in date_columns:
+            arrow_type = pa.date32()
+        elif column in amount_columns:
+            arrow_type = pa.float64()
+        elif column in code_columns:
+            arrow_type = CODE_TYPE
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(column, arrow_type))
+    return pa.schema(fields)
+
+
+GRANTS_SCHEMA = build_schema(
+    utils.GRANT_COLUMNS,
+    date_columns=utils.GRANT_DATE_COLUMNS,
+    amount_columns=utils.GRANT_AMOUNT_COLUMNS,
+    code_columns=utils.GRANT_CODE_COLUMNS,
+    int_columns={'Year': pa.int16()},
+)
+INVESTIGATORS_SCHEMA = build_schema(
+    utils.INVESTIGATOR_COLUMNS,
+    date_columns=utils.INVESTIGATOR_DATE_COLUMNS,
+    code_columns=utils.INVESTIGATOR_CODE_COLUMNS,
+    int_columns={column: pa.int32() for column in utils.INVESTIGATOR_DTYPES},
+)
+# Hive-style Year=YYYY directories
+YEAR_PARTITIONING = ds.partitioning(pa.schema([pa.field('Year', pa.int16())]), flavor='hive')
+
+# Split storage: AbstractNarration goes to a separate text store and the grants keep AbstractRef,
+# the AwardID under which the text is stored in the award's Year partition (NA without abstract)
+ABSTRACT_COLUMN = 'AbstractNarration'
+ABSTRACT_REF = 'AbstractRef'
+GRANTS_SPLIT_SCHEMA = build_schema(
+    [ABSTRACT_REF if column == ABSTRACT_COLUMN else column for column in utils.GRANT_COLUMNS],
+    date_columns=utils.GRANT_DATE_COLUMNS,
+    amount_columns=utils.GRANT_AMOUNT_COLUMNS,
+    code_columns=utils.GRANT_CODE_COLUMNS,
+    int_columns={'Year': pa.int16()},
+)
+ABSTRACTS_SCHEMA = pa.schema([pa.field('AwardID', pa.string()), pa.field(ABSTRACT_COLUMN, pa.string()),
+                              pa.field('Year', pa.int16())])
+# Small row groups so an AwardID lookup only decompresses a few thousand abstracts
+ABSTRACT_ROW_GROUP = 5_000
+
+
+def to_arrow_table(df, schema):
+    """
+    Converts a parsed (string) table to an Arrow table with the declared schema.
+    Unparseable dates and amounts become nulls; columns missing from df are all-null.
+
+    Parameters:
+        df (pd.DataFrame): The grants or investigator table.
+        schema (pa.Schema): GRANTS_SCHEMA, INVESTIGATORS_SCHEMA or a compatible schema.
+
+    Returns:
+        pa.Table
+    """
+    arrays = []
+    for field in schema:
+        if field.name not in df.columns:
+            arrays.append(pa.nulls(len(df), type=field.type))
+            continue
+        values = df[field.name]
+        if pa.types.is_date32(field.type):
+            if not pd.api.types.is_datetime64_any_dtype(values):
+                values = pd.to_datetime(values, format=utils.DATE_FORMAT, errors='coerce')
+            arrays.append(pa.array(values.dt.date, type=field.type, from_pandas=True))
+        elif pa.types.is_floating(field.type) or pa.types.is_integer(field.type):
+            values = pd.to_numeric(values, errors='coerce')
+            arrays.append(pa.array(values, type=field.type, from_pandas=True))
+        elif pa.types.is_dictionary(field.type):
+            values = values.astype(object).where(values.notna(), None)
+            arrays.append(pa.array(values, type=pa.string()).dictionary_encode().cast(field.type))
+        else:
+            values = values.astype(object).where(values.notna(), None)
+            arrays.append(pa.array(values, type=field.type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def write_grants_parquet(grants, path, schema=None, abstract_store=None):
+    """
+    Writes the grants table as a Parquet dataset partitioned by Year (path/Year=YYYY/...).
+    Existing partitions for the years being written are replaced; other years are kept.
+
+    Parameters:
+        grants (pd.DataFrame): The grants table (e.g. grants_final).
+        path (Path): The dataset directory.
+        schema (pa.Schema): The declared schema (default: GRANTS_SCHEMA, or GRANTS_SPLIT_SCHEMA
+            for grants whose abstracts were split off).
+        abstract_store (Path): Split the abstracts off into this text store first
+            (see split_abstracts).
+    """
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    if abstract_store is not None:
+        grants = split_abstracts(grants, abstract_store)
+    if schema is None:
+        schema = GRANTS_SPLIT_SCHEMA if ABSTRACT_REF in grants.columns else GRANTS_SCHEMA
+    table = to_arrow_table(grants, schema)
+    ds.write_dataset(table, path, format='parquet', partitioning=YEAR_PARTITIONING,
+                     existing_data_behavior='delete_matching',
+                     basename_template='part-{i}.parquet')
+    print(f"Wrote {table.num_rows} grants to {path}")
+
+
+def write_investigators_parquet(invest, path, schema=INVESTIGATORS_SCHEMA, row_group_size=100_000):
+    """
+    Writes the investigator table as a single Parquet file sorted by AwardID, so row-group
+    statistics let AwardID filters skip most of the file.
+
+    Parameters:
+        invest (pd.DataFrame): The investigator table (e.g. invest_final).
+        path (Path): The dataset directory; the data goes to path/investigators.parquet.
+        schema (pa.Schema): The declared schema.
+        row_group_size (int): Rows per row group.
+    """
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    table = to_arrow_table(invest, schema)
+    if table.num_rows:
+        table = table.sort_by([('AwardID', 'ascending'), ('PI#', 'ascending')])
+    pq.write_table(table, path / 'investigators.parquet', row_group_size=row_group_size)
+    print(f"Wrote {table.num_rows} investigators to {path}")
+
+
+def read_grants_parquet(path, columns=None, filters=None):
+    """
+    Loads the grants Parquet dataset, reading only the requested columns and pushing the
+    filters down to the Year partitions and row groups.
+
+    Example:
+        read_grants_parquet(path, columns=['AwardID', 'Institution_OrgUEINum', 'AwardAmount'],
+                            filters=[('Year', '>=', 2015)])
+    only opens the 2015+ partitions and only decodes those three columns.
+
+    Parameters:
+        path (Path): The dataset directory.
+        columns (list): Columns to load (default: all).
+        filters: Filters in pyarrow.parquet's list-of-tuples form, or a pyarrow.dataset expression.
+
+    Returns:
+        pd.DataFrame: Dates as datetime64, amounts as float64 and codes as category.
+    """
+    table = pq.read_table(path, columns=columns, filters=filters, partitioning=YEAR_PARTITIONING)
+    return table.to_pandas(date_as_object=False)
+
+
+def read_investigators_parquet(path, columns=None, filters=None):
+    """
+    Loads the investigator Parquet dataset with column projection and filter pushdown,
+    e.g. filters=[('AwardID', 'in', award_ids)].
+
+    Returns:
+        pd.DataFrame
+    """
+    table = pq.read_table(Path(path) / 'investigators.parquet', columns=columns, filters=filters)
+    return table.to_pandas(date_as_object=False)
+
+
+def write_abstracts(grants, path, row_group_size=ABSTRACT_ROW_GROUP, compression='zstd'):
+    """
+    Writes the abstracts of a grants table to the text store: a zstd-compressed Parquet
+    dataset of AwardID and AbstractNarration, partitioned by Year and sorted by AwardID so
+    row-group statistics let AwardID lookups skip most of the store. Existing partitions
+    for the years being written are replaced; other years are kept. Blank abstracts are
+    not stored.
+
+    Parameters:
+        grants (pd.DataFrame): Grants with AwardID, Year and AbstractNarration.
+        path (Path): The store directory.
+        row_group_size (int): Abstracts per row group.
+        compression (str): Parquet compression codec.
+
+    Returns:
+        int: Number of abstracts written.
+    """
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    stored = grants[ABSTRACT_COLUMN].notna() & (grants[ABSTRACT_COLUMN].str.strip() != '')
+    table = to_arrow_table(grants.loc[stored, ['AwardID', ABSTRACT_COLUMN, 'Year']], ABSTRACTS_SCHEMA)
+    table = table.sort_by([('Year', 'ascending'), ('AwardID', 'ascending')])
+    file_options = ds.ParquetFileFormat().make_write_options(compression=compression)
+    ds.write_dataset(table, path, format='parquet', partitioning=YEAR_PARTITIONING,
+                     existing_data_behavior='delete_matching', file_options=file_options,
+                     max_rows_per_group=row_group_size, min_rows_per_group=min(row_group_size, max(table.num_rows, 1)),
+                     basename_template='abstracts-{i}.parquet')
+    return table.num_rows
+
+
+def split_abstracts(grants, path):
+    """
+    Moves AbstractNarration out of a grants table into the text store at path (see
+    write_abstracts). AbstractNarration is replaced, at the same position, by AbstractRef:
+    the AwardID to look the text up under in the award's Year, in the compact string dtype of
+    the identifier columns (pd.NA when the award has no abstract). Tables without AbstractNarration are returned unchanged.
+
+    Returns:
+        pd.DataFrame: The grants without the abstract text.
+    """
+    if ABSTRACT_COLUMN not in grants.columns:
+        return grants
+    written = write_abstracts(grants, path)
+    text = grants[ABSTRACT_COLUMN]
+    stored = text.notna() & (text.str.strip() != '')
+    grants = grants.rename(columns={ABSTRACT_COLUMN: ABSTRACT_REF})
+    grants[ABSTRACT_REF] = grants['AwardID'].astype(utils.compact_string_dtype()).where(stored, pd.NA)
+    print(f"Stored {written} abstracts in {path}")
+    return grants
+
+
+def abstract_filter(award_ids=None, years=None):
+    """Dataset filter expression selecting award IDs and/or years of the text store (None: everything)."""
+    expression = None
+    if award_ids is not None:
+        award_ids = pd.Series(award_ids, dtype=object).dropna().astype(str).unique().tolist()
+        expression = ds.field('AwardID').isin(award_ids)
+    if years is not None:
+        in_years = ds.field('Year').isin([int(year) for year in years])
+        expression = in_years if expression is None else expression & in_years
+    return expression
+
+
+def abstract_dataset(path):
+    """Opens the text store lazily; nothing is read until it is scanned."""
+    return ds.dataset(path, format='parquet', partitioning=YEAR_PARTITIONING)
+
+
+def read_abstracts(path, award_ids=None, years=None):
+    """
+    Loads abstracts from the text store, only decompressing the partitions and row groups
+    that can hold the requested awards.
+
+    Parameters:
+        path (Path): The store directory.
+        award_ids (iterable): AwardIDs (or AbstractRef values) to load (default: all).
+        years (iterable): Years to load (default: all).
+
+    Returns:
+        pd.DataFrame: AwardID, AbstractNarration and Year.
+    """
+    table = abstract_dataset(path).to_table(filter=abstract_filter(award_ids, years))
+    return table.to_pandas()
+
+
+def iter_abstracts(path, batch_size=10_000, award_ids=None, years=None):
+    """
+    Streams the text store in chunks of at most batch_size abstracts, year by year in AwardID
+    order, for consumers that need every abstract (e.g. embedding them) without holding the
+    text of all years in memory.
+
+    Yields:
+        pd.DataFrame: AwardID, AbstractNarration and Year.
+    """
+    scanner = abstract_dataset(path).scanner(filter=abstract_filter(award_ids, years), batch_size=batch_size)
+    for batch in scanner.to_batches():
+        if batch.num_rows:
+            yield batch.to_pandas()
+
+
+def attach_abstracts(grants, path):
+    """
+    Restores AbstractNarration in a split grants table (in place of AbstractRef) for the
+    awards it holds, reading only their years from the text store.
+
+    Returns:
+        pd.DataFrame: The grants with the abstract text.
+    """
+    if ABSTRACT_REF not in grants.columns:
+        return grants
+    abstracts = read_abstracts(path, years=pd.unique(grants['Year']))
+    # Look the (Year, AwardID) pairs up with one factorize over the grants and the store
+    years = pd.concat([grants['Year'], abstracts['Year']], ignore_index=True).astype('int64')
+    refs = pd.concat([grants[ABSTRACT_REF].astype(object), abstracts['AwardID'].astype(object)], ignore_index=True)
+    codes, uniques = pd.factorize(pd.MultiIndex.from_arrays([years, refs]))
+    text_of_code = np.full(len(uniques) + 1, None, dtype=object)
+    text_of_code[codes[len(grants):]] = abstracts[ABSTRACT_COLUMN].to_numpy(dtype=object)
+    grant_codes = np.where(grants[ABSTRACT_REF].notna().to_numpy(), codes[:len(grants)], -1)
+    grants = grants.rename(columns={ABSTRACT_REF: ABSTRACT_COLUMN})
+    grants[ABSTRACT_COLUMN] = text_of_code[grant_codes]
+    return grants
@@ -1,26 +1,43 @@
 import pandas as pd
+import numpy as np
 from pathlib import Path
 from datetime import datetime
 import xml.etree.ElementTree as ET
 import zipfile
-from tldextract import extract
+import os
+import re
+import time
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from tldextract import TLDExtract
 
-def process_zip_files(base_path, output_path, min_years):
+import instrumentation
+
+def process_zip_files(base_path, output_path=None, min_years=0, extract=True, run_report=None):
     """
     Processes ZIP files in the given base directory, extracts XML files, and returns a DataFrame
     with information about the extracted files for years > min_years.
     
     Parameters:
         base_path (Path): The base directory containing ZIP files.
-        output_path (Path): The directory where files will be temporarily extracted.
+        output_path (Path): The directory where files will be temporarily extracted (only used,
+            and required, with extract=True).
         min_years (int): Minimum year to include in the results.
+        extract (bool): If False, nothing is written to output_path; the XML members are only
+            counted inside each archive so they can be streamed later with collect_data_from_zip.
+        run_report (instrumentation.RunReport): Records a 'scan' (or 'extract') stage per
+            archive with its XML member count and size, and the archives that failed.
     
     Returns:
         pd.DataFrame: A DataFrame with columns ['file', 'year', 'xmlfiles'].
     """
     base = Path(base_path)
-    output = Path(output_path)
-    output.mkdir(parents=True, exist_ok=True)  # Ensure output directory exists
+    if extract:
+        if output_path is None:
+            raise ValueError("output_path is required when extract=True")
+        output = Path(output_path)
+        output.mkdir(parents=True, exist_ok=True)  # Ensure output directory exists
     
     zipfiles = list(base.rglob("*.zip"))  # List all ZIP files in base directory
     details = []
@@ -41,23 +58,45 @@ def process_zip_files(base_path, output_path, min_years):
         # Skip files with years <= min_years
         if year <= min_years:
             continue
+
+        if not extract:
+            # Count the XML members straight from the archive's central directory
+            with instrumentation.stage(run_report, 'scan', year) as stage:
+                stage['bytes'] = file.stat().st_size
+                try:
+                    with zipfile.ZipFile(file, 'r') as zip_ref:
+                        xmlmembers = list_zip_xml_members(zip_ref)
+                    file_info['errors']=True
+                except Exception as e:
+                    print(f"Failed to read {file}: {e}")
+                    stage['error_log'] = [error_record(file, e)]
+                    file_info['errors']=False
+                    continue
+                stage['documents'] = len(xmlmembers)
+            file_info['xmlfiles'] = len(xmlmembers)
+            details.append(file_info)
+            continue
         
         # Create a year-specific directory for extraction
         year_dir = output / str(year)
         year_dir.mkdir(parents=True, exist_ok=True)
         
         # Extract ZIP file contents to the year-specific directory
-        try:
-            with zipfile.ZipFile(file, 'r') as zip_ref:
-                zip_ref.extractall(year_dir)
-            file_info['errors']=True
-        except Exception as e:
-            print(f"Failed to extract {file}: {e}")
-            file_info['errors']=False
-            continue
+        with instrumentation.stage(run_report, 'extract', year) as stage:
+            stage['bytes'] = file.stat().st_size
+            try:
+                with zipfile.ZipFile(file, 'r') as zip_ref:
+                    zip_ref.extractall(year_dir)
+                file_info['errors']=True
+            except Exception as e:
+                print(f"Failed to extract {file}: {e}")
+                stage['error_log'] = [error_record(file, e)]
+                file_info['errors']=False
+                continue
         
-        # Count the number of XML files in the year-specific directory
-        xmlfiles = list(year_dir.rglob("*.xml"))
+            # Count the number of XML files in the year-specific directory
+            xmlfiles = list(year_dir.rglob("*.xml"))
+            stage['documents'] = len(xmlfiles)
         file_info['xmlfiles'] = len(xmlfiles)
         
         # Append file info to the details list
@@ -70,237 +109,648 @@ def process_zip_files(base_path, output_path, min_years):
     df.reset_index(drop=True, inplace=True)
     return df
 
-    # Helper function to extract the main domain from an email address
-    # Helper function to extract the main domain from an email address
+
+def list_zip_xml_members(zip_ref):
+    """
+    Lists the XML members of an open ZIP archive, skipping directories.
+
+    Parameters:
+        zip_ref (zipfile.ZipFile): An open archive.
+
+    Returns:
+        list: The member names ending in .xml, in archive order.
+    """
+    return [name for name in zip_ref.namelist()
+            if name.lower().endswith('.xml') and not name.endswith('/')]
+
+
+def iter_zip_xml(zip_path):
+    """
+    Streams the XML members of a yearly ZIP archive without extracting them to disk.
+
+    Parameters:
+        zip_path (Path): Path to the ZIP archive.
+
+    Yields:
+        tuple: (member name, member bytes) for every XML file in the archive.
+    """
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        for name in list_zip_xml_members(zip_ref):
+            yield name, zip_ref.read(name)
+
+
+# Public suffix list snapshot bundled with tldextract: no download and no on-disk cache
+PUBLIC_SUFFIXES = TLDExtract(suffix_list_urls=(), cache_dir=None)
+DOMAIN_CACHE_SIZE = 200_000
+
+
+@lru_cache(maxsize=DOMAIN_CACHE_SIZE)
+def normalize_domain(host):
+    """
+    Registrable domain of a host name under the public suffix list, lowercased:
+    'cs.ox.ac.uk' -> 'ox.ac.uk', 'CS.UCSD.EDU' -> 'ucsd.edu', 'b.k12.ca.us' stays as is.
+    Hosts without one (localhost, IP addresses, bare suffixes) are returned lowercased.
+    Memoized per host with a bounded LRU cache.
+    """
+    host = host.strip().lower().rstrip('.')
+    parts = PUBLIC_SUFFIXES(host)
+    if parts.domain and parts.suffix:
+        return f'{parts.domain}.{parts.suffix}'
+    return host
+
+
+# Helper function to extract the main domain from an email address
 def extract_main_domain(email):
+    """Institution domain of an email address (see normalize_domain), or None."""
     if email and '@' in email:
-        domain_parts = email.split('@')[1].split('.')  # Split by '.'
-        if len(domain_parts) > 2:
-            # Take only the last two parts (e.g., ['ucsd', 'edu'])
-            return '.'.join(domain_parts[-2:])
-        return '.'.join(domain_parts)  # Return full domain if it's already simple
+        return normalize_domain(email.split('@')[1])
     return None
 
 
+# Field-spec tables for the award XML. Each entry is (column, path); the paths use the
+# ElementTree syntax the fields were originally read with via root.findtext('.//' + path):
+# 'Tag', 'Parent/Tag' or 'Parent[n]/Tag'. The tables are compiled once into single-pass
+# extractors (see compile_field_spec) instead of walking the tree once per field.
+GRANT_FIELDS = [
+    ('AwardID', 'AwardID'),
+    ('AwardTitle', 'AwardTitle'),
+    ('Agency', 'AGENCY'),
+    ('AwardEffectiveDate', 'AwardEffectiveDate'),
+    ('AwardExpirationDate', 'AwardExpirationDate'),
+    ('AwardTotalIntnAmount', 'AwardTotalIntnAmount'),
+    ('AwardAmount', 'AwardAmount'),
+    ('AwardInstrument', 'AwardInstrument/Value'),
+    ('Organization_Code', 'Organization/Code'),
+    ('Directorate_Abbreviation', 'Directorate/Abbreviation'),
+    ('Directorate_LongName', 'Directorate/LongName'),
+    ('Division_Abbreviation', 'Division/Abbreviation'),
+    ('Division_LongName', 'Division/LongName'),
+    ('ProgramOfficer_Name', 'ProgramOfficer/SignBlockName'),
+    ('ProgramOfficer_Email', 'ProgramOfficer/PO_EMAI'),
+    ('ProgramOfficer_Phone', 'ProgramOfficer/PO_PHON'),
+    ('AbstractNarration', 'AbstractNarration'),
+    ('MinAmdLetterDate', 'MinAmdLetterDate'),
+    ('MaxAmdLetterDate', 'MaxAmdLetterDate'),
+    ('ARRAAmount', 'ARRAAmount'),
+    ('TRAN_TYPE', 'TRAN_TYPE'),
+    ('CFDA_NUM', 'CFDA_NUM'),
+    ('NSF_PAR_USE_FLAG', 'NSF_PAR_USE_FLAG'),
+    ('FUND_AGCY_CODE', 'FUND_AGCY_CODE'),
+    ('AWDG_AGCY_CODE', 'AWDG_AGCY_CODE'),
+    ('Institution_Name', 'Institution/Name'),
+    ('Institution_City', 'Institution/CityName'),
+    ('Institution_State', 'Institution/StateName'),
+    ('Institution_Zip', 'Institution/ZipCode'),
+    ('Institution_Country', 'Institution/CountryName'),
+    ('Institution_Phone', 'Institution/PhoneNumber'),
+    ('Institution_StreetAddress1', 'Institution/StreetAddress'),
+    ('Institution_StreetAddress2', 'Institution/StreetAddress2'),
+    ('Institution_CongressDistrict', 'Institution/CONGRESSDISTRICT'),
+    ('Institution_CongressDistrictOrg', 'Institution/CONGRESS_DISTRICT_ORG'),
+    ('Institution_OrgUEINum', 'Institution/ORG_UEI_NUM'),
+    ('Institution_OrgLglBusName', 'Institution/ORG_LGL_BUS_NAME'),
+    ('Performance_Institution_Name', 'Performance_Institution/Name'),
+    ('Performance_Institution_City', 'Performance_Institution/CityName'),
+    ('Performance_Institution_State', 'Performance_Institution/StateName'),
+    ('Performance_Institution_Zip', 'Performance_Institution/ZipCode'),
+    ('Performance_Institution_StreetAddress', 'Performance_Institution/StreetAddress'),
+    ('Performance_Institution_CountryCode', 'Performance_Institution/CountryCode'),
+    ('Performance_Institution_Country', 'Performance_Institution/CountryName'),
+    ('Performance_Institution_CountryFlag', 'Performance_Institution/CountryFlag'),
+    ('Performance_Institution_CongressDistrict', 'Performance_Institution/CONGRESSDISTRICT'),
+    ('Performance_Institution_CongressDistrictPerf', 'Performance_Institution/CONGRESS_DISTRICT_PERF'),
+    ('ProgramElement1_Code', 'ProgramElement[1]/Code'),
+    ('ProgramElement1_Text', 'ProgramElement[1]/Text'),
+    ('ProgramElement2_Code', 'ProgramElement[2]/Code'),
+    ('ProgramElement2_Text', 'ProgramElement[2]/Text'),
+    ('ProgramElement3_Code', 'ProgramElement[3]/Code'),
+    ('ProgramElement3_Text', 'ProgramElement[3]/Text'),
+    ('ProgramReference_Code', 'ProgramReference/Code'),
+    ('ProgramReference_Text', 'ProgramReference/Text'),
+    ('Appropriation_Code', 'Appropriation/Code'),
+    ('Appropriation_Name', 'Appropriation/Name'),
+    ('Appropriation_SymbolID', 'Appropriation/APP_SYMB_ID'),
+    ('Fund_Code', 'Fund/Code'),
+    ('Fund_Name', 'Fund/Name'),
+    ('Fund_SymbolID', 'Fund/FUND_SYMB_ID'),
+    ('Fund_Obligation', 'FUND_OBLG'),
+]
+
+# Direct children of each <Investigator> element
+INVESTIGATOR_FIELDS = [
+    ('FirstName', 'FirstName'),
+    ('LastName', 'LastName'),
+    ('MiddleInitial', 'PI_MID_INIT'),
+    ('Suffix', 'PI_SUFX_NAME'),
+    ('FullName', 'PI_FULL_NAME'),
+    ('Email', 'EmailAddress'),
+    ('NSFID', 'NSF_ID'),
+    ('StartDate', 'StartDate'),
+    ('EndDate', 'EndDate'),
+    ('RoleCode', 'RoleCode'),
+]
+
+
+def compile_field_spec(fields, collect=()):
+    """
+    Compiles a (column, path) field table into a single-pass extractor for extract_fields.
 
+    Args:
+        fields: List of (column, path) pairs, path being 'Tag', 'Parent/Tag' or 'Parent[n]/Tag'.
+        collect: Tags whose elements should be gathered during the same walk (e.g. 'Investigator').
 
-def extract_investigators(root, data):
+    Returns:
+        A dict with the column names and a dispatch table keyed by element tag.
+    """
+    dispatch = {}
+    for slot, (column, path) in enumerate(fields):
+        steps = path.split('/')
+        if len(steps) > 2:
+            raise ValueError(f"Unsupported path for {column}: {path}")
+        parent_tag, position = None, None
+        if len(steps) == 2:
+            parent_tag = steps[0]
+            if parent_tag.endswith(']'):
+                parent_tag, index = parent_tag[:-1].split('[')
+                position = int(index)
+        dispatch.setdefault(steps[-1], []).append((slot, parent_tag, position))
+    return {
+        'columns': [column for column, _ in fields],
+        'dispatch': dispatch,
+        'collect': tuple(collect),
+    }
+
+
+def extract_fields(root, extractor):
+    """
+    Extracts every field of a compiled extractor in one walk over the tree.
+
+    Matches root.findtext('.//' + path) for each field: the first matching element in document
+    order wins, an empty element gives '' and a missing one gives None.
+
+    Args:
+        root: XML root element.
+        extractor: The result of compile_field_spec.
+
+    Returns:
+        tuple: (dict of column -> text, dict of collected tag -> list of elements)
+    """
+    dispatch = extractor['dispatch']
+    values = [None] * len(extractor['columns'])
+    collected = {tag: [] for tag in extractor['collect']}
+
+    def walk(parent, parent_tag, parent_position):
+        seen = {}
+        for child in parent:
+            tag = child.tag
+            position = seen[tag] = seen.get(tag, 0) + 1
+            targets = dispatch.get(tag)
+            if targets:
+                for slot, want_parent, want_position in targets:
+                    if values[slot] is None and (want_parent is None or (
+                            want_parent == parent_tag
+                            and (want_position is None or want_position == parent_position))):
+                        values[slot] = child.text or ''
+            if tag in collected:
+                collected[tag].append(child)
+            if len(child):
+                walk(child, tag, position)
+
+    # The root itself is not a candidate for './/' paths
+    walk(root, None, None)
+    return dict(zip(extractor['columns'], values)), collected
+
+
+def extract_child_fields(elem, extractor):
+    """
+    Reads the direct children of elem listed in a compiled extractor in one pass,
+    matching elem.findtext(tag) for each field.
+    """
+    dispatch = extractor['dispatch']
+    values = [None] * len(extractor['columns'])
+    for child in elem:
+        targets = dispatch.get(child.tag)
+        if targets:
+            for slot, _, _ in targets:
+                if values[slot] is None:
+                    values[slot] = child.text or ''
+    return dict(zip(extractor['columns'], values))
+
+
+GRANT_EXTRACTOR = compile_field_spec(GRANT_FIELDS, collect=('Investigator',))
+INVESTIGATOR_EXTRACTOR = compile_field_spec(INVESTIGATOR_FIELDS)
+
+
+def extract_investigators(root, data, investigator_elements=None):
     """
     Extracts investigator data from an XML root and appends it to a list
-    with an ordered investigator number (PI#), total investigators count,
-    institution domain, collaborative institutions count, 
-    and totals for PI's university and others.
+    with an ordered investigator number (PI#) and total investigators count.
+
+    The institution domain and the collaboration counts are added after parsing, for whole
+    tables at once (see add_collaboration_metrics).
     
     Args:
         root: XML root element.
         data: A dictionary containing the AwardID.
+        investigator_elements: The <Investigator> elements, if already collected
+            (e.g. by extract_fields); otherwise they are looked up under root.
     
     Returns:
-        A list of dictionaries containing investigator data and collaboration statistics.
+        A list of dictionaries containing investigator data.
     """
     investigators = []
-    investigator_elements = root.findall('.//Investigator')
+    if investigator_elements is None:
+        investigator_elements = root.findall('.//Investigator')
     total_investigators = len(investigator_elements)  # Total investigators count
 
-    # Extract domains and calculate collaboration statistics
-    domains = []
-    for investigator in investigator_elements:
-        email = investigator.findtext('EmailAddress')
-        main_domain = extract_main_domain(email)
-        domains.append(main_domain)
-
-    unique_domains = set(filter(None, domains))  # Unique institution domains, ignoring None
-    pi_domain = domains[0] if domains else None  # Domain of the first investigator (PI)
-    
-    total_at_pi_university = domains.count(pi_domain)
-    total_outside_pi_university = total_investigators - total_at_pi_university
-
     for idx, investigator in enumerate(investigator_elements, start=1):
-        email = investigator.findtext('EmailAddress')
-        institution_domain = extract_main_domain(email)
-        
+        record = extract_child_fields(investigator, INVESTIGATOR_EXTRACTOR)
         investigator_data = {
             'PI#': idx,  # Ordered investigator number
             'TotalInvestigators': total_investigators,  # Total investigators
             'AwardID': data['AwardID'],  # Add AwardID to each investigator record
-            'FirstName': investigator.findtext('FirstName'),
-            'LastName': investigator.findtext('LastName'),
-            'MiddleInitial': investigator.findtext('PI_MID_INIT'),
-            'Suffix': investigator.findtext('PI_SUFX_NAME'),
-            'FullName': investigator.findtext('PI_FULL_NAME'),
-            'Email': email,
-            'InstitutionDomain': institution_domain,  # Extracted main domain
-            'NSFID': investigator.findtext('NSF_ID'),
-            'StartDate': investigator.findtext('StartDate'),
-            'EndDate': investigator.findtext('EndDate'),
-            'RoleCode': investigator.findtext('RoleCode'),
-            'TotalCollaborativeInstitutions': len(unique_domains),  # Unique institutions
-            'TotalAtPIUniversity': total_at_pi_university,  # Count at PI's university
-            'TotalOutsidePIUniversity': total_outside_pi_university,  # Count outside PI's university
+            'FirstName': record['FirstName'],
+            'LastName': record['LastName'],
+            'MiddleInitial': record['MiddleInitial'],
+            'Suffix': record['Suffix'],
+            'FullName': record['FullName'],
+            'Email': record['Email'],
+            'NSFID': record['NSFID'],
+            'StartDate': record['StartDate'],
+            'EndDate': record['EndDate'],
+            'RoleCode': record['RoleCode'],
         }
         investigators.append(investigator_data)
     
     return investigators
 
 
+def extract_domains(emails):
+    """
+    Vectorized extract_main_domain over an email column.
+
+    The host part of each distinct email is extracted with a regex over Arrow-backed strings,
+    and each distinct host goes through normalize_domain once. Missing emails and emails
+    without '@' give None.
+
+    Args:
+        emails (pd.Series): The investigator emails.
+
+    Returns:
+        pd.Series: object column of domains, with None where there is no domain.
+    """
+    codes, uniques = pd.factorize(emails)
+    uniques = pd.Series(uniques, dtype=object)
+    strings = uniques.where(uniques.map(type) == str).astype(compact_string_dtype())
+    # email.split('@')[1]: the text between the first and the second '@'
+    hosts = strings.str.extract(r'^[^@]*@([^@]*)', expand=False)
+    host_codes, host_names = pd.factorize(hosts)
+    domains = np.array([normalize_domain(host) for host in host_names] + [None], dtype=object)
+    # Code -1 (no host, or a missing email) picks the trailing None
+    email_domains = np.append(domains[host_codes], None)
+    return pd.Series(email_domains[codes], index=emails.index, dtype=object)
+
+
+def add_collaboration_metrics(invest, groups=None):
+    """
+    Adds InstitutionDomain and the per-award collaboration counts to an investigator table,
+    with one vectorized pass instead of per-award Python lists:
 
+    - TotalCollaborativeInstitutions: distinct non-empty domains on the award
+    - TotalAtPIUniversity: investigators sharing the PI's domain (the PI, the lowest PI#,
+      included; investigators without a domain count as the same as a PI without one)
+    - TotalOutsidePIUniversity: the award's other investigators
 
-def parse_xml(file_path):
+    Works on a single year as parsed or on the whole invest_final.
+
+    Args:
+        invest (pd.DataFrame): Investigator table with AwardID, PI# and Email.
+        groups (array-like): Award record of each row; defaults to AwardID. The parser
+            passes its record numbers so a repeated AwardID is never merged.
+
+    Returns:
+        pd.DataFrame: invest with the four columns set.
+    """
+    invest['InstitutionDomain'] = extract_domains(invest['Email']).to_numpy()
+    group_codes, _ = pd.factorize(invest['AwardID'] if groups is None else pd.Series(groups))
+    # Rows without an award key form their own groups
+    missing = group_codes < 0
+    group_codes[missing] = group_codes.max(initial=-1) + 1 + np.arange(missing.sum())
+    n_groups = group_codes.max(initial=-1) + 1
+    domains = invest['InstitutionDomain']
+    domain_codes, _ = pd.factorize(domains)
+
+    # The PI of each group: the row with the lowest PI#, then the first in row order
+    order = np.lexsort((np.arange(len(invest)), invest['PI#'].to_numpy(), group_codes))
+    sorted_groups = group_codes[order]
+    first = order[np.r_[True, sorted_groups[1:] != sorted_groups[:-1]]] if len(order) else order
+    pi_domain = np.empty(n_groups, dtype=np.int64)
+    pi_domain[group_codes[first]] = domain_codes[first]
+
+    size = np.bincount(group_codes, minlength=n_groups)
+    at_pi = np.bincount(group_codes, weights=domain_codes == pi_domain[group_codes], minlength=n_groups).astype(np.int64)
+    named = (domain_codes >= 0) & (domains != '').to_numpy()
+    distinct = np.unique(group_codes[named].astype(np.int64) * (domain_codes.max(initial=0) + 1) + domain_codes[named])
+    collaborative = np.bincount(distinct // (domain_codes.max(initial=0) + 1), minlength=n_groups)
+
+    invest['TotalCollaborativeInstitutions'] = collaborative[group_codes].astype('int64')
+    invest['TotalAtPIUniversity'] = at_pi[group_codes]
+    invest['TotalOutsidePIUniversity'] = (size - at_pi)[group_codes].astype('int64')
+    return invest
+
+
+def error_record(file_path, error):
+    """Structured error log entry: the file, the exception type and its message."""
+    return {'file': str(file_path), 'error_type': type(error).__name__, 'message': str(error)}
+
+
+def parse_xml_record(file_path, content=None, errors=None):
+    """
+    Parses a single award XML document into plain Python records.
+
+    Args:
+        file_path: Path of the XML file, or the member name when content is given.
+        content (bytes): Raw XML bytes (e.g. read from a ZIP archive). When given, file_path
+            is only used for error messages.
+        errors (list): If given, a failed document adds an error_record to it.
+
+    Returns:
+        tuple: (grant dict, list of investigator dicts), or (None, None) if the document
+        could not be parsed.
+    """
     try:
-        tree = ET.parse(file_path)
-        root = tree.getroot()
-
-        # Common fields (grant data)
-        data = {
-            'AwardID': root.findtext('.//AwardID'),
-            'AwardTitle': root.findtext('.//AwardTitle'),
-            'Agency': root.findtext('.//AGENCY'),
-            'AwardEffectiveDate': root.findtext('.//AwardEffectiveDate'),
-            'AwardExpirationDate': root.findtext('.//AwardExpirationDate'),
-            'AwardTotalIntnAmount': root.findtext('.//AwardTotalIntnAmount'),
-            'AwardAmount': root.findtext('.//AwardAmount'),
-            'AwardInstrument': root.findtext('.//AwardInstrument/Value'),
-            'Organization_Code': root.findtext('.//Organization/Code'),
-            'Directorate_Abbreviation': root.findtext('.//Directorate/Abbreviation'),
-            'Directorate_LongName': root.findtext('.//Directorate/LongName'),
-            'Division_Abbreviation': root.findtext('.//Division/Abbreviation'),
-            'Division_LongName': root.findtext('.//Division/LongName'),
-            'ProgramOfficer_Name': root.findtext('.//ProgramOfficer/SignBlockName'),
-            'ProgramOfficer_Email': root.findtext('.//ProgramOfficer/PO_EMAI'),
-            'ProgramOfficer_Phone': root.findtext('.//ProgramOfficer/PO_PHON'),
-            'AbstractNarration': root.findtext('.//AbstractNarration'),
-            'MinAmdLetterDate': root.findtext('.//MinAmdLetterDate'),
-            'MaxAmdLetterDate': root.findtext('.//MaxAmdLetterDate'),
-            'ARRAAmount': root.findtext('.//ARRAAmount'),
-            'TRAN_TYPE': root.findtext('.//TRAN_TYPE'),
-            'CFDA_NUM': root.findtext('.//CFDA_NUM'),
-            'NSF_PAR_USE_FLAG': root.findtext('.//NSF_PAR_USE_FLAG'),
-            'FUND_AGCY_CODE': root.findtext('.//FUND_AGCY_CODE'),
-            'AWDG_AGCY_CODE': root.findtext('.//AWDG_AGCY_CODE'),
-            'Institution_Name': root.findtext('.//Institution/Name'),
-            'Institution_City': root.findtext('.//Institution/CityName'),
-            'Institution_State': root.findtext('.//Institution/StateName'),
-            'Institution_Zip': root.findtext('.//Institution/ZipCode'),
-            'Institution_Country': root.findtext('.//Institution/CountryName'),
-            'Institution_Phone': root.findtext('.//Institution/PhoneNumber'),
-            'Institution_StreetAddress1': root.findtext('.//Institution/StreetAddress'),
-            'Institution_StreetAddress2': root.findtext('.//Institution/StreetAddress2'),
-            'Institution_CongressDistrict': root.findtext('.//Institution/CONGRESSDISTRICT'),
-            'Institution_CongressDistrictOrg': root.findtext('.//Institution/CONGRESS_DISTRICT_ORG'),
-            'Institution_OrgUEINum': root.findtext('.//Institution/ORG_UEI_NUM'),
-            'Institution_OrgLglBusName': root.findtext('.//Institution/ORG_LGL_BUS_NAME'),
-            'Performance_Institution_Name': root.findtext('.//Performance_Institution/Name'),
-            'Performance_Institution_City': root.findtext('.//Performance_Institution/CityName'),
-            'Performance_Institution_State': root.findtext('.//Performance_Institution/StateName'),
-            'Performance_Institution_Zip': root.findtext('.//Performance_Institution/ZipCode'),
-            'Performance_Institution_StreetAddress': root.findtext('.//Performance_Institution/StreetAddress'),
-            'Performance_Institution_CountryCode': root.findtext('.//Performance_Institution/CountryCode'),
-            'Performance_Institution_Country': root.findtext('.//Performance_Institution/CountryName'),
-            'Performance_Institution_State': root.findtext('.//Performance_Institution/StateName'),
-            'Performance_Institution_CountryFlag': root.findtext('.//Performance_Institution/CountryFlag'),
-            'Performance_Institution_CongressDistrict': root.findtext('.//Performance_Institution/CONGRESSDISTRICT'),
-            'Performance_Institution_CongressDistrictPerf': root.findtext('.//Performance_Institution/CONGRESS_DISTRICT_PERF'),
-            'ProgramElement1_Code': root.findtext('.//ProgramElement[1]/Code'),
-            'ProgramElement1_Text': root.findtext('.//ProgramElement[1]/Text'),
-            'ProgramElement2_Code': root.findtext('.//ProgramElement[2]/Code'),
-            'ProgramElement2_Text': root.findtext('.//ProgramElement[2]/Text'),
-            'ProgramElement3_Code': root.findtext('.//ProgramElement[3]/Code'),
-            'ProgramElement3_Text': root.findtext('.//ProgramElement[3]/Text'),
-            'ProgramReference_Code': root.findtext('.//ProgramReference/Code'),
-            'ProgramReference_Text': root.findtext('.//ProgramReference/Text'),
-            'Appropriation_Code': root.findtext('.//Appropriation/Code'),
-            'Appropriation_Name': root.findtext('.//Appropriation/Name'),
-            'Appropriation_SymbolID': root.findtext('.//Appropriation/APP_SYMB_ID'),
-            'Fund_Code': root.findtext('.//Fund/Code'),
-            'Fund_Name': root.findtext('.//Fund/Name'),
-            'Fund_SymbolID': root.findtext('.//Fund/FUND_SYMB_ID'),
-            'Fund_Obligation': root.findtext('.//FUND_OBLG')
-        }
-        investigators = extract_investigators(root, data)
-
-        # Process all investigators
-        # investigators = []
-        # for investigator in root.findall('.//Investigator'):
-        #     investigator_data = {
-        #         'AwardID': data['AwardID'],  # Add AwardID to each investigator record
-        #         'FirstName': investigator.findtext('FirstName'),
-        #         'LastName': investigator.findtext('LastName'),
-        #         'MiddleInitial': investigator.findtext('PI_MID_INIT'),
-        #         'Suffix': investigator.findtext('PI_SUFX_NAME'),
-        #         'FullName': investigator.findtext('PI_FULL_NAME'),
-        #         'Email': investigator.findtext('EmailAddress'),
-        #         'NSFID': investigator.findtext('NSF_ID'),
-        #         'StartDate': investigator.findtext('StartDate'),
-        #         'EndDate': investigator.findtext('EndDate'),
-        #         'RoleCode': investigator.findtext('RoleCode'),
-        #     }
-        #     investigators.append(investigator_data)
-
-        # Convert the main data (grant data) into a DataFrame
-        df_grant = pd.DataFrame([data])
-
-        # Convert the investigators data into a DataFrame
-        df_investigators = pd.DataFrame(investigators)
-
-        # Return two DataFrames: one for the grant and one for the investigators
-        return df_grant, df_investigators
+        if content is not None:
+            root = ET.fromstring(content)
+        else:
+            tree = ET.parse(file_path)
+            root = tree.getroot()
+
+        # Common fields (grant data), read in a single pass over the tree
+        data, collected = extract_fields(root, GRANT_EXTRACTOR)
+        investigators = extract_investigators(root, data, collected['Investigator'])
+        return data, investigators
+
+    except ET.ParseError as e:
+        # Malformed XML; caught before the generic handler so it is reported as such
+        print(f"Error parsing file {file_path}: {str(e)}")
+        if errors is not None:
+            errors.append(error_record(file_path, e))
+        return None, None
 
     except Exception as e:
         print(f"Error parsing file {file_path}: {str(e)}")
+        if errors is not None:
+            errors.append(error_record(file_path, e))
         return None, None
 
-    except ET.ParseError:
-        print(f'Error parsing file: {file_path}')
-        return None
 
+def parse_xml(file_path, content=None, errors=None):
+    """
+    Parses a single award XML document into a grant DataFrame and an investigator DataFrame.
+
+    Building two DataFrames per document is expensive; bulk ingest goes through
+    collect_parsed_columns instead, which accumulates the records column by column.
 
+    Args:
+        file_path: Path of the XML file, or the member name when content is given.
+        content (bytes): Raw XML bytes (e.g. read from a ZIP archive).
+        errors (list): If given, a failed document adds an error_record to it.
 
-def collect_data_from_xml_files(root_folder, year):
+    Returns:
+        tuple: (df_grant, df_investigators), or (None, None) if the document could not be parsed.
+    """
+    data, investigators = parse_xml_record(file_path, content, errors)
+    if data is None:
+        return None, None
+
+    # Convert the main data (grant data) into a DataFrame
+    df_grant = pd.DataFrame([data])
+
+    # Convert the investigators data into a DataFrame
+    df_investigators = pd.DataFrame(investigators, columns=PARSED_INVESTIGATOR_COLUMNS)
+    df_investigators = add_collaboration_metrics(df_investigators)[INVESTIGATOR_COLUMNS]
+
+    # Return two DataFrames: one for the grant and one for the investigators
+    return df_grant, df_investigators
+
+
+# Column layout of the per-year grant and investigator tables. Text columns are left to
+# pandas' default string inference so the frames match the ones built document by document;
+# the numeric columns get explicit dtypes.
+GRANT_COLUMNS = GRANT_EXTRACTOR['columns'] + ['Year']
+GRANT_DTYPES = {'Year': 'int64'}
+INVESTIGATOR_COLUMNS = [
+    'PI#', 'TotalInvestigators', 'AwardID', 'FirstName', 'LastName', 'MiddleInitial', 'Suffix',
+    'FullName', 'Email', 'InstitutionDomain', 'NSFID', 'StartDate', 'EndDate', 'RoleCode',
+    'TotalCollaborativeInstitutions', 'TotalAtPIUniversity', 'TotalOutsidePIUniversity',
+]
+# Filled after parsing by add_collaboration_metrics
+COLLABORATION_COLUMNS = [
+    'InstitutionDomain', 'TotalCollaborativeInstitutions', 'TotalAtPIUniversity', 'TotalOutsidePIUniversity',
+]
+PARSED_INVESTIGATOR_COLUMNS = [column for column in INVESTIGATOR_COLUMNS if column not in COLLABORATION_COLUMNS]
+INVESTIGATOR_DTYPES = {
+    'PI#': 'int64',
+    'TotalInvestigators': 'int64',
+    'TotalCollaborativeInstitutions': 'int64',
+    'TotalAtPIUniversity': 'int64',
+    'TotalOutsidePIUniversity': 'int64',
+}
+
+
+# Semantic types of the parsed columns, used when the tables are typed or written to Parquet
+GRANT_DATE_COLUMNS = ['AwardEffectiveDate', 'AwardExpirationDate', 'MinAmdLetterDate', 'MaxAmdLetterDate']
+GRANT_AMOUNT_COLUMNS = ['AwardTotalIntnAmount', 'AwardAmount', 'ARRAAmount']
+GRANT_CODE_COLUMNS = [
+    'Agency', 'AwardInstrument', 'Organization_Code', 'Directorate_Abbreviation',
+    'Directorate_LongName', 'Division_Abbreviation', 'Division_LongName', 'TRAN_TYPE', 'CFDA_NUM',
+    'NSF_PAR_USE_FLAG', 'FUND_AGCY_CODE', 'AWDG_AGCY_CODE', 'Institution_State',
+    'Institution_Country', 'Performance_Institution_State', 'Performance_Institution_CountryCode',
+    'Performance_Institution_Country', 'Performance_Institution_CountryFlag',
+    'ProgramElement1_Code', 'ProgramElement1_Text', 'ProgramElement2_Code', 'ProgramElement2_Text',
+    'ProgramElement3_Code', 'ProgramElement3_Text', 'ProgramReference_Code', 'ProgramReference_Text',
+    'Appropriation_Code', 'Appropriation_Name', 'Appropriation_SymbolID', 'Fund_Code', 'Fund_Name',
+    'Fund_SymbolID',
+]
+INVESTIGATOR_DATE_COLUMNS = ['StartDate', 'EndDate']
+INVESTIGATOR_CODE_COLUMNS = ['InstitutionDomain', 'RoleCode']
+DATE_FORMAT = '%m/%d/%Y'
+
+
+def columns_to_frame(columns, dtypes):
+    """
+    Builds one DataFrame from per-column value lists, applying the explicit dtypes.
+
+    Parameters:
+        columns (dict): Column name -> list of values, in output column order.
+        dtypes (dict): Column name -> dtype for the columns that should not be inferred.
+
+    Returns:
+        pd.DataFrame
+    """
+    frame = pd.DataFrame(columns, columns=list(columns))
+    return frame.astype({column: dtype for column, dtype in dtypes.items() if column in frame.columns})
+
+
+def collect_data_from_xml_files(root_folder, year, run_report=None):
     """
     Collects data from XML files in the specified year folder.
     
     Parameters:
         root_folder (Path): The root directory containing year folders.
         year (int): The year to process.
+        run_report (instrumentation.RunReport): Records the 'parse' and 'frames' stages.
     
     Returns:
         pd.DataFrame: A DataFrame with all the collected data.
         list: A list of files that caused errors during parsing.
     """
-    data_list = []
-    invest_list = []
-    error_files = []
     yr_folder = root_folder / str(year)
     xmlfiles = list(yr_folder.rglob("*.xml"))
-    
-    for filename in xmlfiles:
+    return collect_parsed_data(((filename, None) for filename in xmlfiles), year, run_report)
+
+
+def collect_data_from_zip(zip_path, year, run_report=None):
+    """
+    Collects data from the XML members of a yearly ZIP archive, parsing each member from
+    memory so nothing is extracted to disk.
+
+    Parameters:
+        zip_path (Path): Path to the yearly ZIP archive (e.g. the 'file' column of nsf_data.csv).
+        year (int): The year to process.
+        run_report (instrumentation.RunReport): Records the 'parse' and 'frames' stages.
+
+    Returns:
+        pd.DataFrame: A DataFrame with all the collected data.
+        pd.DataFrame: A DataFrame with all the collected investigator data.
+        list: A list of files that caused errors during parsing.
+    """
+    return collect_parsed_data(iter_zip_xml(zip_path), year, run_report)
+
+
+def collect_parsed_data(sources, year, run_report=None):
+    """
+    Parses XML documents and combines the results for one year.
+
+    Parameters:
+        sources (iterable): (name, content) pairs. content is the raw XML bytes, or None to
+            read the document from the path given in name.
+        year (int): The year the documents belong to.
+        run_report (instrumentation.RunReport): Records the parsing ('parse': documents, bytes
+            and failed documents) and the frame building ('frames') of the year.
+
+    Returns:
+        pd.DataFrame: A DataFrame with all the collected data.
+        pd.DataFrame: A DataFrame with all the collected investigator data.
+        list: A list of files that caused errors during parsing.
+    """
+    with instrumentation.stage(run_report, 'parse', year) as stage:
+        grant_columns, invest_columns, error_files = collect_parsed_columns(sources, stage)
+    with instrumentation.stage(run_report, 'frames', year) as stage:
+        final_data, final_invest = build_year_frames(grant_columns, invest_columns, year)
+        stage['documents'] = len(final_data)
+    return final_data, final_invest, error_files
+
+
+def collect_parsed_columns(sources, stats=None):
+    """
+    Parses XML documents and accumulates the grant and investigator values column by column,
+    so no per-document DataFrame is ever built.
+
+    Parameters:
+        sources (iterable): (name, content) pairs, as for collect_parsed_data.
+        stats (dict): If given, 'documents' and 'bytes' are incremented for every document
+            and an error_record is added to its 'error_log' for every failed one.
+
+    Returns:
+        dict: Grant column -> list of values (without 'Year').
+        dict: Investigator column -> list of values.
+        list: A list of files that caused errors during parsing.
+    """
+    grant_columns = {column: [] for column in GRANT_EXTRACTOR['columns']}
+    invest_columns = {column: [] for column in PARSED_INVESTIGATOR_COLUMNS}
+    grant_items = list(grant_columns.items())
+    invest_items = list(invest_columns.items())
+    error_files = []
+    error_log = None
+    if stats is not None:
+        error_log = stats.setdefault('error_log', [])
+        stats.setdefault('documents', 0)
+        stats.setdefault('bytes', 0)
+
+    for filename, content in sources:
+        if stats is not None:
+            stats['documents'] += 1
+            stats['bytes'] += len(content) if content is not None else os.path.getsize(filename)
         try:
-            # Parse XML file using the user-defined parse_xml function
-            data, invest = parse_xml(filename)
+            data, investigators = parse_xml_record(filename, content, error_log)
 
-            
-            if data is not None and not data.empty:
-                data['Year'] = year
-                data_list.append(data)
-            else:
+            if data is None:
                 error_files.append(str(filename))
-            if invest is not None and not invest.empty:
-                invest_list.append(invest)
+                continue
+            for column, values in grant_items:
+                values.append(data[column])
+            for investigator in investigators:
+                for column, values in invest_items:
+                    values.append(investigator[column])
         except Exception as e:
             # Log the file that caused an exception along with the error message
             error_files.append(f"{filename}: {str(e)}")
-    
-    # Concatenate all collected data into a single DataFrame
-    final_data = pd.concat(data_list, ignore_index=True) if data_list else pd.DataFrame()
-    final_invest = pd.concat(invest_list, ignore_index=True) if data_list else pd.DataFrame()
-    
-    return final_data, final_invest, error_files
+            if error_log is not None:
+                error_log.append(error_record(filename, e))
+
+    return grant_columns, invest_columns, error_files
+
+
+def build_year_frames(grant_columns, invest_columns, year):
+    """
+    Builds the grant and investigator DataFrames of one year from accumulated columns.
+
+    Returns:
+        tuple: (data, invest); both empty DataFrames if no document was parsed.
+    """
+    if not grant_columns['AwardID']:
+        return pd.DataFrame(), pd.DataFrame()
+    grant_columns = dict(grant_columns)
+    grant_columns['Year'] = [year] * len(grant_columns['AwardID'])
+    data = columns_to_frame(grant_columns, GRANT_DTYPES)
+    invest = columns_to_frame(invest_columns, INVESTIGATOR_DTYPES)
+    # Each award's investigators are consecutive and numbered from PI# 1
+    records = np.cumsum(invest['PI#'].to_numpy() == 1)
+    invest = add_collaboration_metrics(invest, groups=records)[INVESTIGATOR_COLUMNS]
+    return data, invest
 
 import pandas as pd
 from datetime import datetime
 from pathlib import Path
 
-def process_dataframe(df, root_folder, output_csv, output_pkl):
+PROCESSING_COLUMNS = ['grant_rows', 'invest_rows', 'xml_errors', 'xml_error_list', 'time_parsed']
+
+
+def process_dataframe(df, root_folder, output_csv, output_pkl, from_zip=False, output_parquet=None,
+                      deduplicate=False, run_report=None, abstract_store=None):
+    """
+    Parses every year listed in df and writes the per-year and combined outputs.
+
+    Parameters:
+        df (pd.DataFrame): The table returned by process_zip_files (columns 'file', 'year', ...).
+        root_folder (Path): The directory the archives were extracted to.
+        output_csv (Path): Directory for the CSV outputs.
+        output_pkl (Path): Directory for the pickle outputs.
+        from_zip (bool): Stream the XML straight from the archive in the 'file' column instead of
+            reading the extracted files under root_folder.
+        output_parquet (Path): If given, write the final tables as partitioned Parquet here
+            instead of grants_final/invest_final CSV and pickle.
+        deduplicate (bool): Keep only the latest amendment of awards found in several archives
+            (see deduplicate_awards) in the final tables.
+        run_report (instrumentation.RunReport): Records the 'parse', 'frames' and 'write'
+            stages of every year and the 'final' stage.
+        abstract_store (Path): Split storage: each year's AbstractNarration goes to this
+            compressed text store and the tables keep AbstractRef (see storage.split_abstracts).
+
+    Returns:
+        tuple: (df, final_data, final_invest)
+    """
     # Ensure output directories exist
     data_list = []
     invest_list = []
@@ -308,7 +758,7 @@ def process_dataframe(df, root_folder, output_csv, output_pkl):
     output_pkl.mkdir(parents=True, exist_ok=True)
 
     # Add new columns to the DataFrame if not already present
-    for column in ['grant_rows', 'invest_rows', 'xml_errors', 'xml_error_list', 'time_parsed']:
+    for column in PROCESSING_COLUMNS:
         if column not in df.columns:
             df[column] = None
 
@@ -318,46 +768,760 @@ def process_dataframe(df, root_folder, output_csv, output_pkl):
         print(f"Processing year: {year}...")
 
         # Collect data and errors from XML files
-        data, invest, error_files = collect_data_from_xml_files(root_folder, year)
+        if from_zip:
+            data, invest, error_files = collect_data_from_zip(row['file'], year, run_report)
+        else:
+            data, invest, error_files = collect_data_from_xml_files(root_folder, year, run_report)
+        data = split_year_abstracts(data, year, abstract_store, run_report)
 
-        # Update the DataFrame with new information
-        df.loc[index, 'grant_rows'] = int(len(data))
-        df.loc[index, 'invest_rows'] = int(len(invest))  # Corrected here to use invest instead of data
-        df.loc[index, 'xml_errors'] = len(error_files)
-        df.loc[index, 'xml_error_list'] = ', '.join(error_files)  # Store error file names as a string
-        df.loc[index, 'time_parsed'] = datetime.now()
+        with instrumentation.stage(run_report, 'write', year) as stage:
+            record_year_results(df, index, year, data, invest, error_files, output_csv, output_pkl)
+            stage['documents'] = len(data)
 
         # Append data and invest to their respective lists
         data_list.append(data)
         invest_list.append(invest)
 
-        # Save the processed data for the year
-        if not data.empty:
-            data.to_csv(output_csv / f'{year}.csv', index=False)
-            data.to_pickle(output_pkl / f'{year}.pkl')
+    with instrumentation.stage(run_report, 'final') as stage:
+        final_data, final_invest = write_final_outputs(df, data_list, invest_list, output_csv, output_pkl,
+                                                       output_parquet, deduplicate)
+        stage['documents'] = len(final_data)
+    return df, final_data, final_invest
+
+
+def process_dataframe_parallel(df, root_folder, output_csv, output_pkl, from_zip=False,
+                               workers=None, chunk_size=500, shard='files', output_parquet=None,
+                               deduplicate=False, run_report=None, abstract_store=None):
+    """
+    Parallel version of process_dataframe that parses the XML on a process pool.
+
+    Work is split into batches (one per year with shard='year', or chunk_size documents per
+    batch with shard='files') and submitted to a ProcessPoolExecutor. Results are gathered in
+    submission order, so the per-year frames, the error lists and the final tables come out
+    in the same order as the sequential run.
+
+    Parameters:
+        df (pd.DataFrame): The table returned by process_zip_files (columns 'file', 'year', ...).
+        root_folder (Path): The directory the archives were extracted to.
+        output_csv (Path): Directory for the CSV outputs.
+        output_pkl (Path): Directory for the pickle outputs.
+        from_zip (bool): Stream the XML straight from the archive in the 'file' column.
+        workers (int): Number of worker processes (default: os.cpu_count()).
+        chunk_size (int): Documents per batch when shard='files'.
+        shard (str): 'files' to split each year into batches of chunk_size, 'year' for one
+            batch per year.
+        output_parquet (Path): If given, write the final tables as partitioned Parquet here.
+        deduplicate (bool): Keep only the latest amendment of each award in the final tables.
+        run_report (instrumentation.RunReport): Records the pool's wall time ('parse_pool'),
+            each year's 'parse' stage (summed over its batches, so in worker seconds),
+            'frames' and 'write', and the 'final' stage.
+        abstract_store (Path): Move AbstractNarration to this text store (see process_dataframe).
+
+    Returns:
+        tuple: (df, final_data, final_invest)
+    """
+    if shard not in ('files', 'year'):
+        raise ValueError(f"shard must be 'files' or 'year', got '{shard}'")
+    workers = workers or os.cpu_count()
+
+    data_list = []
+    invest_list = []
+    output_csv.mkdir(parents=True, exist_ok=True)
+    output_pkl.mkdir(parents=True, exist_ok=True)
+
+    for column in PROCESSING_COLUMNS:
+        if column not in df.columns:
+            df[column] = None
+
+    # Build the batches for every year up front so the pool stays busy across years
+    batches = []
+    for index, row in df.iterrows():
+        year = row['year']
+        zip_path = row['file'] if from_zip else None
+        names = list_year_sources(root_folder, year, zip_path)
+        size = len(names) if shard == 'year' else chunk_size
+        for start in range(0, max(len(names), 1), max(size, 1)):
+            batches.append((index, year, zip_path, names[start:start + size]))
+    print(f"Parsing {len(df)} years in {len(batches)} batches on {workers} workers...")
+
+    with instrumentation.stage(run_report, 'parse_pool') as pool_stage, \
+            ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(parse_batch, year, zip_path, names)
+                   for _, year, zip_path, names in batches]
+
+        # Gather the column batches of each year in submission order
+        year_parts = {}
+        for (index, year, _, _), future in zip(batches, futures):
+            year_parts.setdefault(index, []).append(future.result())
+            pool_stage['documents'] += year_parts[index][-1][3]['documents']
+            pool_stage['bytes'] += year_parts[index][-1][3]['bytes']
+
+    for index, row in df.iterrows():
+        year = row['year']
+        print(f"Combining year: {year}...")
+        parts = year_parts.get(index, [])
+        data, invest, error_files = combine_batches(parts, year, run_report)
+        data = split_year_abstracts(data, year, abstract_store, run_report)
+
+        with instrumentation.stage(run_report, 'write', year) as stage:
+            record_year_results(df, index, year, data, invest, error_files, output_csv, output_pkl)
+            stage['documents'] = len(data)
+        data_list.append(data)
+        invest_list.append(invest)
+
+    with instrumentation.stage(run_report, 'final') as stage:
+        final_data, final_invest = write_final_outputs(df, data_list, invest_list, output_csv, output_pkl,
+                                                       output_parquet, deduplicate)
+        stage['documents'] = len(final_data)
+    return df, final_data, final_invest
+
+
+def list_year_sources(root_folder, year, zip_path=None):
+    """
+    Lists the XML documents of one year, either the members of its ZIP archive or the
+    extracted files under root_folder/<year>.
 
-        if not invest.empty:
-            invest.to_csv(output_csv / f'investigator_{year}.csv', index=False)
-            invest.to_pickle(output_pkl / f'investigator_{year}.pkl')
+    Returns:
+        list: Member names (zip_path given) or file paths as strings.
+    """
+    if zip_path is not None:
+        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+            return list_zip_xml_members(zip_ref)
+    return [str(filename) for filename in (Path(root_folder) / str(year)).rglob("*.xml")]
+
+
+def parse_batch(year, zip_path, names):
+    """
+    Parses one batch of documents; this is the unit of work run by the process pool.
+
+    Parameters:
+        year (int): The year the documents belong to.
+        zip_path (str): The archive to read the members from, or None for extracted files.
+        names (list): Member names or file paths.
 
-    # Combine all grant data and investigator data across all years
-    final_data = pd.concat(data_list, ignore_index=True) if data_list else pd.DataFrame()
-    final_invest = pd.concat(invest_list, ignore_index=True) if invest_list else pd.DataFrame()
+    Returns:
+        tuple: (grant_columns, invest_columns, error_files) as returned by collect_parsed_columns,
+            and the batch's stats (documents, bytes, error_log and wall_s).
+    """
+    start = time.perf_counter()
+    stats = {}
+    if zip_path is None:
+        parsed = collect_parsed_columns(((Path(name), None) for name in names), stats)
+    else:
+        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+            parsed = collect_parsed_columns(((name, zip_ref.read(name)) for name in names), stats)
+    stats['wall_s'] = time.perf_counter() - start
+    return parsed + (stats,)
+
+
+def combine_batches(parts, year, run_report=None):
+    """
+    Combines the column batches of one year, keeping their order, into one grant and one
+    investigator DataFrame.
+
+    With run_report, the batches' stats are recorded as the year's 'parse' stage (its wall
+    time is the sum of the batch times) and the frame building as 'frames'.
+
+    Returns:
+        tuple: (data, invest, error_files)
+    """
+    grant_columns = {column: [] for column in GRANT_EXTRACTOR['columns']}
+    invest_columns = {column: [] for column in PARSED_INVESTIGATOR_COLUMNS}
+    error_files = []
+    parse_stage = {'stage': 'parse', 'year': year, 'documents': 0, 'bytes': 0, 'error_log': []}
+    parse_s = 0.0
+    for batch_grants, batch_invest, batch_errors, batch_stats in parts:
+        for column, values in batch_grants.items():
+            grant_columns[column].extend(values)
+        for column, values in batch_invest.items():
+            invest_columns[column].extend(values)
+        error_files.extend(batch_errors)
+        parse_stage['documents'] += batch_stats['documents']
+        parse_stage['bytes'] += batch_stats['bytes']
+        parse_stage['error_log'].extend(batch_stats['error_log'])
+        parse_s += batch_stats['wall_s']
+    if run_report is not None:
+        run_report.add_stage(parse_stage, parse_s)
+    with instrumentation.stage(run_report, 'frames', year) as stage:
+        data, invest = build_year_frames(grant_columns, invest_columns, year)
+        stage['documents'] = len(data)
+    return data, invest, error_files
+
+
+def record_year_results(df, index, year, data, invest, error_files, output_csv, output_pkl):
+    """
+    Records the bookkeeping columns for one year in df and saves that year's outputs.
+    """
+    # Update the DataFrame with new information
+    df.loc[index, 'grant_rows'] = int(len(data))
+    df.loc[index, 'invest_rows'] = int(len(invest))  # Corrected here to use invest instead of data
+    df.loc[index, 'xml_errors'] = len(error_files)
+    df.loc[index, 'xml_error_list'] = ', '.join(error_files)  # Store error file names as a string
+    df.loc[index, 'time_parsed'] = datetime.now()
+
+    # Save the processed data for the year
+    if not data.empty:
+        data.to_csv(output_csv / f'{year}.csv', index=False)
+        data.to_pickle(output_pkl / f'{year}.pkl')
+
+    if not invest.empty:
+        invest.to_csv(output_csv / f'investigator_{year}.csv', index=False)
+        invest.to_pickle(output_pkl / f'investigator_{year}.pkl')
+
+
+def split_year_abstracts(data, year, abstract_store, run_report=None):
+    """
+    Moves one year's AbstractNarration into the abstract text store (see
+    storage.split_abstracts), so the per-year outputs, the concatenation and the final
+    tables only carry AbstractRef. Does nothing when abstract_store is None.
+    """
+    if abstract_store is None or 'AbstractNarration' not in data.columns:
+        return data
+    import storage  # pyarrow is only needed for the abstract store
+    with instrumentation.stage(run_report, 'abstracts', year) as stage:
+        stage['documents'] = len(data)
+        stage['bytes'] = int(data['AbstractNarration'].str.len().sum())
+        data = storage.split_abstracts(data, abstract_store)
+    return data
+
+
+def write_final_outputs(df, data_list, invest_list, output_csv, output_pkl, output_parquet=None,
+                        deduplicate=False):
+    """
+    Combines all grant data and investigator data across all years and writes the final tables.
+
+    With output_parquet set, grants_final and invest_final are written once as typed Parquet
+    datasets (see storage.write_grants_parquet) instead of as a CSV and a pickle copy.
+    With deduplicate set, awards found in several archives keep only their latest amendment
+    and the collapsed records are written to duplicate_awards.csv/.pkl.
+
+    Returns:
+        tuple: (final_data, final_invest)
+    """
+    if deduplicate:
+        final_data, final_invest, audit = deduplicate_awards(data_list, invest_list)
+        audit.to_csv(output_csv / 'final' / 'duplicate_awards.csv', index=False)
+        audit.to_pickle(output_pkl / 'final' / 'duplicate_awards.pkl')
+    else:
+        final_data = pd.concat(data_list, ignore_index=True) if data_list else pd.DataFrame()
+        final_invest = pd.concat(invest_list, ignore_index=True) if invest_list else pd.DataFrame()
     df.to_csv(output_csv / 'final' / 'df_final.csv', index=False)
     df.to_pickle(output_pkl / 'final' / 'df_final.pkl')
+    if output_parquet is not None:
+        import storage  # pyarrow is only needed for the Parquet output
+        storage.write_grants_parquet(final_data, Path(output_parquet) / 'grants')
+        storage.write_investigators_parquet(final_invest, Path(output_parquet) / 'investigators')
+        return final_data, final_invest
     final_data.to_csv(output_csv / 'final' / 'grants_final.csv', index=False)
     final_data.to_pickle(output_pkl / 'final' / 'grants_final.pkl')
     final_invest.to_csv(output_csv / 'final' / 'invest_final.csv', index=False)
     final_invest.to_pickle(output_pkl / 'final' / 'invest_final.pkl')
+    return final_data, final_invest
+
+# Columns of the duplicate award audit: the dropped record and the record kept in its place
+AUDIT_COLUMNS = ['AwardID', 'Year', 'MaxAmdLetterDate', 'AwardAmount']
+
+
+def letter_dates(values):
+    """Amendment dates as int64 nanoseconds for ordering; missing or unparseable dates sort first."""
+    if not pd.api.types.is_datetime64_any_dtype(values):
+        codes, uniques = pd.factorize(values)
+        parsed = pd.to_datetime(pd.Series(uniques, dtype=object), format=DATE_FORMAT, errors='coerce')
+        values = pd.Series(parsed.to_numpy(dtype='datetime64[ns]')).reindex(codes)
+    # NaT is the smallest int64
+    return values.to_numpy(dtype='datetime64[ns]').astype(np.int64)
+
+
+def deduplicate_awards(data_list, invest_list=None, key='AwardID', date_column='MaxAmdLetterDate'):
+    """
+    Combines per-year (or any ordered list of) grant tables keeping one record per award: the
+    one with the latest MaxAmdLetterDate. On equal dates the record from the newest archive
+    (Year) wins, whatever the order of the tables, and within a Year the record from the later
+    table, so re-appending a year replaces what was there. Awards that appear once are kept as
+    they are, in their original order. panel.award_positions keeps the same records.
+
+    Each key is hashed once (pd.factorize) and the records are ordered by (key, date, Year, position),
+    so no pairwise comparison between tables is needed.
+
+    Investigator rows follow their award record: the investigators of dropped records are
+    removed too. They are matched by table and by the order of the records of an award within
+    its table, since the investigator tables carry no Year.
+
+    Parameters:
+        data_list (list): Grant DataFrames in ingestion order (e.g. one per year).
+        invest_list (list): The matching investigator DataFrames, or None.
+        key (str): The award identifier.
+        date_column (str): The amendment date deciding which record is the latest.
+
+    Returns:
+        tuple: (grants, invest, audit). invest is None without invest_list. audit has one row per
+            dropped record with AUDIT_COLUMNS, the same values of the kept record (Kept_ prefix),
+            and Identical (True when both records have the same values apart from Year).
+    """
+    grants = pd.concat(data_list, ignore_index=True) if data_list else pd.DataFrame()
+    invest = None
+    if invest_list is not None:
+        invest = pd.concat(invest_list, ignore_index=True) if invest_list else pd.DataFrame()
+    audit_columns = [column for column in AUDIT_COLUMNS if column in grants.columns or grants.columns.empty]
+    if grants.empty:
+        kept_columns = ['Kept_' + column for column in audit_columns if column != key]
+        return grants, invest, pd.DataFrame(columns=audit_columns + kept_columns + ['Identical'])
+
+    sources = np.repeat(np.arange(len(data_list)), [len(data) for data in data_list])
+    key_codes, keys = pd.factorize(grants[key])
+    sort_keys = [np.arange(len(grants))]
+    if 'Year' in grants.columns:
+        sort_keys.append(grants['Year'].to_numpy())
+    order = np.lexsort(sort_keys + [letter_dates(grants[date_column]), key_codes])
+    sorted_codes = key_codes[order]
+    # The last row of each key in (key, date, Year, position) order is the latest record; rows
+    # without a key are never collapsed
+    latest = np.ones(len(order), dtype=bool)
+    latest[:-1] = sorted_codes[1:] != sorted_codes[:-1]
+    latest |= sorted_codes < 0
+    keep = np.zeros(len(grants), dtype=bool)
+    keep[order[latest]] = True
+    dropped = np.flatnonzero(~keep)
+
+    kept_of_key = np.full(len(keys), -1, dtype=np.int64)
+    named = latest & (sorted_codes >= 0)
+    kept_of_key[sorted_codes[named]] = order[named]
+    kept = kept_of_key[key_codes[dropped]]
+
+    dropped_rows = grants.iloc[dropped].reset_index(drop=True)
+    kept_rows = grants.iloc[kept].reset_index(drop=True)
+    compare = [column for column in grants.columns if column != 'Year']
+    audit = dropped_rows[audit_columns].copy()
+    for column in audit_columns:
+        if column != key:
+            audit['Kept_' + column] = kept_rows[column].to_numpy()
+    audit['Identical'] = (pd.util.hash_pandas_object(dropped_rows[compare], index=False).to_numpy()
+                          == pd.util.hash_pandas_object(kept_rows[compare], index=False).to_numpy())
+
+    if invest is not None and len(dropped) and not invest.empty:
+        # Number the records of each (award, table) in order, for grants and investigator records
+        occurrence = pd.DataFrame({'key': key_codes, 'source': sources}).groupby(['key', 'source']).cumcount().to_numpy()
+        dropped_records = pd.MultiIndex.from_arrays([key_codes[dropped], sources[dropped], occurrence[dropped]])
+        invest_sources = np.repeat(np.arange(len(invest_list)), [len(part) for part in invest_list])
+        starts = invest['PI#'].to_numpy() == 1
+        record = np.cumsum(starts) - 1
+        first = np.flatnonzero(starts)
+        records = pd.DataFrame({'key': pd.Index(keys).get_indexer(invest[key].to_numpy()[first]),
+                                'source': invest_sources[first]})
+        records['occurrence'] = records.groupby(['key', 'source']).cumcount().to_numpy()
+        drop_record = dropped_records.get_indexer(pd.MultiIndex.from_frame(records)) >= 0
+        drop_invest = np.where(record >= 0, np.append(drop_record, False)[record], False)
+        invest = invest[~drop_invest].reset_index(drop=True)
+
+    grants = grants[keep].reset_index(drop=True)
+    print(f"Deduplicated awards: kept {len(grants)}, collapsed {len(dropped)} duplicate records "
+          f"({int(audit['Identical'].sum())} identical)")
+    return grants, invest, audit
+
+
+def append_awards(final_data, final_invest, data, invest, key='AwardID', date_column='MaxAmdLetterDate'):
+    """
+    Appends newly ingested years to deduplicated final tables. Awards already present keep
+    whichever record has the latest amendment (the new one on equal dates).
+
+    Returns:
+        tuple: (final_data, final_invest, audit) as returned by deduplicate_awards.
+    """
+    return deduplicate_awards([final_data, data], [final_invest, invest], key, date_column)
+
+# Columns of the ingest manifest: one row per yearly archive with its change-detection
+# fingerprint (size, mtime, content hash) and the hashes of the per-year outputs built from it
+MANIFEST_COLUMNS = [
+    'file', 'year', 'size', 'mtime_ns', 'sha256', 'grant_rows', 'invest_rows', 'xml_errors',
+    'xml_error_list', 'grants_sha256', 'invest_sha256', 'time_parsed', 'parser_version',
+]
+# Bump when parse_xml / extract_investigators change in a way the field tables do not show
+# (error handling, cleaning), so cached per-year outputs of the old parser are parsed again
+PARSER_REVISION = 1
+
+
+def parser_version():
+    """
+    Fingerprint of the parser recorded in the manifest: PARSER_REVISION and the field and
+    column tables. Cached years parsed with another version are not reused.
+    """
+    spec = repr((PARSER_REVISION, GRANT_FIELDS, INVESTIGATOR_FIELDS, GRANT_COLUMNS, INVESTIGATOR_COLUMNS))
+    return f'{PARSER_REVISION}-{hashlib.sha256(spec.encode()).hexdigest()[:12]}'
+
+
+def file_sha256(path, block_size=1 << 20):
+    """Returns the SHA-256 hex digest of a file, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for block in iter(lambda: handle.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(manifest_path):
+    """
+    Loads the ingest manifest, or returns an empty one if it does not exist yet.
+
+    Returns:
+        pd.DataFrame: The manifest indexed by year.
+    """
+    manifest_path = Path(manifest_path)
+    if manifest_path.exists():
+        manifest = pd.read_csv(manifest_path, dtype={'sha256': str, 'grants_sha256': str,
+                                                     'invest_sha256': str, 'xml_error_list': str,
+                                                     'parser_version': str})
+        # Restore the types record_year_results writes, so reused years match parsed ones
+        manifest['xml_error_list'] = manifest['xml_error_list'].fillna('')
+        manifest['time_parsed'] = pd.Series(pd.to_datetime(manifest['time_parsed']).dt.to_pydatetime(),
+                                            index=manifest.index, dtype=object)
+        if 'parser_version' not in manifest.columns:
+            manifest['parser_version'] = None
+    else:
+        manifest = pd.DataFrame(columns=MANIFEST_COLUMNS)
+    return manifest.set_index('year', drop=False)
+
+
+def archive_unchanged(entry, zip_path, stat):
+    """
+    Checks an archive against its manifest entry. Size and mtime are compared first; the
+    content hash is only computed when the size matches but the mtime moved (e.g. the
+    archive was downloaded again with the same content).
+
+    Returns:
+        tuple: (unchanged, sha256 or None if it was not computed)
+    """
+    if entry is None or int(entry['size']) != stat.st_size:
+        return False, None
+    if int(entry['mtime_ns']) == stat.st_mtime_ns:
+        return True, entry['sha256']
+    sha256 = file_sha256(zip_path)
+    return sha256 == entry['sha256'], sha256
+
+
+def cached_outputs_valid(entry, output_pkl, year):
+    """
+    Checks that the per-year pickles recorded in a manifest entry were written by the current
+    parser (see parser_version) and still exist unchanged.
+    """
+    if entry['parser_version'] != parser_version():
+        return False
+    for name, column in ((f'{year}.pkl', 'grants_sha256'), (f'investigator_{year}.pkl', 'invest_sha256')):
+        expected = entry[column]
+        path = output_pkl / name
+        if pd.isna(expected) or expected == '':
+            continue
+        if not path.exists() or file_sha256(path) != expected:
+            return False
+    return True
+
+
+def process_dataframe_incremental(df, root_folder, output_csv, output_pkl,
+                                  manifest_path='../coded/manifest.csv', from_zip=True,
+                                  output_parquet=None, deduplicate=False, run_report=None,
+                                  abstract_store=None):
+    """
+    Incremental version of process_dataframe: only years whose archive changed since the last
+    run are parsed again; the others reuse their cached per-year pickles.
+
+    The manifest (a CSV next to coded/nsf_data.csv) records, per archive, its size, mtime and
+    SHA-256 along with the row counts, errors, the SHA-256 of the per-year pickles and the
+    parser version. A year is reused when its archive is unchanged, it was parsed by the current
+    parser (see parser_version) and its pickles still match the recorded hashes.
+    grants_final/invest_final are then rebuilt from the cached and freshly parsed years.
+
+    Parameters:
+        df (pd.DataFrame): The table returned by process_zip_files (columns 'file', 'year', ...).
+        root_folder (Path): The directory the archives were extracted to (used if from_zip=False).
+        output_csv (Path): Directory for the CSV outputs.
+        output_pkl (Path): Directory for the pickle outputs (also the per-year cache).
+        manifest_path (Path): Where the manifest is read from and written to.
+        from_zip (bool): Stream the XML straight from the archives in the 'file' column.
+        output_parquet (Path): If given, write the final tables as partitioned Parquet here.
+        deduplicate (bool): Keep only the latest amendment of each award in the final tables.
+        run_report (instrumentation.RunReport): Records a 'reuse' stage for cached years and the
+            'parse', 'frames' and 'write' stages of the parsed ones, then the 'final' stage.
+        abstract_store (Path): Move AbstractNarration to this text store (see process_dataframe).
+            Cached years written without it are split when they are loaded.
+
+    Returns:
+        tuple: (df, final_data, final_invest)
+    """
+    data_list = []
+    invest_list = []
+    output_csv.mkdir(parents=True, exist_ok=True)
+    output_pkl.mkdir(parents=True, exist_ok=True)
+
+    for column in PROCESSING_COLUMNS:
+        if column not in df.columns:
+            df[column] = None
+
+    manifest = load_manifest(manifest_path)
+    entries = {int(year): entry for year, entry in manifest.iterrows()}
+    reused = 0
+
+    for index, row in df.iterrows():
+        year = int(row['year'])
+        zip_path = Path(row['file'])
+        stat = zip_path.stat()
+        entry = entries.get(year)
+
+        unchanged, sha256 = archive_unchanged(entry, zip_path, stat)
+        if unchanged and cached_outputs_valid(entry, output_pkl, year):
+            print(f"Reusing year: {year} (archive unchanged)")
+            with instrumentation.stage(run_report, 'reuse', year) as stage:
+                data = pd.read_pickle(output_pkl / f'{year}.pkl') if int(entry['grant_rows']) else pd.DataFrame()
+                invest = pd.read_pickle(output_pkl / f'investigator_{year}.pkl') if int(entry['invest_rows']) else pd.DataFrame()
+                stage['documents'] = len(data)
+            data = split_year_abstracts(data, year, abstract_store, run_report)
+            for column in PROCESSING_COLUMNS:
+                df.loc[index, column] = entry[column]
+            if int(entry['mtime_ns']) != stat.st_mtime_ns:
+                # Same content under a new mtime: record it so the next run skips the hash
+                entry = entry.copy()
+                entry['mtime_ns'] = stat.st_mtime_ns
+                entries[year] = entry
+            reused += 1
+        else:
+            print(f"Processing year: {year}...")
+            if from_zip:
+                data, invest, error_files = collect_data_from_zip(zip_path, year, run_report)
+            else:
+                data, invest, error_files = collect_data_from_xml_files(root_folder, year, run_report)
+            data = split_year_abstracts(data, year, abstract_store, run_report)
+            with instrumentation.stage(run_report, 'write', year) as stage:
+                record_year_results(df, index, year, data, invest, error_files, output_csv, output_pkl)
+                stage['documents'] = len(data)
+
+            entries[year] = pd.Series({
+                'file': str(zip_path),
+                'year': year,
+                'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns,
+                'sha256': sha256 or file_sha256(zip_path),
+                'grant_rows': int(len(data)),
+                'invest_rows': int(len(invest)),
+                'xml_errors': len(error_files),
+                'xml_error_list': ', '.join(error_files),
+                'grants_sha256': file_sha256(output_pkl / f'{year}.pkl') if not data.empty else '',
+                'invest_sha256': file_sha256(output_pkl / f'investigator_{year}.pkl') if not invest.empty else '',
+                'time_parsed': df.loc[index, 'time_parsed'],
+                'parser_version': parser_version(),
+            })
+            # Save after every year so an interrupted run keeps its progress
+            save_manifest(entries, manifest_path)
+
+        data_list.append(data)
+        invest_list.append(invest)
+
+    print(f"Reused {reused} of {len(df)} years from the cache")
+    save_manifest(entries, manifest_path)
+    with instrumentation.stage(run_report, 'final') as stage:
+        final_data, final_invest = write_final_outputs(df, data_list, invest_list, output_csv, output_pkl,
+                                                       output_parquet, deduplicate)
+        stage['documents'] = len(final_data)
     return df, final_data, final_invest
 
-def create_grant_features(df, icorps, title_column='AwardTitle'):
+
+def save_manifest(entries, manifest_path):
+    """Writes the manifest entries (year -> Series) to CSV, newest year first."""
+    manifest = pd.DataFrame(list(entries.values()), columns=MANIFEST_COLUMNS)
+    manifest.sort_values(by='year', ascending=False, inplace=True)
+    manifest.to_csv(manifest_path, index=False)
+
+# Identifier columns that are stored as compact strings by type_grants/type_investigators
+GRANT_ID_COLUMNS = ['AwardID', 'Institution_OrgUEINum', 'Institution_Zip', 'Performance_Institution_Zip', 'AbstractRef']
+INVESTIGATOR_ID_COLUMNS = ['AwardID', 'NSFID', 'Email']
+
+
+def compact_string_dtype():
+    """Returns the Arrow-backed string dtype if pyarrow is installed, else pandas' 'string'."""
+    try:
+        import pyarrow  # noqa: F401
+        return pd.StringDtype('pyarrow')
+    except ImportError:
+        return pd.StringDtype()
+
+
+def memory_mb(df):
+    """Returns the deep memory usage of a DataFrame in MB."""
+    return df.memory_usage(deep=True).sum() / 1024 ** 2
+
+
+def print_memory_change(label, before, after):
+    """Prints the memory usage of a table before and after typing."""
+    share = f" ({after / before:.0%})" if before else ""
+    print(f"{label} memory: {before:,.1f} MB -> {after:,.1f} MB{share}")
+
+
+def apply_column_types(df, date_columns=(), amount_columns=(), code_columns=(), id_columns=(),
+                       int_columns=None):
     """
-    Create features for SBIR and STTR awards in a grants DataFrame.
+    Converts the parsed string columns of df in place: dates to datetime64, amounts to
+    float64, codes to category and identifiers to a compact string dtype. Columns that
+    already have the target dtype are left alone, so typing twice is cheap.
+    """
+    string_dtype = compact_string_dtype()
+    for column in date_columns:
+        if column in df.columns and not pd.api.types.is_datetime64_any_dtype(df[column]):
+            df[column] = pd.to_datetime(df[column], format=DATE_FORMAT, errors='coerce')
+    for column in amount_columns:
+        if column in df.columns and not pd.api.types.is_float_dtype(df[column]):
+            df[column] = pd.to_numeric(df[column], errors='coerce').astype('float64')
+    for column in code_columns:
+        if column in df.columns and not isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype('category')
+    for column in id_columns:
+        if column in df.columns and not isinstance(df[column].dtype, pd.StringDtype):
+            df[column] = df[column].astype(string_dtype)
+    for column, dtype in (int_columns or {}).items():
+        if column in df.columns:
+            df[column] = df[column].astype(dtype)
+    return df
+
+
+def type_grants(grants, report=True):
+    """
+    Post-parse typing stage for the grants table: dates become datetime64, amounts float64,
+    low-cardinality codes category, identifiers compact strings and Year int16.
+
+    Parameters:
+        grants (pd.DataFrame): The grants table as parsed (all strings).
+        report (bool): Print the memory usage before and after typing.
+
+    Returns:
+        pd.DataFrame: The typed table (a copy).
+    """
+    before = memory_mb(grants) if report else None
+    typed = apply_column_types(
+        grants.copy(),
+        date_columns=GRANT_DATE_COLUMNS,
+        amount_columns=GRANT_AMOUNT_COLUMNS,
+        code_columns=GRANT_CODE_COLUMNS,
+        id_columns=GRANT_ID_COLUMNS,
+        int_columns={'Year': 'int16'},
+    )
+    if report:
+        after = memory_mb(typed)
+        print_memory_change('Grants', before, after)
+    return typed
+
+
+def type_investigators(invest, report=True):
+    """
+    Post-parse typing stage for the investigator table: dates become datetime64, role and
+    domain category, identifiers compact strings and the counts int32.
+
+    Parameters:
+        invest (pd.DataFrame): The investigator table as parsed.
+        report (bool): Print the memory usage before and after typing.
+
+    Returns:
+        pd.DataFrame: The typed table (a copy).
+    """
+    before = memory_mb(invest) if report else None
+    typed = apply_column_types(
+        invest.copy(),
+        date_columns=INVESTIGATOR_DATE_COLUMNS,
+        code_columns=INVESTIGATOR_CODE_COLUMNS,
+        id_columns=INVESTIGATOR_ID_COLUMNS,
+        int_columns={column: 'int32' for column in INVESTIGATOR_DTYPES},
+    )
+    if report:
+        after = memory_mb(typed)
+        print_memory_change('Investigators', before, after)
+    return typed
+
+
+def as_key(series, like=None):
+    """
+    Returns a merge key column as strings without re-casting columns that are already typed.
+
+    Parameters:
+        series (pd.Series): The key column.
+        like (pd.Series): Optional key column of the other side of the merge; its string
+            dtype is used so both sides of the join match.
+
+    Returns:
+        pd.Series
+    """
+    if like is not None and isinstance(like.dtype, pd.StringDtype):
+        if series.dtype == like.dtype:
+            return series
+        return series.astype(str).astype(like.dtype)
+    if isinstance(series.dtype, pd.StringDtype):
+        return series
+    return series.astype(str)
+
+
+# Award title rules: (pattern, flag columns set when the pattern is found in a title).
+# Patterns are matched case-insensitively; use (?-i:...) for case-sensitive ones. Rules are
+# independent, and flags set by several rules are OR-ed together.
+AWARD_TITLE_RULES = [
+    (r'\bSBIR\b', ['sbir']),
+    (r'\bSBIR Phase I:', ['sbir_1']),
+    (r'\bSBIR Phase II:', ['sbir_2']),
+    (r'\bSTTR\b', ['sttr']),
+    (r'\bSTTR Phase I:', ['sttr_1']),
+    (r'\bSTTR Phase II:', ['sttr_2']),
+    (r'\bI-?Corps\b', ['icorps']),
+    (r'(?-i:\bCAREER\b)', ['career']),
+    (r'(?-i:\bRAPID\b)', ['rapid']),
+    (r'(?-i:\bEAGER\b)', ['eager']),
+    (r'\bCollaborative Research\b', ['collaborative']),
+]
+
+
+def load_title_rules(path):
+    """
+    Reads award title rules from a CSV file with a 'pattern' column and a 'flags' column
+    (flag column names separated by ';').
+
+    Returns:
+        list: (pattern, flags) pairs for classify_titles.
+    """
+    rules = pd.read_csv(path, dtype=str)
+    return [(pattern, [flag.strip() for flag in flags.split(';') if flag.strip()])
+            for pattern, flags in zip(rules['pattern'], rules['flags'])]
+
+
+def classify_titles(titles, rules=AWARD_TITLE_RULES):
+    """
+    Flags award titles with every rule of a rule table and returns all flag columns at once.
+
+    All rules are combined into one pattern with a named group per rule, each inside an
+    optional lookahead from the start of the title, so a single str.extract call scans every
+    title once and reports each rule that is found anywhere in it, including rules that
+    overlap (e.g. 'SBIR' and 'SBIR Phase I:'). Lookaheads are not supported by RE2, so
+    the titles are matched with Python's re.
+
+    Parameters:
+        titles (pd.Series): The award titles.
+        rules (list): (pattern, flags) pairs, e.g. AWARD_TITLE_RULES or load_title_rules(path).
+
+    Returns:
+        pd.DataFrame: One 0/1 int column per flag, in first-seen order, aligned with titles.
+    """
+    columns = []
+    for _, flags in rules:
+        columns.extend(flag for flag in flags if flag not in columns)
+    combined = '^' + ''.join(f'(?=(?:.*?(?P<rule_{i}>{pattern}))?)' for i, (pattern, _) in enumerate(rules))
+    strings = titles.astype(compact_string_dtype()).astype(object)
+    matches = strings.str.extract(combined, flags=re.IGNORECASE | re.DOTALL)
+    found = np.zeros((len(titles), len(columns)), dtype=int)
+    for i, (_, flags) in enumerate(rules):
+        rows = np.flatnonzero(matches[f'rule_{i}'].notna().to_numpy())
+        found[np.ix_(rows, [columns.index(flag) for flag in flags])] = 1
+    return pd.DataFrame(found, index=titles.index, columns=columns)
+
+
+def create_grant_features(df, icorps, title_column='AwardTitle', rules=AWARD_TITLE_RULES):
+    """
+    Create features for SBIR, STTR and other award programs in a grants DataFrame.
 
     Parameters:
         df (pd.DataFrame): The input DataFrame containing grant data.
         title_column (str): The column name containing the award titles.
+        rules (list): Title rules (see AWARD_TITLE_RULES); one 0/1 column is added per flag.
 
     Returns:
         pd.DataFrame: The DataFrame with new feature columns added.
@@ -366,14 +1530,12 @@ def create_grant_features(df, icorps, title_column='AwardTitle'):
     if title_column not in df.columns:
         raise ValueError(f"Column '{title_column}' not found in the DataFrame.")
 
-    # Create new feature columns
-    df['sbir'] = df[title_column].str.contains(r'\bSBIR\b', case=False, na=False).astype(int)
-    df['sbir_1'] = df[title_column].str.contains(r'\bSBIR Phase I:\b', case=False, na=False).astype(int)
-    df['sbir_2'] = df[title_column].str.contains(r'\bSBIR Phase II:\b', case=False, na=False).astype(int)
-    df['sttr'] = df[title_column].str.contains(r'\bSTTR\b', case=False, na=False).astype(int)
-    df['sttr_1'] = df[title_column].str.contains(r'\bSTTR Phase I:\b', case=False, na=False).astype(int)
-    df['sttr_2'] = df[title_column].str.contains(r'\bSTTR Phase II:\b', case=False, na=False).astype(int)
-    df['AwardID'] = df['AwardID'].astype(str)
+    # Create new feature columns (sbir, sbir_1, ..., collaborative) in one scan of the titles
+    flags = classify_titles(df[title_column], rules)
+    df[flags.columns] = flags
+    # Typed frames (see type_grants) already hold AwardID as strings
+    df['AwardID'] = as_key(df['AwardID'])
+    icorps = icorps.assign(AwardID=as_key(icorps['AwardID'], like=df['AwardID']))
     #merget df with icorps by AwardID
     df = df.merge(icorps, on='AwardID', how='left')
     #fill NaNs with zeros['teams', 'hub', 'site', 'node']
@@ -442,30 +1604,100 @@ def process_and_merge_grants(grants, other_df, key='AwardID', columns_to_clean=N
         columns_to_clean = []
 
     # Ensure the key column is of type string in both dataframes
-    other_df[key] = other_df[key].astype(str)
-    grants[key] = grants[key].astype(str)
+    # (typed frames from type_grants already are and are not re-cast)
+    grants[key] = as_key(grants[key])
+    other_df[key] = as_key(other_df[key], like=grants[key])
 
     # Merge the dataframes
     fields_to_inc=[key]+columns_to_clean
     print("merging dataframes", grants.shape, other_df.shape)
     merged_df = grants.merge(other_df[fields_to_inc], on=key, how='left')
     print("merged", merged_df.shape)
-    # Clean and process specified columns
+    # Clean and process specified columns: missing and invalid values become 0
     for col in columns_to_clean:
         if col in merged_df.columns:
-            # Fill NaN values with 0
-            merged_df[col] = merged_df[col].fillna(0)
+            merged_df[col] = coerce_int(merged_df[col])
 
-            # Ensure all values are integers
-            merged_df[col] = merged_df[col].apply(
-                lambda x: int(str(x).replace(r'\D', '')) if str(x).isdigit() else 0
-            )
-            merged_df[col]=merged_df[col].astype(int)
+    return merged_df
 
-    # Ensure specified columns are of integer type
-    #merged_df[columns_to_clean] = merged_df[columns_to_clean].astype(int)
 
-    return merged_df
+def coerce_int(series):
+    """
+    Vectorized integer cleaning of a coded column. Non-negative whole numbers (ints, floats
+    such as 1.0 that a left merge produces, and strings of plain digits) are kept; anything
+    else is treated as missing and becomes 0: missing, negative and fractional values,
+    booleans, and strings that are not plain digits such as '1e3', '-1' or ' 7'.
+
+    Parameters:
+        series (pd.Series): The column to clean.
+
+    Returns:
+        pd.Series: int column.
+    """
+    if pd.api.types.is_bool_dtype(series):
+        return pd.Series(0, index=series.index, dtype=int)
+    if pd.api.types.is_numeric_dtype(series):
+        numbers = pd.to_numeric(series)
+    else:
+        values = series.astype(object)
+        kinds = values.map(type)
+        number_kinds = [kind for kind in kinds.unique()
+                        if issubclass(kind, (int, float, np.integer, np.floating))
+                        and not issubclass(kind, (bool, np.bool_))]
+        digits = values.where(kinds == str).astype(compact_string_dtype()).str.fullmatch('[0-9]+')
+        accepted = kinds.isin(number_kinds).to_numpy() | digits.fillna(False).to_numpy(dtype=bool)
+        numbers = pd.to_numeric(values.where(accepted), errors='coerce')
+    valid = numbers.notna() & (numbers >= 0) & (np.floor(numbers) == numbers)
+    return numbers.where(valid, 0).astype(int)
+
+
+def merge_coded_sources(grants, sources, key='AwardID'):
+    """
+    Adds the coded columns of several tables (I-Corps teams/hub/site/node, SBIR and STTR
+    coding, ...) to grants in one pass, instead of one process_and_merge_grants call
+    per table.
+
+    The grants key is converted and indexed once. Each source is looked up against that
+    index and its columns are assigned with coerce_int, so grants is never re-merged and
+    keeps its row count. For a key repeated in a source, the first row is used.
+
+    Parameters:
+        grants (pd.DataFrame): The main grants dataframe.
+        sources (dict): Source name -> (dataframe, list of columns to add).
+        key (str): The key column to merge on (default is 'AwardID').
+
+    Returns:
+        tuple: (grants with the added columns, report DataFrame with one row per source:
+            source keys, duplicate keys, matched keys, unmatched keys and the unmatched key values)
+    """
+    grants[key] = as_key(grants[key])
+    grant_keys = pd.Index(grants[key])
+    report = []
+    for name, (other_df, columns) in sources.items():
+        other_keys = as_key(other_df[key], like=grants[key])
+        duplicated = other_keys.duplicated()
+        source_index = pd.Index(other_keys[~duplicated])
+        positions = source_index.get_indexer(grant_keys)
+        # Source keys hit by at least one grant
+        matched = np.zeros(len(source_index), dtype=bool)
+        matched[positions[positions >= 0]] = True
+        for col in columns:
+            if col in grants.columns:
+                print(f"Replacing column {col} with the values from {name}")
+            # Clean the (small) source column once; a trailing 0 is gathered by position -1 (no match)
+            values = np.append(coerce_int(other_df[col][~duplicated]).to_numpy(), 0)
+            grants[col] = values[positions]
+        unmatched = source_index[~matched]
+        report.append({
+            'source': name,
+            'source_keys': len(source_index),
+            'duplicate_keys': int(duplicated.sum()),
+            'matched_keys': int(matched.sum()),
+            'unmatched_keys': len(unmatched),
+            'unmatched': unmatched.tolist(),
+        })
+        print(f"{name}: {int(matched.sum())} of {len(source_index)} keys matched, {len(unmatched)} unmatched")
+    return grants, pd.DataFrame(report)
 
 
 
@@ -485,6 +1717,102 @@ def apply_corrections(row, correction_dict):
     return row
 
 
+CORRECTION_KEY = ['Institution_Name', 'Institution_City', 'Institution_State']
+
+
+def lower_or_none(values):
+    """Vectorized str(x).lower() for present values; missing values become None."""
+    return values.astype(str).str.lower().astype(object).where(values.notna(), None)
+
+
+def apply_correction_table(df, correction_df):
+    """
+    Bulk version of apply_corrections: sets Institution_City_C / Institution_State_C for all
+    rows at once and applies the city/state corrections with a single merge.
+
+    The results are identical to df.apply(apply_corrections, axis=1, correction_dict=...)
+    with the dictionary built from the same table. Rows with a missing name, city or
+    state never match a correction.
+
+    Args:
+        df (pd.DataFrame): The grants data with Institution_Name, Institution_City and Institution_State.
+        correction_df (pd.DataFrame): Corrections keyed by Institution_Name, Institution_City and
+            Institution_State, with Corrected_City and Corrected_State. The key city and state
+            are lower-cased to match the grants; for duplicate keys the last row wins.
+
+    Returns:
+        tuple: (df with the corrected columns, number of rows corrected)
+    """
+    df['Institution_City_C'] = lower_or_none(df['Institution_City'])
+    df['Institution_State_C'] = lower_or_none(df['Institution_State'])
+
+    corrections = correction_df[CORRECTION_KEY + ['Corrected_City', 'Corrected_State']].dropna(subset=CORRECTION_KEY)
+    corrections = corrections.assign(Institution_City=lower_or_none(corrections['Institution_City']),
+                                     Institution_State=lower_or_none(corrections['Institution_State']))
+    duplicates = corrections.duplicated(CORRECTION_KEY, keep='last')
+    if duplicates.any():
+        print(f"Ignoring {int(duplicates.sum())} duplicate correction keys (keeping the last)")
+        corrections = corrections[~duplicates]
+
+    keys = pd.DataFrame({
+        'Institution_Name': df['Institution_Name'].astype(object).to_numpy(),
+        'Institution_City': df['Institution_City_C'].to_numpy(),
+        'Institution_State': df['Institution_State_C'].to_numpy(),
+    })
+    corrections = corrections.astype({'Institution_Name': object})
+    # A left merge keeps the row order of keys, so the result lines up with df by position
+    matched = keys.merge(corrections, on=CORRECTION_KEY, how='left', indicator=True)
+    found = (matched['_merge'] == 'both').to_numpy()
+    df.loc[found, 'Institution_City_C'] = matched.loc[found, 'Corrected_City'].to_numpy()
+    df.loc[found, 'Institution_State_C'] = matched.loc[found, 'Corrected_State'].to_numpy()
+    corrected = int(found.sum())
+    print(f"Corrected {corrected} of {len(df)} rows")
+    return df, corrected
+
+
+def group_modes(df, group_column, columns):
+    """
+    Computes the most common value of each column within groups, for every row, without
+    a Python call per group.
+
+    For each column the (group, value) pairs are counted in one pass over integer codes and
+    the most frequent value of each group is picked. The result is the same as
+    groupby(group_column)[column].transform(lambda x: x.mode().iloc[0]):
+    - ties go to the smallest value, because mode() returns its values sorted
+    - NaN values are not counted
+    - groups with no values, and rows whose group key is missing, get NaN
+
+    Args:
+        df (pd.DataFrame): The DataFrame containing the data.
+        group_column (str): Column defining the groups (e.g. Institution_OrgUEINum).
+        columns (list): Columns whose group mode is computed.
+
+    Returns:
+        pd.DataFrame: One column per entry of columns, aligned with df.index.
+    """
+    group_codes, groups = pd.factorize(df[group_column])
+    modes = {}
+    for column in columns:
+        # sort=True makes code order follow value order, so the smallest code wins ties
+        value_codes, values = pd.factorize(df[column], sort=True)
+        n_values = max(len(values), 1)
+        counted = (group_codes >= 0) & (value_codes >= 0)
+        pairs = group_codes[counted].astype(np.int64) * n_values + value_codes[counted]
+        pairs, counts = np.unique(pairs, return_counts=True)
+        pair_groups, pair_values = np.divmod(pairs, n_values)
+        # Highest count first, then smallest value; keep the first pair of each group
+        order = np.lexsort((pair_values, -counts, pair_groups))
+        pair_groups, pair_values = pair_groups[order], pair_values[order]
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = pair_groups[1:] != pair_groups[:-1]
+        group_mode = np.full(len(groups), -1, dtype=np.int64)
+        group_mode[pair_groups[first]] = pair_values[first]
+        row_mode = np.where(group_codes >= 0, group_mode[group_codes], -1)
+        # Code -1 is not in the index of values, so it gathers NaN
+        modes[column] = pd.Series(values).reindex(row_mode).set_axis(df.index)
+    return pd.DataFrame(modes, index=df.index, columns=columns)
+
+
 # Function to fill missing values using the most common (mode) value within groups defined by Institution_OrgUEINum
 def fill_missing_values(df, columns):
     """
@@ -502,12 +1830,11 @@ def fill_missing_values(df, columns):
         #if there isn't column+'_C' create it
         if column+'_C' not in df.columns:
             df[column+'_C'] = df[column]
-        # Compute the most common value (mode) for each group
-        most_common_values = df.groupby('Institution_OrgUEINum')[column].transform(
-            lambda x: x.mode().iloc[0] if not x.mode().empty else x
-        )
+    # Compute the most common value (mode) of every column for each group in one pass
+    most_common_values = group_modes(df, 'Institution_OrgUEINum', columns)
+    for column in columns:
         # Fill missing values in the column with the computed most common values
-        df.loc[df[column+'_C'].isna(), column+'_C'] = most_common_values
+        df.loc[df[column+'_C'].isna(), column+'_C'] = most_common_values[column]
     return df
 
 # Function to fill missing values using the most common (mode) value within groups defined by Institution_Name
@@ -526,10 +1853,34 @@ def fill_missing_values_inst(df, columns):
     for column in columns:
         if column+'_C' not in df.columns:
             df[column+'_C'] = df[column]
-        # Compute the most common value (mode) for each group
-        most_common_values = df.groupby('Institution_Name')[column+'_C'].transform(
-            lambda x: x.mode().iloc[0] if not x.mode().empty else x
-        )
+    # Compute the most common value (mode) of every column for each group in one pass
+    most_common_values = group_modes(df, 'Institution_Name', [column+'_C' for column in columns])
+    for column in columns:
         # Fill missing values in the column with the computed most common values
-        df.loc[df[column+'_C'].isna(), column+'_C'] = most_common_values
-    return df
\ No newline at end of file
+        df.loc[df[column+'_C'].isna(), column+'_C'] = most_common_values[column+'_C']
+    return df
+
+
+def normalize_zip5(zips):
+    """
+    Vectorized 5-digit ZIP code cleaning. Strips blanks, drops a '-NNNN' extension and a
+    '.0' left by numeric storage, and restores the leading zeros lost when ZIPs were read as
+    numbers: 3-4 digits are left-padded to 5 (e.g. Puerto Rico 00601 stored as 601) and 6-8
+    digits to 9. ZIP+4 values keep their first 5 digits. Anything else gives None.
+
+    Each distinct value is handled once.
+
+    Args:
+        zips (pd.Series): ZIP codes as text or numbers.
+
+    Returns:
+        pd.Series: object column of 5-digit strings, with None for missing or invalid values.
+    """
+    codes, uniques = pd.factorize(zips)
+    text = pd.Series(uniques, dtype=object).astype(str).astype(compact_string_dtype())
+    digits = text.str.extract(r'^\s*(\d{3,9})(?:\.0)?(?:-\d*)?\s*$', expand=False)
+    digits = digits.str.zfill(9).where(digits.str.len() > 5, digits.str.zfill(5))
+    zip5 = digits.str[:5].astype(object)
+    zip5 = np.append(zip5.where(zip5.notna(), None).to_numpy(), None)
+    # Code -1 (missing value) picks the trailing None
+    return pd.Series(zip5[codes], index=zips.index, dtype=object)
@@ -0,0 +1,123 @@
+import numpy as np
+import pandas as pd
+
+import utils
+
+# Every 5-digit ZIP is its own slot in the lookup arrays
+ZIP_SLOTS = 100_000
+
+
+def zip_numbers(zips):
+    """
+    Normalized ZIP5 strings of a column (see utils.normalize_zip5) and their integer values,
+    -1 where the ZIP is invalid.
+
+    Returns:
+        tuple: (pd.Series of ZIP5 strings or None, np.ndarray of int64)
+    """
+    zip5 = utils.normalize_zip5(zips)
+    codes, uniques = pd.factorize(zip5)
+    numbers = np.append(np.asarray(uniques, dtype=str).astype(np.int64), -1)[codes]
+    return zip5, numbers
+
+
+def reference_zips(values):
+    """ZIP numbers of a reference column; these were read as numbers, so short values are zero-padded."""
+    values = values.astype(str).str.strip().str.split('-').str[0].str.zfill(5)
+    return zip_numbers(values)[1]
+
+
+def build_zip_lookup(postal_codes, cbsa=None, zip_column='ZipCode', cbsa_zip_column=None, cbsa_column=None):
+    """
+    Builds the ZIP reference lookup once from the reference tables: a validity flag and a
+    CBSA code for each of the 100,000 possible ZIP5 values, so validating and attaching
+    CBSAs is one array index per row.
+
+    Parameters:
+        postal_codes (pd.DataFrame or Path): The valid ZIP list (../Data/zip/postal_codes.csv).
+        cbsa (pd.DataFrame or Path): ZIP -> CBSA crosswalk (../Data/redivis/us_zip_codes_to_cbsa.csv).
+            A ZIP listed under several CBSAs keeps its first one.
+        zip_column (str): ZIP column of postal_codes.
+        cbsa_zip_column, cbsa_column (str): ZIP and CBSA columns of the crosswalk
+            (default: its first two columns).
+
+    Returns:
+        dict: 'valid' (bool array), 'cbsa' (int32 array of positions in 'cbsa_codes', -1 if none)
+            and 'cbsa_codes' (array of CBSA code strings).
+    """
+    if not isinstance(postal_codes, pd.DataFrame):
+        postal_codes = pd.read_csv(postal_codes, dtype={zip_column: str})
+    numbers = reference_zips(postal_codes[zip_column])
+    valid = np.zeros(ZIP_SLOTS, dtype=bool)
+    valid[numbers[numbers >= 0]] = True
+
+    cbsa_slots = np.full(ZIP_SLOTS, -1, dtype=np.int32)
+    cbsa_codes = np.empty(0, dtype=object)
+    if cbsa is not None:
+        if not isinstance(cbsa, pd.DataFrame):
+            cbsa = pd.read_csv(cbsa, dtype={0: str, 1: str})
+        cbsa_zip_column = cbsa_zip_column or cbsa.columns[0]
+        cbsa_column = cbsa_column or cbsa.columns[1]
+        numbers = reference_zips(cbsa[cbsa_zip_column])
+        codes, cbsa_codes = pd.factorize(cbsa[cbsa_column].astype(object).str.strip())
+        keep = (numbers >= 0) & (codes >= 0)
+        numbers, codes = numbers[keep], codes[keep]
+        # Assign in reverse so the first row of a ZIP wins
+        cbsa_slots[numbers[::-1]] = codes[::-1]
+        cbsa_codes = np.asarray(cbsa_codes, dtype=object)
+
+    print(f"ZIP lookup: {int(valid.sum())} valid ZIPs, {int((cbsa_slots >= 0).sum())} with a CBSA")
+    return {'valid': valid, 'cbsa': cbsa_slots, 'cbsa_codes': cbsa_codes}
+
+
+def cbsa_of(numbers, zip_lookup):
+    """CBSA codes (object array, None if unknown) of integer ZIP values from zip_numbers."""
+    slots = np.where(numbers >= 0, zip_lookup['cbsa'][np.maximum(numbers, 0)], -1)
+    return np.append(zip_lookup['cbsa_codes'], None)[slots]
+
+
+def attach_zip_columns(df, zip_lookup, zip_column='Institution_Zip', output_column=None,
+                       valid_column='Valid_Zipcode', cbsa_column='CBSA'):
+    """
+    Normalizes, validates and attaches CBSA codes to a ZIP column in one vectorized pass.
+    Works for the grants (Institution_Zip, Performance_Institution_Zip) and the
+    College Scorecard (ZIP) alike.
+
+    Parameters:
+        df (pd.DataFrame): The table to update.
+        zip_lookup (dict): Output of build_zip_lookup.
+        zip_column (str): The raw ZIP column.
+        output_column (str): Column for the ZIP5 (default: zip_column + '_C'; a column already
+            ending in '_C' is updated in place).
+        valid_column (str): Column set to True where the ZIP5 is in the reference list.
+        cbsa_column (str): Column for the CBSA code (None where unknown).
+
+    Returns:
+        pd.DataFrame: df with the three columns added.
+    """
+    if output_column is None:
+        output_column = zip_column if zip_column.endswith('_C') else zip_column + '_C'
+    zip5, numbers = zip_numbers(df[zip_column])
+    df[output_column] = zip5
+    df[valid_column] = np.where(numbers >= 0, zip_lookup['valid'][np.maximum(numbers, 0)], False)
+    df[cbsa_column] = cbsa_of(numbers, zip_lookup)
+    print(f"Valid ZIP Code Ratio: {df[valid_column].mean():.2%}, "
+          f"with CBSA: {df[cbsa_column].notna().mean():.2%}")
+    return df
+
+
+def zip_block_key(zips, zip_lookup=None):
+    """
+    Blocking key for institution matching: the CBSA code of a ZIP when known, otherwise its
+    first three digits, so institutions of the same metro area (or rural ZIP3 area) are
+    compared with each other. None when the ZIP is invalid.
+
+    Returns:
+        pd.Series: Keys aligned with zips.
+    """
+    zip5, numbers = zip_numbers(zips)
+    keys = zip5.str[:3].astype(object)
+    if zip_lookup is not None:
+        cbsa = cbsa_of(numbers, zip_lookup)
+        keys = keys.where(pd.isna(cbsa), cbsa)
+    return keys.where(keys.notna(), None)
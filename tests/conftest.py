@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The modules import each other as top-level modules (import utils), as in the notebooks
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'modules'))
@@ -0,0 +1,21 @@
+import numpy as np
+import pandas as pd
+
+import utils
+
+
+def test_keeps_whole_numbers_and_digit_strings():
+    series = pd.Series([1, 2.0, np.int64(3), '4', '007', None, np.nan], dtype=object)
+    assert utils.coerce_int(series).tolist() == [1, 2, 3, 4, 7, 0, 0]
+
+
+def test_rejects_scientific_notation_and_booleans():
+    series = pd.Series(['1e3', True, np.True_, False, '2.0', ' 5', '-1', -1, 2.5, 'x'], dtype=object)
+    assert utils.coerce_int(series).tolist() == [0] * len(series)
+    assert utils.coerce_int(pd.Series([True, False])).tolist() == [0, 0]
+
+
+def test_typed_columns():
+    assert utils.coerce_int(pd.Series([1.0, np.nan, 2.5, -3.0])).tolist() == [1, 0, 0, 0]
+    assert utils.coerce_int(pd.Series(['12', '1e3', None], dtype='str')).tolist() == [12, 0, 0]
+    assert utils.coerce_int(pd.Series([1, None], dtype='Int64')).tolist() == [1, 0]
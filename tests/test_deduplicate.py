@@ -0,0 +1,42 @@
+import pandas as pd
+
+import utils
+import panel
+
+
+def year_table(year, award_ids, dates, amounts):
+    return pd.DataFrame({
+        'AwardID': award_ids,
+        'Year': year,
+        'MaxAmdLetterDate': dates,
+        'AwardAmount': amounts,
+        'AwardTotalIntnAmount': amounts,
+    })
+
+
+def test_tied_amendment_date_keeps_newest_archive_in_both_modules():
+    # Award 1 has the same MaxAmdLetterDate in the 2024 and 2023 archives
+    data_2024 = year_table(2024, ['1', '2'], ['03/01/2024', '05/05/2024'], ['240', '20'])
+    data_2023 = year_table(2023, ['1', '3'], ['03/01/2024', '01/01/2023'], ['230', '30'])
+
+    # process_dataframe lists the years newest first; the input order must not matter
+    for data_list in ([data_2024, data_2023], [data_2023, data_2024]):
+        grants, _, audit = utils.deduplicate_awards(data_list)
+        kept = grants.set_index('AwardID')
+        assert kept.loc['1', 'Year'] == 2024
+        assert kept.loc['1', 'AwardAmount'] == '240'
+        assert audit['Year'].tolist() == [2023]
+
+        positions, _ = panel.award_positions(pd.concat(data_list, ignore_index=True))
+        pd.testing.assert_frame_equal(
+            positions.sort_values('AwardID').reset_index(drop=True),
+            grants.sort_values('AwardID').reset_index(drop=True),
+        )
+
+
+def test_later_date_wins_over_newer_archive():
+    data_2024 = year_table(2024, ['1'], ['01/01/2024'], ['240'])
+    data_2023 = year_table(2023, ['1'], ['06/01/2024'], ['230'])
+    grants, _, _ = utils.deduplicate_awards([data_2024, data_2023])
+    positions, _ = panel.award_positions(pd.concat([data_2024, data_2023], ignore_index=True))
+    assert grants['Year'].tolist() == positions['Year'].tolist() == [2023]
@@ -0,0 +1,19 @@
+import zipfile
+
+import pytest
+
+import utils
+
+
+def test_process_zip_files_streaming_needs_no_output_path(tmp_path):
+    with zipfile.ZipFile(tmp_path / '2024.zip', 'w') as zip_ref:
+        zip_ref.writestr('2400001.xml', '<rootTag><Award><AwardID>2400001</AwardID></Award></rootTag>')
+
+    df = utils.process_zip_files(tmp_path, min_years=2000, extract=False)
+    assert df[['year', 'xmlfiles']].values.tolist() == [[2024, 1]]
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['2024.zip']
+
+
+def test_process_zip_files_extract_requires_output_path(tmp_path):
+    with pytest.raises(ValueError):
+        utils.process_zip_files(tmp_path, min_years=2000, extract=True)
@@ -0,0 +1,34 @@
+import pandas as pd
+import pytest
+
+pytest.importorskip('pyarrow')
+
+import storage
+
+
+def grants_with_abstracts():
+    return pd.DataFrame({
+        'AwardID': ['2400001', '2400002', '2400003'],
+        'AbstractNarration': ['First abstract', None, '   '],
+        'Year': [2024, 2024, 2024],
+    })
+
+
+def test_award_without_abstract_gets_na_ref(tmp_path):
+    grants = storage.split_abstracts(grants_with_abstracts(), tmp_path)
+    refs = grants['AbstractRef']
+    assert isinstance(refs.dtype, pd.StringDtype)
+    assert refs.iloc[0] == '2400001'
+    assert refs.iloc[1] is pd.NA and refs.iloc[2] is pd.NA
+
+
+def test_missing_refs_are_not_looked_up(tmp_path):
+    grants = storage.split_abstracts(grants_with_abstracts(), tmp_path)
+    assert storage.abstract_filter(award_ids=grants['AbstractRef']).equals(
+        storage.abstract_filter(award_ids=['2400001']))
+    abstracts = storage.read_abstracts(tmp_path, award_ids=grants['AbstractRef'])
+    assert abstracts['AwardID'].tolist() == ['2400001']
+
+    back = storage.attach_abstracts(grants, tmp_path)
+    assert back['AbstractNarration'].iloc[0] == 'First abstract'
+    assert back['AbstractNarration'].iloc[1:].isna().all()
@@ -0,0 +1,51 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+import utils
+
+
+TITLES = pd.Series([
+    'SBIR Phase I: A new sensor',
+    'SBIR Phase II: A new sensor',
+    'sttr phase i: lower case title',
+    'STTR Phase II: Collaborative Research: Two rules overlap',
+    'Collaborative Research: CAREER: Something',
+    'Career development (not the CAREER program in lower case)',
+    'career: lower case is not a CAREER award',
+    'RAPID: Response to an event',
+    'EAGER:\nTitle over two lines with I-Corps',
+    'ICorps Teams: SBIR SBIR Phase I: repeated',
+    'Rapid response, eager team',
+    'Nothing to see',
+    '',
+    None,
+])
+
+
+def per_rule_flags(titles, rules):
+    columns = []
+    for _, flags in rules:
+        columns.extend(flag for flag in flags if flag not in columns)
+    found = pd.DataFrame(0, index=titles.index, columns=columns)
+    for pattern, flags in rules:
+        matches = titles.str.contains(pattern, flags=re.IGNORECASE, regex=True, na=False)
+        for flag in flags:
+            found.loc[matches.to_numpy(dtype=bool), flag] = 1
+    return found
+
+
+def test_single_scan_matches_per_rule_flags():
+    rules = utils.AWARD_TITLE_RULES + [(r'\bPhase I:', ['sbir_1', 'phase_1'])]
+    flags = utils.classify_titles(TITLES, rules)
+    pd.testing.assert_frame_equal(flags, per_rule_flags(TITLES.astype(object), rules))
+
+
+def test_overlapping_rules_are_all_flagged():
+    flags = utils.classify_titles(TITLES)
+    row = flags.iloc[3]
+    assert row[['sttr', 'sttr_2', 'collaborative']].tolist() == [1, 1, 1]
+    assert row[['sttr_1', 'sbir']].tolist() == [0, 0]
+    assert flags['career'].tolist() == [0, 0, 0, 0, 1, 1, 1, 0, 0, 0, 0, 0, 0, 0]
+    assert np.array_equal(flags.index, TITLES.index)